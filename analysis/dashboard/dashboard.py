@@ -6,9 +6,16 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
+from dashboard_payload import DEFAULT_PAYLOAD, DashboardPayload, load_payload
+from index_queries import DEFAULT_INDEX_DIR, DEFAULT_LIMIT, DEFAULT_PAGE_SIZE, FILTER_COLUMNS, GROUPINGS, ORDERINGS, \
+    ObjectIndex, index_fingerprint
+
 # Page config
 st.set_page_config(
     page_title="AI Image Dataset Dashboard",
@@ -39,84 +46,105 @@ st.markdown('<h1 class="main-header">📊 AI Image Detection Dataset Dashboard</
 st.markdown("---")
 
 # Load data
-@st.cache_data
-def load_data():
-    """Load dataset statistics"""
+# Written by scripts/analyze_dataset_details_fixed.py; DATASET_STATISTICS points elsewhere
+STATISTICS_FILE = Path(os.environ.get(
+    "DATASET_STATISTICS", Path(__file__).resolve().parent.parent / "statistics" / "dataset_statistics.json"))
+# Precomputed by dashboard_payload.py; used when it was built from the current statistics
+PAYLOAD_FILE = Path(os.environ.get("DASHBOARD_PAYLOAD", DEFAULT_PAYLOAD))
+# Written by scripts/audit_s3_datasets.py --index-dir; OBJECT_INDEX points elsewhere
+OBJECT_INDEX_DIR = Path(os.environ.get("OBJECT_INDEX", DEFAULT_INDEX_DIR))
+CACHE_TTL_SECONDS = 30
+# Query results are kept per index version; repeated drill-downs are answered from memory
+QUERY_CACHE_ENTRIES = 256
+STALE_AFTER = timedelta(days=7)
+
+def file_fingerprint(path):
+    """(mtime_ns, size) of a file, or None if it doesn't exist"""
     try:
-        with open('dataset_statistics.json', 'r') as f:
-            return json.load(f)
+        stat = path.stat()
     except FileNotFoundError:
-        # Mock data for development
-        return [
-            {
-                "dataset": "CIFAKE",
-                "generator": "Unknown (mixed)",
-                "real_source": "CIFAR-10 (real photos)",
-                "train_real": 50000,
-                "train_fake": 50000,
-                "test_real": 10000,
-                "test_fake": 10000,
-                "total": 120000
-            },
-            {
-                "dataset": "Stable Diffusion Faces",
-                "generator": "Stable Diffusion",
-                "real_source": "None (all AI-generated)",
-                "train_real": 0,
-                "train_fake": 7200,
-                "test_real": 0,
-                "test_fake": 1800,
-                "total": 9000
-            },
-            {
-                "dataset": "AI-Generated vs Real",
-                "generator": "Multiple (GAN-based)",
-                "real_source": "Mixed real photos",
-                "train_real": 24000,
-                "train_fake": 23999,
-                "test_real": 6000,
-                "test_fake": 6000,
-                "total": 59999
-            },
-            {
-                "dataset": "DiffusionDB",
-                "generator": "Stable Diffusion",
-                "real_source": "None (all AI-generated)",
-                "train_real": 0,
-                "train_fake": 1968,
-                "test_real": 0,
-                "test_fake": 492,
-                "total": 2460
-            },
-            {
-                "dataset": "AIGI-Holmes",
-                "generator": "Multiple (FLUX, SD, DALL-E, Midjourney)",
-                "real_source": "Real camera photos",
-                "train_real": 33850,
-                "train_fake": 31147,
-                "test_real": 50000,
-                "test_fake": 50000,
-                "total": 164997
-            },
-            {
-                "dataset": "BR-Gen",
-                "generator": "AI Inpainting",
-                "real_source": "COCO/ImageNet/Places (not included)",
-                "train_real": 0,
-                "train_fake": 24000,
-                "test_real": 0,
-                "test_fake": 6000,
-                "total": 30000
-            }
-        ]
-
-data = load_data()
-df = pd.DataFrame(data)
-
-# Calculate totals
-total_images = df['total'].sum()
-total_real = (df['train_real'] + df['test_real']).sum()
-total_fake = (df['train_fake'] + df['test_fake']).sum()
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class StatisticsCache:
+    """The dashboard payload shared by every session, keyed on the statistics file's (path, mtime, size).
+
+    A background thread re-checks the fingerprint every `ttl` seconds and loads
+    the payload only when the file changed (the prebuilt one from
+    dashboard_payload.py if it matches, else built in memory), so reruns never
+    re-read JSON or redo DataFrame work, and a newer file shows up without
+    restarting the server. A file that can't be parsed (e.g. half-written)
+    keeps the last good version and reports the error.
+    """
+
+    def __init__(self, path, payload_path, ttl=CACHE_TTL_SECONDS):
+        self.path = Path(path)
+        self.payload_path = Path(payload_path)
+        self.ttl = ttl
+        self.fingerprint = None
+        self.data = None
+        self.error = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh()
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def refresh(self):
+        fingerprint = file_fingerprint(self.path)
+        with self.lock:
+            self.checked_at = time.monotonic()
+            if fingerprint == self.fingerprint and (self.data is not None or fingerprint is None):
+                return
+        data, error = None, None
+        if fingerprint is None:
+            error = f"{self.path} not found"
+        else:
+            try:
+                data = DashboardPayload(*load_payload(self.path, self.payload_path))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                error = f"{self.path} could not be read: {e}"
+        with self.lock:
+            self.error = error
+            if data is not None or fingerprint is None:
+                self.fingerprint, self.data = fingerprint, data
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.ttl)
+            self.refresh()
+
+    def get(self):
+        """(data, fingerprint, error); re-checks the file first if the TTL ran out"""
+        if time.monotonic() - self.checked_at > self.ttl:
+            self.refresh()
+        with self.lock:
+            return self.data, self.fingerprint, self.error
+
+@st.cache_resource
+def statistics_cache(path, payload_path):
+    return StatisticsCache(path, payload_path)
+
+def load_data():
+    """Load the dashboard payload, stopping the page with an explanation if there are no statistics"""
+    data, fingerprint, error = statistics_cache(str(STATISTICS_FILE), str(PAYLOAD_FILE)).get()
+    if data is None:
+        st.error(f"📭 No dataset statistics to show: {error}. "
+                 f"Run `python scripts/analyze_dataset_details_fixed.py` and copy its dataset_statistics.json "
+                 f"there, or set DATASET_STATISTICS to its path.")
+        st.stop()
+    modified = datetime.fromtimestamp(fingerprint[0] / 1e9)
+    if error:
+        st.warning(f"⚠️ {error}. Showing the previous version from {modified:%Y-%m-%d %H:%M}.")
+    elif datetime.now() - modified > STALE_AFTER:
+        st.warning(f"⏳ These statistics are {(datetime.now() - modified).days} days old "
+                   f"({STATISTICS_FILE.name} last written {modified:%Y-%m-%d %H:%M}); "
+                   f"re-run the analysis to refresh them.")
+    built = "precomputed payload" if data.prebuilt else "built in memory (run dashboard_payload.py to precompute)"
+    st.caption(f"Source: {STATISTICS_FILE} · updated {modified:%Y-%m-%d %H:%M:%S} · {built}")
+    return data
+
+payload = load_data()
+totals = payload.totals
 
 # Overview metrics
 st.header("📈 Overview")
@@ -125,28 +153,28 @@ col1, col2, col3, col4 = st.columns(4)
 with col1:
     st.metric(
         label="📚 Total Datasets",
-        value=len(df),
+        value=totals['datasets'],
         help="Number of datasets in collection"
     )
 
 with col2:
     st.metric(
         label="🖼️ Total Images",
-        value=f"{total_images:,}",
+        value=f"{totals['images']:,}",
         help="Total number of images across all datasets"
     )
 
 with col3:
     st.metric(
         label="✅ Real Images",
-        value=f"{total_real:,}",
+        value=f"{totals['real']:,}",
         help="Total authentic/real images"
     )
 
 with col4:
     st.metric(
         label="🤖 AI-Generated Images",
-        value=f"{total_fake:,}",
+        value=f"{totals['fake']:,}",
         help="Total AI-generated/fake images"
     )
 
@@ -161,33 +189,20 @@ with col1:
     # Bar chart - images per dataset
     fig_bar = go.Figure()
     
-    fig_bar.add_trace(go.Bar(
-        name='Train Real',
-        x=df['dataset'],
-        y=df['train_real'],
-        marker_color='#2ecc71'
-    ))
-    
-    fig_bar.add_trace(go.Bar(
-        name='Train Fake',
-        x=df['dataset'],
-        y=df['train_fake'],
-        marker_color='#e74c3c'
-    ))
-    
-    fig_bar.add_trace(go.Bar(
-        name='Test Real',
-        x=df['dataset'],
-        y=df['test_real'],
-        marker_color='#3498db'
-    ))
-    
-    fig_bar.add_trace(go.Bar(
-        name='Test Fake',
-        x=df['dataset'],
-        y=df['test_fake'],
-        marker_color='#f39c12'
-    ))
+    category_colors = {
+        'Train Real': '#2ecc71',
+        'Train Fake': '#e74c3c',
+        'Test Real': '#3498db',
+        'Test Fake': '#f39c12',
+    }
+    categories = payload.charts['categories']
+    for name, values in categories['series'].items():
+        fig_bar.add_trace(go.Bar(
+            name=name,
+            x=categories['datasets'],
+            y=values,
+            marker_color=category_colors.get(name)
+        ))
     
     fig_bar.update_layout(
         title='Images per Dataset by Category',
@@ -201,9 +216,10 @@ with col1:
 
 with col2:
     # Pie chart - total distribution
+    real_vs_fake = payload.charts['real_vs_fake']
     fig_pie = px.pie(
-        values=[total_real, total_fake],
-        names=['Real Images', 'AI-Generated Images'],
+        values=real_vs_fake['values'],
+        names=real_vs_fake['labels'],
         title='Overall Real vs Fake Distribution',
         color_discrete_map={
             'Real Images': '#2ecc71',
@@ -227,68 +243,276 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("Generators Used")
     
-    generator_data = df[['dataset', 'generator']].copy()
-    
-    for idx, row in generator_data.iterrows():
+    for row in payload.rows:
         with st.expander(f"📁 {row['dataset']}"):
             st.write(f"**Generator:** {row['generator']}")
-            st.write(f"**Images:** {df.iloc[idx]['total']:,}")
+            st.write(f"**Images:** {row['total']:,}")
 
 with col2:
     st.subheader("Real Image Sources")
     
-    source_data = df[['dataset', 'real_source']].copy()
-    
-    for idx, row in source_data.iterrows():
+    for row in payload.rows:
         with st.expander(f"📁 {row['dataset']}"):
             st.write(f"**Source:** {row['real_source']}")
-            real_count = df.iloc[idx]['train_real'] + df.iloc[idx]['test_real']
-            st.write(f"**Real Images:** {real_count:,}")
+            st.write(f"**Real Images:** {row['real_total']:,}")
 
 st.markdown("---")
 
 # Detailed dataset table
 st.header("📋 Detailed Statistics")
 
-# Create detailed dataframe
-detailed_df = df.copy()
-detailed_df['Real Total'] = detailed_df['train_real'] + detailed_df['test_real']
-detailed_df['Fake Total'] = detailed_df['train_fake'] + detailed_df['test_fake']
-detailed_df['Real %'] = (detailed_df['Real Total'] / detailed_df['total'] * 100).round(1)
-detailed_df['Fake %'] = (detailed_df['Fake Total'] / detailed_df['total'] * 100).round(1)
-
-display_df = detailed_df[[
-    'dataset', 
-    'train_real', 
-    'train_fake', 
-    'test_real', 
-    'test_fake',
-    'Real Total',
-    'Fake Total',
-    'total',
-    'Real %',
-    'Fake %',
-    'generator',
-    'real_source'
-]]
-
-# Format numbers
-display_df['train_real'] = display_df['train_real'].apply(lambda x: f"{x:,}")
-display_df['train_fake'] = display_df['train_fake'].apply(lambda x: f"{x:,}")
-display_df['test_real'] = display_df['test_real'].apply(lambda x: f"{x:,}")
-display_df['test_fake'] = display_df['test_fake'].apply(lambda x: f"{x:,}")
-display_df['Real Total'] = display_df['Real Total'].apply(lambda x: f"{x:,}")
-display_df['Fake Total'] = display_df['Fake Total'].apply(lambda x: f"{x:,}")
-display_df['total'] = display_df['total'].apply(lambda x: f"{x:,}")
+# Formatting is applied per column by the grid, so values stay numeric and sort as numbers
+DETAILED_COLUMN_CONFIG = {
+    "dataset": st.column_config.TextColumn("Dataset"),
+    "train_real": st.column_config.NumberColumn("Train Real", format="localized"),
+    "train_fake": st.column_config.NumberColumn("Train Fake", format="localized"),
+    "test_real": st.column_config.NumberColumn("Test Real", format="localized"),
+    "test_fake": st.column_config.NumberColumn("Test Fake", format="localized"),
+    "real_total": st.column_config.NumberColumn("Real Total", format="localized"),
+    "fake_total": st.column_config.NumberColumn("Fake Total", format="localized"),
+    "total": st.column_config.NumberColumn("Total", format="localized"),
+    "real_pct": st.column_config.NumberColumn("Real %", format="%.1f%%"),
+    "fake_pct": st.column_config.NumberColumn("Fake %", format="%.1f%%"),
+    "generator": st.column_config.TextColumn("Generator"),
+    "real_source": st.column_config.TextColumn("Real Source"),
+}
 
 st.dataframe(
-    display_df,
+    payload.table,
     use_container_width=True,
-    hide_index=True
+    hide_index=True,
+    column_config=DETAILED_COLUMN_CONFIG
 )
 
 st.markdown("---")
 
+# Object size distributions, rebuilt from the size sketches saved by the analysis script
+def sketch_histogram(sketches, strata):
+    """Merge the log-size buckets of the chosen strata into a histogram table"""
+    counts = {}
+    zero = 0
+    gamma = None
+    for stratum in strata:
+        sketch = sketches[stratum]
+        accuracy = sketch['relative_accuracy']
+        gamma = (1 + accuracy) / (1 - accuracy)
+        zero += sketch['zero']
+        for index, count in sketch['buckets'].items():
+            counts[int(index)] = counts.get(int(index), 0) + count
+    rows = [{"Size (bytes)": 0, "Upper (bytes)": 0, "Files": zero}] if zero else []
+    for index in sorted(counts):
+        rows.append({
+            "Size (bytes)": gamma ** (index - 1),
+            "Upper (bytes)": gamma ** index,
+            "Files": counts[index],
+        })
+    return pd.DataFrame(rows)
+
+sized = payload.sizes
+
+if sized:
+    st.header("📏 File Size Distribution")
+
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        size_dataset = st.selectbox("Dataset", list(sized), key="size_dataset")
+        row = sized[size_dataset]
+        strata = sorted(row['size_sketches'])
+        chosen_strata = st.multiselect("Split / label / extension", strata, default=strata, key="size_strata")
+        summary = pd.DataFrame.from_dict(row['size_distribution'], orient='index')
+        st.dataframe(
+            summary[['count', 'zero_bytes', 'p1', 'p50', 'p99', 'max']],
+            use_container_width=True,
+            column_config={
+                "count": st.column_config.NumberColumn("Files", format="%d"),
+                "zero_bytes": st.column_config.NumberColumn("0-byte", format="%d"),
+                "p1": st.column_config.NumberColumn("p1 (B)", format="%d"),
+                "p50": st.column_config.NumberColumn("p50 (B)", format="%d"),
+                "p99": st.column_config.NumberColumn("p99 (B)", format="%d"),
+                "max": st.column_config.NumberColumn("max (B)", format="%d"),
+            },
+        )
+
+    with col2:
+        histogram = sketch_histogram(row['size_sketches'], chosen_strata)
+        if histogram.empty:
+            st.info("No files in the selected strata")
+        else:
+            fig_sizes = go.Figure(go.Bar(
+                x=histogram['Size (bytes)'].clip(lower=1),
+                y=histogram['Files'],
+                width=(histogram['Upper (bytes)'] - histogram['Size (bytes)']).clip(lower=1),
+                offset=0,
+                marker_color='#1f77b4'
+            ))
+            fig_sizes.update_layout(
+                title=f'File sizes in {size_dataset}',
+                xaxis_title='File size (bytes, log scale)',
+                yaxis_title='Number of files',
+                xaxis_type='log',
+                height=450
+            )
+            st.plotly_chart(fig_sizes, use_container_width=True)
+
+    st.markdown("---")
+
+# Drill-down queries over the per-object Parquet index
+@st.cache_resource
+def object_index(root):
+    return ObjectIndex(root)
+
+# The index fingerprint is part of the cache key, so rewritten partitions are never served from a stale result
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def index_values(root, fingerprint, column, datasets):
+    return object_index(root).values(column, datasets)
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def index_breakdown(root, fingerprint, datasets, filters, group_by, order_by, limit):
+    return object_index(root).breakdown(datasets, dict(filters), group_by, order_by, limit)
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def index_count(root, fingerprint, datasets, filters, size_range):
+    return object_index(root).count(datasets, dict(filters), size_range)
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+def index_page(root, fingerprint, datasets, filters, size_range, after, page_size):
+    return object_index(root).page(datasets, dict(filters), size_range, after, page_size)
+
+def missing_label(value):
+    return "(none)" if value is None else str(value)
+
+st.header("🔎 Object Index Drill-down")
+
+index = None
+fingerprint = index_fingerprint(OBJECT_INDEX_DIR)
+if not fingerprint:
+    st.info(f"No object index at {OBJECT_INDEX_DIR}. Write one with "
+            f"`python scripts/audit_s3_datasets.py --index-dir`, or set OBJECT_INDEX to its path.")
+else:
+    try:
+        index = object_index(str(OBJECT_INDEX_DIR))
+    except ImportError:
+        st.info("Drill-down queries need DuckDB: `pip install duckdb`")
+
+if index is not None:
+    root = str(OBJECT_INDEX_DIR)
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        chosen_datasets = tuple(st.multiselect("Datasets", index.datasets(), key="index_datasets",
+                                               help="All datasets if empty"))
+        filters = []
+        for column in FILTER_COLUMNS:
+            options = index_values(root, fingerprint, column, chosen_datasets)
+            chosen = st.multiselect(column.capitalize(), options, format_func=missing_label,
+                                    key=f"index_{column}", help="All values if empty")
+            filters.append((column, tuple(chosen)))
+        group_by = tuple(st.multiselect("Group by", list(GROUPINGS), default=['Extension'], key="index_group_by"))
+        order_by = st.radio("Largest by", list(ORDERINGS), horizontal=True, key="index_order_by")
+        limit = st.number_input("Top groups", min_value=1, max_value=10_000, value=DEFAULT_LIMIT, step=10,
+                                key="index_limit")
+
+    with col2:
+        start = time.perf_counter()
+        groups, matched = index_breakdown(root, fingerprint, chosen_datasets, tuple(filters), group_by, order_by,
+                                          int(limit))
+        elapsed = time.perf_counter() - start
+        st.caption(f"{matched['files']:,} matching objects · {matched['bytes'] / (1024**3):,.2f} GB · "
+                   f"answered in {elapsed * 1000:,.0f} ms")
+        if groups is None or groups.empty:
+            st.info("No objects match these filters")
+        else:
+            st.dataframe(
+                groups,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "files": st.column_config.NumberColumn("Files", format="localized"),
+                    "bytes": st.column_config.NumberColumn("Bytes", format="localized"),
+                    "mean_size": st.column_config.NumberColumn("Mean size (B)", format="%.0f"),
+                    "max_size": st.column_config.NumberColumn("Max size (B)", format="localized"),
+                },
+            )
+            if group_by:
+                labels = groups[list(group_by)].astype('string').fillna('(none)').agg(' / '.join, axis=1)
+                measure = ORDERINGS[order_by]
+                fig_index = go.Figure(go.Bar(x=labels.head(25), y=groups[measure].head(25), marker_color='#1f77b4'))
+                fig_index.update_layout(
+                    title=f'{order_by} by {" / ".join(group_by)}',
+                    xaxis_title=' / '.join(group_by),
+                    yaxis_title=order_by,
+                    height=450
+                )
+                st.plotly_chart(fig_index, use_container_width=True)
+
+    st.markdown("---")
+
+    # Object browser: one page of the index at a time, addressed by keyset cursors
+    st.header("🗂️ Object Browser")
+
+    def next_page(last_key):
+        st.session_state.browser_cursors.append(last_key)
+
+    def previous_page():
+        st.session_state.browser_cursors.pop()
+
+    col1, col2 = st.columns([1, 3])
+
+    with col1:
+        browse_datasets = tuple(st.multiselect("Datasets", index.datasets(), key="browser_datasets",
+                                               help="All datasets if empty"))
+        browse_filters = []
+        for column in FILTER_COLUMNS:
+            options = index_values(root, fingerprint, column, browse_datasets)
+            chosen = st.multiselect(column.capitalize(), options, format_func=missing_label,
+                                    key=f"browser_{column}", help="All values if empty")
+            browse_filters.append((column, tuple(chosen)))
+        browse_filters = tuple(browse_filters)
+        min_size = st.number_input("Min size (bytes)", min_value=0, value=0, step=1024, key="browser_min_size")
+        max_size = st.number_input("Max size (bytes)", min_value=0, value=0, step=1024, key="browser_max_size",
+                                   help="No upper limit if 0")
+        size_range = (min_size or None, max_size or None)
+        page_size = st.selectbox("Objects per page", [50, DEFAULT_PAGE_SIZE, 250, 1000], index=1,
+                                 key="browser_page_size")
+
+    with col2:
+        # Session state holds only the cursors (last key of each earlier page), never the objects themselves
+        query = (browse_datasets, browse_filters, size_range, page_size)
+        if st.session_state.get("browser_query") != query:
+            st.session_state.browser_query = query
+            st.session_state.browser_cursors = [None]
+        cursors = st.session_state.browser_cursors
+
+        objects, has_more = index_page(root, fingerprint, browse_datasets, browse_filters, size_range, cursors[-1],
+                                       page_size)
+        matching = index_count(root, fingerprint, browse_datasets, browse_filters, size_range)
+        first = (len(cursors) - 1) * page_size
+        if objects is None or objects.empty:
+            st.info("No objects match these filters")
+        else:
+            st.caption(f"Objects {first + 1:,}–{first + len(objects):,} of {matching:,} (page {len(cursors):,})")
+            st.dataframe(
+                objects,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "key": st.column_config.TextColumn("Key", width="large"),
+                    "size": st.column_config.NumberColumn("Size (B)", format="localized"),
+                    "last_modified": st.column_config.DatetimeColumn("Last modified"),
+                    "etag": st.column_config.TextColumn("ETag"),
+                },
+            )
+
+        nav1, nav2 = st.columns(2)
+        with nav1:
+            st.button("◀ Previous", disabled=len(cursors) == 1, on_click=previous_page, key="browser_previous")
+        with nav2:
+            st.button("Next ▶", disabled=not has_more, on_click=next_page,
+                      args=(objects['key'].iloc[-1] if has_more else None,), key="browser_next")
+
+st.markdown("---")
+
 # Key insights
 st.header("💡 Key Insights")
 
@@ -298,23 +522,21 @@ with col1:
     st.info(f"""
     **Largest Dataset**
     
-    AIGI-Holmes with {df[df['dataset'] == 'AIGI-Holmes']['total'].values[0]:,} images
+    {totals['largest_dataset']} with {totals['largest_total']:,} images
     """)
 
 with col2:
-    balance_ratio = (total_real / total_fake) if total_fake > 0 else 0
     st.warning(f"""
     **Class Balance**
     
-    Real:Fake ratio is {balance_ratio:.2f}:1
+    Real:Fake ratio is {totals['balance_ratio']:.2f}:1
     """)
 
 with col3:
-    datasets_with_real = len(df[df['train_real'] + df['test_real'] > 0])
     st.success(f"""
     **Real Images Available**
     
-    {datasets_with_real} out of {len(df)} datasets include real images
+    {totals['datasets_with_real']} out of {totals['datasets']} datasets include real images
     """)
 
 # Generator summary
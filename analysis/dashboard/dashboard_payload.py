@@ -0,0 +1,153 @@
+"""
+Dashboard Payload
+Precomputes everything the dashboard shows from dataset_statistics.json (derived columns, totals,
+ratios and chart series) into a compact, versioned artifact, so page reruns only read it
+
+Build it after each analysis run:
+    python dashboard_payload.py --statistics ../statistics/dataset_statistics.json
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+PAYLOAD_VERSION = 1
+STATISTICS_DIR = Path(__file__).resolve().parent.parent / "statistics"
+DEFAULT_STATISTICS = STATISTICS_DIR / "dataset_statistics.json"
+DEFAULT_PAYLOAD = STATISTICS_DIR / "dashboard_payload.json"
+
+CATEGORIES = {
+    'train_real': 'Train Real',
+    'train_fake': 'Train Fake',
+    'test_real': 'Test Real',
+    'test_fake': 'Test Fake',
+}
+TABLE_COLUMNS = ['dataset', 'train_real', 'train_fake', 'test_real', 'test_fake', 'real_total', 'fake_total',
+                 'total', 'real_pct', 'fake_pct', 'generator', 'real_source']
+
+def statistics_digest(raw):
+    """Identifies the exact statistics a payload was built from"""
+    return hashlib.sha256(raw).hexdigest()
+
+def build_payload(statistics, source_digest=None):
+    """The payload dict for a list of per-dataset statistics"""
+    df = pd.DataFrame(statistics)
+    for column in CATEGORIES:
+        df[column] = df[column].fillna(0).astype('int64') if column in df else 0
+    for column in ('generator', 'real_source'):
+        df[column] = df[column].fillna('') if column in df else ''
+    if 'total' not in df:
+        df['total'] = df[list(CATEGORIES)].sum(axis=1)
+    df['real_total'] = df['train_real'] + df['test_real']
+    df['fake_total'] = df['train_fake'] + df['test_fake']
+    # Datasets with no images get 0% rather than NaN
+    totals = df['total'].where(df['total'] > 0)
+    df['real_pct'] = (df['real_total'] / totals * 100).round(1).fillna(0.0)
+    df['fake_pct'] = (df['fake_total'] / totals * 100).round(1).fillna(0.0)
+
+    total_images = int(df['total'].sum())
+    total_real = int(df['real_total'].sum())
+    total_fake = int(df['fake_total'].sum())
+    largest = df.loc[df['total'].idxmax()] if len(df) else None
+
+    sized = {}
+    for row in statistics:
+        if row.get('size_sketches'):
+            sized[row['dataset']] = {
+                "size_sketches": row['size_sketches'],
+                "size_distribution": row.get('size_distribution', {}),
+            }
+
+    return {
+        "version": PAYLOAD_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "source_sha256": source_digest,
+        "totals": {
+            "datasets": len(df),
+            "images": total_images,
+            "real": total_real,
+            "fake": total_fake,
+            "real_pct": round(total_real / total_images * 100, 1) if total_images else 0.0,
+            "fake_pct": round(total_fake / total_images * 100, 1) if total_images else 0.0,
+            "balance_ratio": total_real / total_fake if total_fake else 0.0,
+            "datasets_with_real": int((df['real_total'] > 0).sum()),
+            "largest_dataset": largest['dataset'] if largest is not None else None,
+            "largest_total": int(largest['total']) if largest is not None else 0,
+        },
+        # Column-oriented, so it loads straight into a DataFrame
+        "table": {column: df[column].tolist() for column in TABLE_COLUMNS},
+        "charts": {
+            "categories": {
+                "datasets": df['dataset'].tolist(),
+                "series": {label: df[column].tolist() for column, label in CATEGORIES.items()},
+            },
+            "real_vs_fake": {
+                "labels": ['Real Images', 'AI-Generated Images'],
+                "values": [total_real, total_fake],
+            },
+        },
+        "sizes": sized,
+    }
+
+def load_payload(statistics_path, payload_path=DEFAULT_PAYLOAD):
+    """(payload, prebuilt) for a statistics file.
+
+    The artifact at `payload_path` is used if it has the current version and was
+    built from exactly these statistics; otherwise the payload is built now.
+    """
+    raw = Path(statistics_path).read_bytes()
+    digest = statistics_digest(raw)
+    try:
+        with open(payload_path) as f:
+            payload = json.load(f)
+        if payload.get('version') == PAYLOAD_VERSION and payload.get('source_sha256') == digest:
+            return payload, True
+    except (OSError, ValueError):
+        pass
+    return build_payload(json.loads(raw), digest), False
+
+def write_payload(payload, path):
+    """Atomically write a payload as compact JSON"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+class DashboardPayload:
+    """A payload ready to render: built once per statistics version and shared read-only by every session"""
+
+    def __init__(self, payload, prebuilt=False):
+        self.prebuilt = prebuilt
+        self.built_at = payload['built_at']
+        self.totals = payload['totals']
+        self.charts = payload['charts']
+        self.sizes = payload['sizes']
+        # Kept numeric (the dashboard formats columns for display), so it sorts as numbers
+        self.table = pd.DataFrame(payload['table'], columns=TABLE_COLUMNS)
+        self.rows = self.table.to_dict('records')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute the dashboard payload from dataset statistics")
+    parser.add_argument('--statistics', default=DEFAULT_STATISTICS,
+                        help=f"dataset_statistics.json to read (default: {DEFAULT_STATISTICS})")
+    parser.add_argument('--output', default=DEFAULT_PAYLOAD,
+                        help=f"Where to write the payload (default: {DEFAULT_PAYLOAD})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    raw = Path(args.statistics).read_bytes()
+    payload = build_payload(json.loads(raw), statistics_digest(raw))
+    write_payload(payload, args.output)
+    totals = payload['totals']
+    print(f"📦 Dashboard payload v{PAYLOAD_VERSION}: {totals['datasets']} datasets, {totals['images']:,} images")
+    print(f"📄 Saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Object Index Queries
+Filtered, grouped queries over the Parquet object index written by
+`audit_s3_datasets.py --index-dir`, run by an embedded DuckDB engine so the dashboard can
+drill into any dataset, split, label, extension or folder without listing S3
+"""
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parent.parent.parent / "scripts" / "object_index"
+FILTER_COLUMNS = ['split', 'label', 'extension']
+# Grouping name -> SQL expression over the index columns
+GROUPINGS = {
+    'Dataset': "dataset",
+    'Split': "split",
+    'Label': "label",
+    'Extension': "extension",
+    'Folder': "parse_dirpath(key)",
+    'Depth': "depth",
+}
+ORDERINGS = {'Files': "files", 'Bytes': "bytes"}
+DEFAULT_LIMIT = 50
+BROWSER_COLUMNS = ['key', 'size', 'split', 'label', 'extension', 'last_modified', 'etag']
+DEFAULT_PAGE_SIZE = 100
+
+def index_partitions(root):
+    """{dataset: [part files]} of the live partitions (staging partitions of running audits are skipped)"""
+    partitions = {}
+    for directory in sorted(Path(root).glob("dataset=*")):
+        parts = sorted(directory.glob("*.parquet"))
+        if parts:
+            partitions[directory.name.split("=", 1)[1]] = parts
+    return partitions
+
+def index_fingerprint(root):
+    """(name, mtime_ns, size) of every part file; changes whenever an audit replaces a partition"""
+    return tuple((str(path), path.stat().st_mtime_ns, path.stat().st_size)
+                 for parts in index_partitions(root).values() for path in parts)
+
+class ObjectIndex:
+    """Runs queries over the index in one DuckDB database shared by every session.
+
+    Only the part files of the selected datasets are read, and DuckDB pushes the
+    remaining filters and the column selection into the Parquet scan, so row
+    groups whose statistics exclude the filter and columns a query doesn't use
+    are never decoded.
+    """
+
+    def __init__(self, root=DEFAULT_INDEX_DIR):
+        import duckdb
+
+        self.root = Path(root)
+        self.db = duckdb.connect()
+        self.lock = threading.Lock()
+
+    def _source(self, datasets):
+        """FROM clause and its parameters for the part files of `datasets` (all if empty)"""
+        partitions = index_partitions(self.root)
+        files = [str(path) for dataset, parts in partitions.items()
+                 if not datasets or dataset in datasets for path in parts]
+        return "read_parquet(?, hive_partitioning = true)", [files]
+
+    @staticmethod
+    def _where(filters, size_range=None, after=None, until=None):
+        """WHERE clause and parameters; filters map a column to its allowed values (None matches missing),
+        size_range is (min, max) bytes (either may be None) and keys lie in (after, until]"""
+        clauses, params = [], []
+        for column, values in filters.items():
+            if not values:
+                continue
+            present = [value for value in values if value is not None]
+            tests = []
+            if present:
+                tests.append(f"{column} IN ({', '.join('?' * len(present))})")
+                params.extend(present)
+            if len(present) < len(values):
+                tests.append(f"{column} IS NULL")
+            clauses.append(f"({' OR '.join(tests)})")
+        low, high = size_range or (None, None)
+        if low is not None:
+            clauses.append("size >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append("size <= ?")
+            params.append(high)
+        if after is not None:
+            clauses.append("key > ?")
+            params.append(after)
+        if until is not None:
+            clauses.append("key <= ?")
+            params.append(until)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    @contextmanager
+    def _cursor(self):
+        # A cursor per query: one DuckDB connection must not run two queries at once
+        with self.lock:
+            cursor = self.db.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def _query(self, sql, params):
+        with self._cursor() as cursor:
+            return cursor.execute(sql, params).df()
+
+    def datasets(self):
+        return list(index_partitions(self.root))
+
+    def values(self, column, datasets=()):
+        """Distinct values of a filter column (None for keys that have none)"""
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter column {column}")
+        source, params = self._source(datasets)
+        if not params[0]:
+            return []
+        with self._cursor() as cursor:
+            rows = cursor.execute(f"SELECT DISTINCT {column} FROM {source}", params).fetchall()
+        return sorted((row[0] for row in rows), key=lambda value: (value is None, value))
+
+    def breakdown(self, datasets=(), filters=None, group_by=('Extension',), order_by='Files', limit=DEFAULT_LIMIT,
+                  size_range=None):
+        """(groups, totals): files, bytes and sizes per group, largest first, and the totals of all matches"""
+        source, source_params = self._source(datasets)
+        where, where_params = self._where(filters or {}, size_range)
+        if not source_params[0]:
+            return None, {"files": 0, "bytes": 0}
+
+        columns = ", ".join(f"{GROUPINGS[name]} AS \"{name}\"" for name in group_by)
+        # Ties are broken by the groups themselves so results (and cached pages) are stable
+        tie_break = "".join(f', "{name}"' for name in group_by)
+        groups = self._query(f"""
+            SELECT {columns + ',' if columns else ''}
+                   COUNT(*) AS files,
+                   SUM(size)::BIGINT AS bytes,
+                   AVG(size) AS mean_size,
+                   MAX(size) AS max_size,
+                   -- Totals of every match, taken before LIMIT, so they cost no second scan
+                   SUM(COUNT(*)) OVER ()::BIGINT AS total_files,
+                   SUM(SUM(size)) OVER ()::BIGINT AS total_bytes
+            FROM {source} {where}
+            {'GROUP BY ALL' if columns else ''}
+            ORDER BY {ORDERINGS[order_by]} DESC{tie_break}
+            LIMIT {int(limit)}""", source_params + where_params)
+        totals = {"files": int(groups['total_files'].iloc[0]), "bytes": int(groups['total_bytes'].iloc[0])} \
+            if len(groups) else {"files": 0, "bytes": 0}
+        return groups.drop(columns=['total_files', 'total_bytes']), totals
+
+    def count(self, datasets=(), filters=None, size_range=None):
+        """Number of objects matching the filters"""
+        source, source_params = self._source(datasets)
+        if not source_params[0]:
+            return 0
+        where, where_params = self._where(filters or {}, size_range)
+        with self._cursor() as cursor:
+            return cursor.execute(f"SELECT COUNT(*) FROM {source} {where}", source_params + where_params).fetchone()[0]
+
+    @staticmethod
+    def _row_group_ends(files, after=None):
+        """(last key, rows) of every row group holding keys past `after`, in key order"""
+        import pyarrow.parquet as pq
+
+        ends = []
+        for path in files:
+            metadata = pq.ParquetFile(path).metadata
+            column = metadata.schema.to_arrow_schema().get_field_index('key')
+            for i in range(metadata.num_row_groups):
+                group = metadata.row_group(i)
+                statistics = group.column(column).statistics
+                if statistics is None or not statistics.has_min_max:
+                    return []
+                if after is None or statistics.max > after:
+                    ends.append((statistics.max, group.num_rows))
+        return sorted(ends)
+
+    def page(self, datasets=(), filters=None, size_range=None, after=None, page_size=DEFAULT_PAGE_SIZE):
+        """(objects, has_more): the first `page_size` matching objects in key order after the key `after`.
+
+        Pages are addressed by the last key of the previous page rather than an
+        offset. Partitions are written in key order, so row groups cover
+        disjoint key ranges: the query is bounded to the row groups that hold
+        the next page's worth of keys past the cursor (widened when filters
+        leave it short), and every page reads about the same few row groups
+        however deep it is.
+        """
+        source, source_params = self._source(datasets)
+        if not source_params[0]:
+            return None, False
+        limit = int(page_size) + 1
+        ends = self._row_group_ends(source_params[0], after)
+        needed = limit
+        while True:
+            rows = 0
+            until = None
+            for end, group_rows in ends:
+                rows += group_rows
+                if rows >= needed:
+                    until = end
+                    break
+            where, where_params = self._where(filters or {}, size_range, after, until)
+            # One extra row tells whether there is a next page
+            objects = self._query(f"""
+                SELECT {', '.join(BROWSER_COLUMNS)} FROM {source} {where}
+                ORDER BY key
+                LIMIT {limit}""", source_params + where_params)
+            if len(objects) == limit or until is None:
+                return objects.head(page_size), len(objects) > page_size
+            needed *= 4
@@ -2,83 +2,143 @@
 FIXED: Detailed Dataset Analysis
 Properly handles S3 pagination to count ALL files
 """
-import boto3
-from collections import defaultdict, Counter
+import argparse
+from collections import Counter
 from pathlib import Path
 import json
-from tqdm import tqdm
+from image_headers import DEFAULT_PROBE_WORKERS, HeaderSummary, probe_headers
+from key_classifier import image_keys, layout_page_counts, page_arrays, size_strata
+from request_metrics import RequestMetrics, add_metrics_args, print_metrics
+from s3_client import get_s3_client
+from s3_inventory import InventoryReader
+from s3_listing import DEFAULT_MAX_WORKERS
+from size_sketch import StratifiedSizeSketches
+from storage_backends import S3Backend, add_backend_args, open_backend
 
 BUCKET = "ad-datascience"
 PREFIX = "image-datasets"
 
-def count_images_in_path(s3_client, bucket, prefix):
-    """Count all image files in an S3 path with proper pagination"""
-    paginator = s3_client.get_paginator('list_objects_v2')
-    count = 0
+SPLITS = ('train', 'test')
+LABELS = ('real', 'fake')
+CATEGORIES = [f"{split}_{label}" for split in SPLITS for label in LABELS]
+
+DATASETS = {
+    "cifake_v1_synthetic-real_combined": {
+        "name": "CIFAKE",
+        "source": "Kaggle",
+        "generator": "Unknown (mixed)",
+        "real_source": "CIFAR-10 (real photos)"
+    },
+    "stable-diffusion-faces_v1_ai-generated": {
+        "name": "Stable Diffusion Faces",
+        "source": "Hugging Face",
+        "generator": "Stable Diffusion v1.4",
+        "real_source": "None (all AI-generated)"
+    },
+    "ai-generated-vs-real_v1_fake-real_combined": {
+        "name": "AI-Generated vs Real",
+        "source": "Kaggle",
+        "generator": "Multiple GANs (StyleGAN, ProGAN, etc.)",
+        "real_source": "Mixed real photos (various sources)"
+    },
+    "diffusiondb_v1_prompts_2m": {
+        "name": "DiffusionDB",
+        "source": "Hugging Face",
+        "generator": "Stable Diffusion v1.4",
+        "real_source": "None (all AI-generated)"
+    },
+    "aigi-holmes": {
+        "name": "AIGI-Holmes",
+        "source": "Hugging Face",
+        "generator": "Multiple (FLUX, Stable Diffusion, DALL-E 3, Midjourney v6)",
+        "real_source": "Real camera photos (various photographers)"
+    },
+    "br-gen": {
+        "name": "BR-Gen",
+        "source": "Google Drive",
+        "generator": "AI Inpainting (DeepFill, EdgeConnect, CoModGAN)",
+        "real_source": "COCO/ImageNet/Places365 (not included - need separate download)"
+    }
+}
+
+def add_page_sizes(size_sketches, page, root):
+    """Add a listing page's object sizes (not folder markers) to per split/label/extension sketches"""
+    page = [obj for obj in page if not obj['Key'].endswith('/')]
+    keys, sizes = page_arrays(page)
+    size_sketches.add_page(size_strata(keys, root), sizes)
+
+def count_dataset_images(backend, dataset_prefix, max_workers=DEFAULT_MAX_WORKERS, probe_workers=None,
+                         size_sketches=None, metrics=None):
+    """Count images under a dataset root in one listing pass, bucketed by split/label.
+    
+    With `probe_workers`, every image's header is also fetched (first few KB
+    only) while listing continues, and a HeaderSummary is returned; otherwise None.
+    Object sizes are added to `size_sketches` if given; listing waits and
+    page aggregation are timed in `metrics`.
+    """
+    root = dataset_prefix.rstrip('/') + '/'
+    metrics = metrics if metrics is not None else RequestMetrics()
+    counts = Counter({category: 0 for category in CATEGORIES})
+    outside_layout = Counter()
+    non_image = 0
+    headers = HeaderSummary() if probe_workers else None
+    
+    def count_page(page):
+        """Aggregate one listing page; returns its image keys when headers are probed"""
+        nonlocal non_image
+        with metrics.timer('aggregation'):
+            # Each page is bucketed by split/label in one vectorized pass
+            keys = [obj['Key'] for obj in page]
+            page_counts, page_outside, page_non_image = layout_page_counts(keys, root)
+            counts.update(page_counts)
+            outside_layout.update(page_outside)
+            non_image += page_non_image
+            if size_sketches is not None:
+                add_page_sizes(size_sketches, page, root)
+            return image_keys(keys) if headers is not None else []
+    
+    def listed_images():
+        for _, page in metrics.timed_pages(backend.iter_pages(root, max_workers)):
+            yield from count_page(page)
     
     try:
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    key = obj['Key'].lower()
-                    if any(key.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.webp', '.bmp']):
-                        count += 1
+        if headers is None:
+            for _ in listed_images():
+                pass
+        else:
+            for key, header in probe_headers(backend, listed_images(), probe_workers):
+                headers.add(key, header)
     except Exception as e:
-        print(f"      Error counting {prefix}: {e}")
+        print(f"      Error counting {root}: {e}")
     
-    return count
+    return counts, outside_layout, non_image, headers
 
-def analyze_all_datasets():
+def analyze_all_datasets(max_workers=DEFAULT_MAX_WORKERS, manifest=None, inventory=None, backend=None,
+                         probe_workers=None, metrics_file="analysis_metrics.json"):
     """Analyze all datasets for detailed statistics"""
     
     print("="*70)
     print("📊 DETAILED DATASET ANALYSIS (FIXED)")
     print("="*70)
     
-    s3 = boto3.client('s3')
-    
-    datasets = {
-        "cifake_v1_synthetic-real_combined": {
-            "name": "CIFAKE",
-            "source": "Kaggle",
-            "generator": "Unknown (mixed)",
-            "real_source": "CIFAR-10 (real photos)"
-        },
-        "stable-diffusion-faces_v1_ai-generated": {
-            "name": "Stable Diffusion Faces",
-            "source": "Hugging Face",
-            "generator": "Stable Diffusion v1.4",
-            "real_source": "None (all AI-generated)"
-        },
-        "ai-generated-vs-real_v1_fake-real_combined": {
-            "name": "AI-Generated vs Real",
-            "source": "Kaggle",
-            "generator": "Multiple GANs (StyleGAN, ProGAN, etc.)",
-            "real_source": "Mixed real photos (various sources)"
-        },
-        "diffusiondb_v1_prompts_2m": {
-            "name": "DiffusionDB",
-            "source": "Hugging Face",
-            "generator": "Stable Diffusion v1.4",
-            "real_source": "None (all AI-generated)"
-        },
-        "aigi-holmes": {
-            "name": "AIGI-Holmes",
-            "source": "Hugging Face",
-            "generator": "Multiple (FLUX, Stable Diffusion, DALL-E 3, Midjourney v6)",
-            "real_source": "Real camera photos (various photographers)"
-        },
-        "br-gen": {
-            "name": "BR-Gen",
-            "source": "Google Drive",
-            "generator": "AI Inpainting (DeepFill, EdgeConnect, CoModGAN)",
-            "real_source": "COCO/ImageNet/Places365 (not included - need separate download)"
-        }
-    }
+    if backend is None:
+        s3 = get_s3_client(max_workers)
+        if isinstance(inventory, str):
+            inventory = InventoryReader(inventory, s3)
+        backend = S3Backend(BUCKET, s3, manifest=manifest, inventory=inventory)
+    # Every S3 request and the time spent between them, reported at the end
+    metrics = RequestMetrics()
+    if isinstance(backend, S3Backend):
+        metrics.attach(backend.s3_client)
+    if getattr(backend, 'inventory', None) is not None:
+        print(f"📦 Using S3 Inventory ({backend.inventory.file_format}, {len(backend.inventory.files)} data files)")
+        # One pass over the report for every dataset, instead of one per dataset
+        backend.inventory.partition([f"{PREFIX}/{dataset_key}/" for dataset_key in DATASETS])
+    print(f"📍 Reading objects from {backend.url(PREFIX)}")
     
     results = []
     
-    for dataset_key, info in datasets.items():
+    for dataset_key, info in DATASETS.items():
         print(f"\n{'='*70}")
         print(f"📦 Analyzing: {info['name']}")
         print(f"{'='*70}")
@@ -94,24 +154,44 @@ def analyze_all_datasets():
             "source": info['source']
         }
         
-        # Define paths to check
-        paths = {
-            'train_real': f"{dataset_prefix}/train/real/",
-            'train_fake': f"{dataset_prefix}/train/fake/",
-            'test_real': f"{dataset_prefix}/test/real/",
-            'test_fake': f"{dataset_prefix}/test/fake/",
-        }
-        
         print("   Counting files (this may take a moment)...")
         
-        for key, path in paths.items():
-            count = count_images_in_path(s3, BUCKET, path)
-            stats[key] = count
-            print(f"   {key.replace('_', ' ').title()}: {count:,}")
+        size_sketches = StratifiedSizeSketches()
+        counts, outside_layout, non_image, headers = count_dataset_images(backend, dataset_prefix, max_workers,
+                                                                          probe_workers, size_sketches, metrics)
+        for key in CATEGORIES:
+            stats[key] = counts[key]
+            print(f"   {key.replace('_', ' ').title()}: {counts[key]:,}")
         
         stats['total'] = stats['train_real'] + stats['train_fake'] + stats['test_real'] + stats['test_fake']
+        stats['outside_layout'] = sum(outside_layout.values())
+        stats['outside_layout_folders'] = dict(outside_layout.most_common())
+        stats['non_image_files'] = non_image
         
         print(f"   📊 Total: {stats['total']:,}")
+        if outside_layout:
+            print(f"   ⚠️  Images outside train|test/real|fake: {stats['outside_layout']:,}")
+            for folder, count in outside_layout.most_common(5):
+                print(f"      {folder}/: {count:,}")
+        if non_image:
+            print(f"   📄 Non-image files: {non_image:,}")
+        stats['size_distribution'] = size_sketches.summary()
+        stats['size_sketches'] = size_sketches.to_dict()
+        all_sizes = size_sketches.combined().summary()
+        if all_sizes['count']:
+            print(f"   📏 File size p1/p50/p99/max: {all_sizes['p1']:,} / {all_sizes['p50']:,} / "
+                  f"{all_sizes['p99']:,} / {all_sizes['max']:,} bytes")
+        if all_sizes['zero_bytes']:
+            print(f"   ⚠️  Empty (0-byte) files: {all_sizes['zero_bytes']:,}")
+        if headers is not None:
+            stats['image_headers'] = headers.to_dict()
+            print(f"   🖼️  Headers probed: {headers.probed:,} ({headers.unreadable:,} unreadable)")
+            for resolution, count in list(stats['image_headers']['resolutions'].items())[:3]:
+                print(f"      {resolution}: {count:,}")
+            if headers.mismatches:
+                print(f"   ⚠️  Extension/format mismatches: {stats['image_headers']['extension_mismatches']:,}")
+                for mismatch, count in headers.mismatches.most_common(3):
+                    print(f"      {mismatch}: {count:,}")
         print(f"   🤖 Generator: {stats['generator']}")
         print(f"   📷 Real Source: {stats['real_source']}")
         
@@ -205,11 +285,30 @@ def analyze_all_datasets():
     print(f"\n✅ Analysis complete!")
     print(f"📄 Results saved to: {output_file}")
     
+    print_metrics(metrics)
+    metrics.save(metrics_file)
+    print(f"\n📄 Request metrics saved to: {metrics_file}")
+    
     return results
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Count train/test real/fake images in every dataset")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Listing threads per dataset (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--probe-headers', nargs='?', type=int, const=DEFAULT_PROBE_WORKERS, default=None,
+                        metavar='WORKERS',
+                        help="Range-GET the first KB of every image for resolution and true format "
+                             f"(default: {DEFAULT_PROBE_WORKERS} concurrent probes)")
+    add_backend_args(parser)
+    add_metrics_args(parser, "analysis_metrics.json")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        analyze_all_datasets()
+        backend = open_backend(args, BUCKET, args.list_workers + (args.probe_headers or 0))
+        analyze_all_datasets(args.list_workers, backend=backend, probe_workers=args.probe_headers,
+                             metrics_file=args.metrics_file)
     except KeyboardInterrupt:
         print("\n\n⚠️  Analysis interrupted")
     except Exception as e:
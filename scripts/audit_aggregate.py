@@ -0,0 +1,130 @@
+"""
+Audit Aggregates
+The per-dataset audit statistics as one mergeable, serializable value, so shards, worker
+processes, checkpoints and separate runs can each produce partials that reduce to the same result
+"""
+import json
+import zlib
+from collections import Counter
+from pathlib import Path
+
+from key_classifier import audit_page_counts
+from sampling import DEFAULT_SAMPLES_PER_STRATUM, DEFAULT_SAMPLE_SEED, StratifiedSampler
+from size_sketch import StratifiedSizeSketches
+
+AGGREGATE_VERSION = 1
+# Binary encoding: magic, then zlib-compressed JSON
+BINARY_MAGIC = b"AAG1"
+PARTIAL_SUFFIX = ".audit.bin"
+
+class AuditAggregate:
+    """File and byte totals, extension and folder counts, size sketches and samples of a dataset.
+
+    merge() is associative and commutative (every part is a sum, a bottom-k sample
+    or a histogram), so partials can be combined in any grouping and order.
+    """
+
+    def __init__(self, prefix, samples_per_stratum=DEFAULT_SAMPLES_PER_STRATUM, sample_seed=DEFAULT_SAMPLE_SEED):
+        self.prefix = prefix
+        self.total_files = 0
+        self.total_size = 0
+        self.file_extensions = Counter()
+        self.folder_structure = Counter()
+        # Reproducible samples per split/label, independent of listing order
+        self.sampler = StratifiedSampler(samples_per_stratum, sample_seed)
+        # Size quantiles per split/label/extension at constant memory
+        self.size_sketches = StratifiedSizeSketches()
+
+    def add_page(self, page):
+        """Aggregate one listing page; returns the number of files counted"""
+        # Extensions and first-level folders for the whole page in one vectorized pass
+        page_counts = audit_page_counts(page, self.prefix)
+        self.total_files += page_counts['files']
+        self.total_size += page_counts['size']
+        self.file_extensions.update(page_counts['extensions'])
+        self.folder_structure.update(page_counts['folders'])
+        self.size_sketches.add_page(page_counts['strata'], page_counts['sizes'])
+        self.sampler.add_page([obj['Key'] for obj in page if obj['Key'] not in (self.prefix, self.prefix + '/')],
+                              self.prefix)
+        return page_counts['files']
+
+    def merge(self, other):
+        """Fold another partial of the same dataset into this one; returns self"""
+        if other.prefix != self.prefix:
+            raise ValueError(f"Cannot merge aggregates of {other.prefix} into {self.prefix}")
+        if (other.sampler.per_stratum, other.sampler.seed) != (self.sampler.per_stratum, self.sampler.seed):
+            raise ValueError("Cannot merge aggregates sampled with different sizes or seeds")
+        self.total_files += other.total_files
+        self.total_size += other.total_size
+        self.file_extensions.update(other.file_extensions)
+        self.folder_structure.update(other.folder_structure)
+        self.size_sketches.merge(other.size_sketches)
+        self.sampler.merge(other.sampler)
+        return self
+
+    def to_dict(self):
+        return {
+            "version": AGGREGATE_VERSION,
+            "prefix": self.prefix,
+            "total_files": self.total_files,
+            "total_size": self.total_size,
+            "file_extensions": dict(self.file_extensions),
+            "folder_structure": dict(self.folder_structure),
+            "samples": self.sampler.state(),
+            "size_sketches": self.size_sketches.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state, prefix=None):
+        aggregate = cls(state.get("prefix", prefix))
+        aggregate.total_files = state["total_files"]
+        aggregate.total_size = state["total_size"]
+        aggregate.file_extensions.update(state["file_extensions"])
+        aggregate.folder_structure.update(state["folder_structure"])
+        aggregate.sampler = StratifiedSampler.from_state(state["samples"])
+        aggregate.size_sketches = StratifiedSizeSketches.from_dict(state["size_sketches"])
+        return aggregate
+
+    def to_bytes(self):
+        return BINARY_MAGIC + zlib.compress(json.dumps(self.to_dict(), separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError("Not an encoded audit aggregate")
+        return cls.from_dict(json.loads(zlib.decompress(data[len(BINARY_MAGIC):])))
+
+    def to_audit(self):
+        """The per-dataset entry of s3_dataset_audit.json: size quantiles only, the sketches stay in partials"""
+        return {
+            "dataset": self.prefix,
+            "total_files": self.total_files,
+            "total_size_gb": round(self.total_size / (1024**3), 2),
+            "folders": dict(self.folder_structure),
+            "extensions": dict(self.file_extensions),
+            "size_distribution": self.size_sketches.summary(),
+            "samples": self.sampler.samples(),
+        }
+
+def partial_path(directory, prefix, name):
+    """Where a partial named `name` for dataset `prefix` is stored"""
+    return Path(directory) / f"{prefix.strip('/').replace('/', '__')}.{name}{PARTIAL_SUFFIX}"
+
+def save_partial(aggregate, directory, name):
+    path = partial_path(directory, aggregate.prefix, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(aggregate.to_bytes())
+    tmp_path.replace(path)
+    return path
+
+def reduce_partials(paths):
+    """Merge encoded partials into one aggregate per dataset prefix"""
+    merged = {}
+    for path in paths:
+        aggregate = AuditAggregate.from_bytes(Path(path).read_bytes())
+        if aggregate.prefix in merged:
+            merged[aggregate.prefix].merge(aggregate)
+        else:
+            merged[aggregate.prefix] = aggregate
+    return merged
@@ -2,93 +2,395 @@
 S3 Dataset Audit Script
 Checks structure and file types in all image datasets
 """
-import boto3
-from collections import defaultdict, Counter
+import argparse
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import json
+from tqdm import tqdm
+from audit_aggregate import AuditAggregate, PARTIAL_SUFFIX, reduce_partials, save_partial
+from listing_checkpoint import ListingCheckpoint, add_checkpoint_args
+from object_index import DEFAULT_INDEX_DIR, ObjectIndexWriter
+from s3_listing import DEFAULT_MAX_WORKERS, cancel_listings
+from request_metrics import RequestMetrics, add_metrics_args, print_metrics
+from s3_client import get_s3_client
+from sampling import DEFAULT_SAMPLES_PER_STRATUM, DEFAULT_SAMPLE_SEED, add_sampling_args
+from storage_backends import LocalBackend, S3Backend, add_backend_args, open_backend
+from work_queue import DEFAULT_LEASE_SECONDS, POLL_INTERVAL, WorkQueue, default_worker_name
 
-def audit_dataset(bucket, prefix):
-    """Audit a single dataset folder"""
+def print_audit_header(location):
+    """Print the banner shown before a dataset is audited"""
     print(f"\n{'='*70}")
-    print(f"📊 AUDITING: s3://{bucket}/{prefix}")
+    print(f"📊 AUDITING: {location}")
     print(f"{'='*70}")
+
+def print_audit_report(audit):
+    """Print the statistics, folders, file types and samples of one audit result"""
+    print(f"\n📈 STATISTICS:")
+    print(f"   Total Files: {audit['total_files']:,}")
+    print(f"   Total Size: {audit['total_size_gb']:.2f} GB")
+    
+    if audit.get('size_distribution'):
+        print(f"\n📏 FILE SIZES (split/label/extension):")
+        for stratum, sizes in audit['size_distribution'].items():
+            print(f"   {stratum}: {sizes['count']:,} files, p1 {sizes['p1']:,} B, p50 {sizes['p50']:,} B, "
+                  f"p99 {sizes['p99']:,} B, max {sizes['max']:,} B")
+            if sizes['zero_bytes']:
+                print(f"      ⚠️  {sizes['zero_bytes']:,} empty (0-byte) files")
+    
+    print(f"\n📁 FOLDER STRUCTURE:")
+    if audit['folders']:
+        for folder, count in sorted(audit['folders'].items()):
+            print(f"   {folder}/: {count:,} files")
+    else:
+        print("   ⚠️  No folder structure (flat hierarchy)")
+    
+    print(f"\n📄 FILE TYPES:")
+    for ext, count in Counter(audit['extensions']).most_common():
+        print(f"   {ext}: {count:,} files")
+    
+    print(f"\n🔍 SAMPLE FILES (per split/label):")
+    for stratum, samples in audit['samples'].items():
+        print(f"   {stratum}:")
+        for sample in samples:
+            print(f"      {sample}")
+
+def audit_dataset(bucket, prefix, max_workers=DEFAULT_MAX_WORKERS, verbose=True, progress=None,
+                  backend=None, checkpoint_dir=None, resume=False, index_dir=None,
+                  samples_per_stratum=DEFAULT_SAMPLES_PER_STRATUM, sample_seed=DEFAULT_SAMPLE_SEED,
+                  partials_dir=None, metrics=None):
+    """Audit a single dataset folder (listing waits and aggregation are timed in `metrics`)"""
+    backend = backend or S3Backend(bucket)
+    metrics = metrics if metrics is not None else RequestMetrics()
+    if verbose:
+        print_audit_header(backend.url(prefix))
     
-    s3 = boto3.client('s3')
-    paginator = s3.get_paginator('list_objects_v2')
+    # Live S3 listings are checkpointed; the manifest, inventory and local sources don't need it
+    checkpoint = None
+    resumed = None
+    if backend.checkpointable and checkpoint_dir is not None:
+        checkpoint = ListingCheckpoint(checkpoint_dir, bucket, prefix)
+        resumed = checkpoint.load() if resume else None
     
-    # Statistics
-    total_files = 0
-    total_size = 0
-    file_extensions = Counter()
-    folder_structure = defaultdict(int)
-    sample_files = []
+    # Statistics, as one mergeable aggregate
+    aggregate = AuditAggregate(prefix, samples_per_stratum, sample_seed)
+    if resumed:
+        aggregate = AuditAggregate.from_dict(resumed, prefix)
+        if progress is not None:
+            progress.update(aggregate.total_files)
+        if verbose:
+            print(f"   ♻️  Resuming from checkpoint: {aggregate.total_files:,} files already counted")
     
+    # Every listed object also goes into the local Parquet object index
+    index_writer = None
+    if index_dir is not None:
+        keep_parts = resumed.get('index_parts') if resumed else None
+        if resumed and keep_parts is None:
+            print(f"   ⚠️  Checkpoint for {prefix} predates --index-dir; index not written on this run")
+        else:
+            index_writer = ObjectIndexWriter(index_dir, prefix, keep_parts=keep_parts)
+    
+    def snapshot():
+        state = aggregate.to_dict()
+        # Index parts written up to this checkpoint; later parts are dropped on resume
+        if index_writer is not None:
+            state["index_parts"] = index_writer.rotate()
+        return state
+    
+    in_page = False
     try:
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            if 'Contents' not in page:
-                print("   ⚠️  No files found")
-                return None
+        if checkpoint is not None:
+            if resumed is None:
+                checkpoint.start(backend.s3_client)
+            pages = checkpoint.iter_pages(backend.s3_client, max_workers)
+        else:
+            pages = backend.iter_pages(prefix, max_workers)
+        
+        for shard, page in metrics.timed_pages(pages):
+            if page is None:
+                checkpoint.shard_done(shard)
+                continue
             
-            for obj in page['Contents']:
-                key = obj['Key']
-                size = obj['Size']
-                
-                # Skip the prefix itself
-                if key == prefix or key == prefix + '/':
-                    continue
-                
-                total_files += 1
-                total_size += size
-                
-                # Get file extension
-                ext = Path(key).suffix.lower()
-                if ext:
-                    file_extensions[ext] += 1
-                
-                # Get folder structure (first level after prefix)
-                relative_path = key.replace(prefix + '/', '', 1)
-                parts = relative_path.split('/')
-                if len(parts) > 1:
-                    folder_structure[parts[0]] += 1
-                
-                # Collect samples
-                if len(sample_files) < 10:
-                    sample_files.append(key)
+            in_page = True
+            with metrics.timer('aggregation'):
+                page_files = aggregate.add_page(page)
+            if index_writer is not None:
+                with metrics.timer('index_writing'):
+                    index_writer.add_page(page)
+            if progress is not None:
+                progress.update(page_files)
+            if checkpoint is not None:
+                checkpoint.page_done(shard, page, snapshot)
+            in_page = False
         
-        # Print results
-        print(f"\n📈 STATISTICS:")
-        print(f"   Total Files: {total_files:,}")
-        print(f"   Total Size: {total_size / (1024**3):.2f} GB")
+        if checkpoint is not None:
+            checkpoint.clear()
+        if index_writer is not None:
+            index_writer.close(complete=True)
+            index_writer = None
         
-        print(f"\n📁 FOLDER STRUCTURE:")
-        if folder_structure:
-            for folder, count in sorted(folder_structure.items()):
-                print(f"   {folder}/: {count:,} files")
-        else:
-            print("   ⚠️  No folder structure (flat hierarchy)")
+        if partials_dir is not None:
+            save_partial(aggregate, partials_dir, "full")
         
-        print(f"\n📄 FILE TYPES:")
-        for ext, count in file_extensions.most_common():
-            print(f"   {ext}: {count:,} files")
-        
-        print(f"\n🔍 SAMPLE FILES (first 10):")
-        for sample in sample_files[:10]:
-            print(f"   {sample}")
+        if aggregate.total_files == 0:
+            if verbose:
+                print("   ⚠️  No files found")
+            return None
         
-        # Return audit results
-        return {
-            "dataset": prefix,
-            "total_files": total_files,
-            "total_size_gb": round(total_size / (1024**3), 2),
-            "folders": dict(folder_structure),
-            "extensions": dict(file_extensions),
-            "samples": sample_files[:10]
-        }
+        # Audit results
+        audit = aggregate.to_audit()
+        if verbose:
+            print_audit_report(audit)
+        return audit
+    
+    except KeyboardInterrupt:
+        # A half-aggregated page would be counted twice on resume; keep the last saved state instead
+        if checkpoint is not None and not in_page:
+            checkpoint.save(snapshot())
+        if index_writer is not None:
+            index_writer.close(complete=False)
+        raise
     
     except Exception as e:
-        print(f"   ❌ Error: {e}")
+        message = f"   ❌ Error: {e}" if verbose else f"   ❌ Error auditing {prefix}: {e}"
+        if checkpoint is not None and not in_page:
+            checkpoint.save(snapshot())
+            message += f"\n   💾 Progress saved ({aggregate.total_files:,} files); re-run with --resume to continue"
+        if index_writer is not None:
+            index_writer.close(complete=False)
+        if verbose:
+            print(message)
+        else:
+            tqdm.write(message)
         return None
 
+def audit_datasets_concurrently(bucket, datasets, width, max_workers=DEFAULT_MAX_WORKERS, backend=None,
+                                checkpoint_dir=None, resume=False, index_dir=None,
+                                samples_per_stratum=DEFAULT_SAMPLES_PER_STRATUM, sample_seed=DEFAULT_SAMPLE_SEED,
+                                partials_dir=None, metrics=None):
+    """Audit datasets in a worker pool; results come back in the order of `datasets`"""
+    results = {}
+    bars = {
+        prefix: tqdm(desc=prefix.split('/')[-1][:40].ljust(40), unit=" files", position=i, leave=True)
+        for i, prefix in enumerate(datasets)
+    }
+    
+    with ThreadPoolExecutor(max_workers=width) as pool:
+        futures = {
+            pool.submit(audit_dataset, bucket, prefix, max_workers, False, bars[prefix],
+                        backend=backend, checkpoint_dir=checkpoint_dir, resume=resume,
+                        index_dir=index_dir, samples_per_stratum=samples_per_stratum,
+                        sample_seed=sample_seed, partials_dir=partials_dir, metrics=metrics): prefix
+            for prefix in datasets
+        }
+        try:
+            for future in as_completed(futures):
+                prefix = futures[future]
+                try:
+                    results[prefix] = future.result()
+                except Exception as e:
+                    tqdm.write(f"   ❌ Error auditing {prefix}: {e}")
+                    results[prefix] = None
+                bars[prefix].set_postfix_str("✅ done" if results[prefix] else "❌ failed")
+        except KeyboardInterrupt:
+            # Let running audits checkpoint and stop before the pool shuts down
+            cancel_listings()
+            raise
+    
+    for bar in bars.values():
+        bar.close()
+    
+    return [results[prefix] for prefix in datasets]
+
+def audit_from_partials(directory, datasets):
+    """Audit results rebuilt by merging the partial aggregates saved in `directory`"""
+    partials = sorted(Path(directory).glob(f"*{PARTIAL_SUFFIX}"))
+    print(f"\n🧩 Merging {len(partials)} partial aggregates from {directory}")
+    merged = reduce_partials(partials)
+    audit_results = []
+    for dataset_prefix in datasets:
+        aggregate = merged.get(dataset_prefix)
+        print_audit_header(f"{dataset_prefix} (from partials)")
+        if aggregate is None or aggregate.total_files == 0:
+            print("   ⚠️  No partials with files for this dataset")
+            audit_results.append(None)
+            continue
+        audit_results.append(aggregate.to_audit())
+        print_audit_report(audit_results[-1])
+    return audit_results
+
+def audit_shards(queue_path, threads=DEFAULT_MAX_WORKERS, lease_seconds=DEFAULT_LEASE_SECONDS, name=None,
+                 metrics=None):
+    """Distributed worker: lease shards from the queue and hand back partial aggregates until it is drained"""
+    work = WorkQueue(queue_path)
+    metrics = metrics if metrics is not None else RequestMetrics()
+    name = name or default_worker_name()
+    # Workers may start before the coordinator has published the shards
+    config = work.config()
+    while config is None:
+        time.sleep(POLL_INTERVAL)
+        config = work.config()
+    if config["local_root"]:
+        backend = LocalBackend(config["local_root"])
+    else:
+        backend = S3Backend(config["bucket"], metrics.attach(get_s3_client(threads)))
+    
+    stop = threading.Event()
+    totals = Counter()
+    lock = threading.Lock()
+    
+    def run(slot):
+        worker = f"{name}/{slot}"
+        while not stop.is_set():
+            lease = work.lease(worker, lease_seconds)
+            if lease is None:
+                if work.finished():
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            
+            aggregate = AuditAggregate(lease.dataset, config["samples_per_stratum"], config["sample_seed"])
+            try:
+                with work.keep_alive(lease, lease_seconds) as lost:
+                    for page in metrics.timed_pages(backend.iter_shard_pages(lease.shard)):
+                        if lost.is_set() or stop.is_set():
+                            break
+                        with metrics.timer('aggregation'):
+                            aggregate.add_page(page)
+            except Exception as e:
+                work.fail(lease, e)
+                with lock:
+                    totals["errors"] += 1
+                continue
+            
+            if stop.is_set():
+                work.release(lease)
+            elif not lost.is_set() and work.complete(lease, aggregate.to_bytes(), aggregate.total_files):
+                with lock:
+                    totals["shards"] += 1
+                    totals["files"] += aggregate.total_files
+    
+    print(f"👷 Worker {name}: {threads} threads on {queue_path}")
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(run, slot) for slot in range(threads)]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except KeyboardInterrupt:
+            # Unfinished shards go back to the queue for other workers
+            stop.set()
+            raise
+        finally:
+            # Next to the partials, so the coordinator can report every worker's requests
+            work.save_metrics(name, metrics.state())
+    print(f"👷 Worker {name} finished: {totals['shards']:,} shards, {totals['files']:,} files, "
+          f"{totals['errors']:,} errors")
+    return dict(totals)
+
+def audit_distributed(queue_path, bucket, datasets, backend, local_workers=0, max_workers=DEFAULT_MAX_WORKERS,
+                      samples_per_stratum=DEFAULT_SAMPLES_PER_STRATUM, sample_seed=DEFAULT_SAMPLE_SEED,
+                      lease_seconds=DEFAULT_LEASE_SECONDS, partials_dir=None, metrics=None):
+    """Coordinator: publish every dataset's shards to the queue, wait for workers and merge their partials.
+
+    Shards are enqueued as discovery finds them, with workers already running,
+    so listing starts with the first discovered folder rather than after the
+    whole bucket has been walked. The request metrics workers stored in the
+    queue (those that finished by then) are merged into `metrics`.
+    """
+    work = WorkQueue(queue_path)
+    config = {
+        "bucket": bucket,
+        "local_root": str(backend.root) if isinstance(backend, LocalBackend) else None,
+        "datasets": datasets,
+        "samples_per_stratum": samples_per_stratum,
+        "sample_seed": sample_seed,
+    }
+    if work.publish(config):
+        print(f"\n📤 Publishing shards of {len(datasets)} datasets to {queue_path} as they are discovered")
+    elif work.config() != config:
+        raise ValueError(f"{queue_path} holds a different audit run; use a new queue file")
+    
+    progress = work.progress()
+    if progress["done"]:
+        print(f"\n♻️  Continuing queue: {progress['done']:,} shards already done")
+    
+    # Workers on this host; more can join from any host that sees the queue file
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=audit_shards, args=(queue_path, max_workers, lease_seconds,
+                                                   f"{default_worker_name()}-{i}"))
+        for i in range(local_workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"⏳ Waiting for workers (start more with: python audit_s3_datasets.py --worker {queue_path})\n")
+    
+    def show(bar, progress):
+        bar.total = sum(progress[state] for state in ("pending", "leased", "done", "failed"))
+        bar.n = progress["done"] + progress["failed"]
+        bar.set_postfix_str(f"{progress['files']:,} files, {progress['leased']} leased, "
+                            f"{progress['failed']} failed" + ("" if progress["sealed"] else ", discovering"))
+        bar.refresh()
+    
+    try:
+        with tqdm(total=0, desc="Shards", unit=" shards") as bar:
+            if not progress["sealed"]:
+                last_shown = 0.0
+                for prefix in datasets:
+                    if not work.begin_discovery(prefix):
+                        continue
+                    for shard in backend.iter_discovered_shards(prefix):
+                        work.enqueue(prefix, [shard])
+                        if time.monotonic() - last_shown > POLL_INTERVAL:
+                            show(bar, work.progress())
+                            last_shown = time.monotonic()
+                    work.end_discovery(prefix)
+                work.seal()
+            while True:
+                progress = work.progress()
+                show(bar, progress)
+                if progress["pending"] == 0 and progress["leased"] == 0:
+                    break
+                time.sleep(POLL_INTERVAL)
+    except BaseException:
+        # Unsealed, the queue would keep local workers waiting for shards that never come
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+    
+    if metrics is not None:
+        for state in work.worker_metrics():
+            metrics.merge_state(state)
+    
+    audit_results = []
+    for prefix in datasets:
+        aggregate = AuditAggregate(prefix, samples_per_stratum, sample_seed)
+        for partial in work.partials(prefix):
+            aggregate.merge(AuditAggregate.from_bytes(partial))
+        if partials_dir is not None:
+            save_partial(aggregate, partials_dir, "full")
+        
+        print_audit_header(f"{backend.url(prefix)} (distributed)")
+        failures = work.failures(prefix)
+        if failures:
+            print(f"   ❌ {len(failures)} shards failed; the audit would be incomplete")
+            for shard, error in failures[:5]:
+                print(f"      {shard.prefix} (after {shard.start_after}): {error}")
+            audit_results.append(None)
+        elif aggregate.total_files == 0:
+            print("   ⚠️  No files found")
+            audit_results.append(None)
+        else:
+            audit_results.append(aggregate.to_audit())
+            print_audit_report(audit_results[-1])
+    return audit_results
+
 def check_standardization(audit_results):
     """Check if dataset follows standard train/real, train/fake structure"""
     folders = audit_results.get('folders', {})
@@ -127,7 +429,56 @@ def check_standardization(audit_results):
     
     return issues
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Audit structure and file types of the S3 image datasets")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Number of datasets to audit at the same time (default: 1, sequential)")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Listing threads per dataset (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--index-dir', nargs='?', const=DEFAULT_INDEX_DIR, default=None,
+                        help=f"Also write every listed object to a Parquet index (default dir: {DEFAULT_INDEX_DIR})")
+    parser.add_argument('--partials-dir', metavar='DIR',
+                        help="Also save each dataset's statistics as a mergeable partial aggregate in DIR")
+    parser.add_argument('--from-partials', metavar='DIR',
+                        help="Build the audit report by merging the partial aggregates in DIR instead of listing")
+    parser.add_argument('--coordinate', metavar='QUEUE_DB',
+                        help="Distributed audit: publish shards to the SQLite work queue QUEUE_DB (on disk shared "
+                             "with the workers) and merge the partials workers hand back")
+    parser.add_argument('--worker', metavar='QUEUE_DB',
+                        help="Run as a distributed worker on QUEUE_DB until its shards are done "
+                             "(uses --list-workers threads)")
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help="With --coordinate, worker processes to start on this host (default: 0)")
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                        help=f"How long a silent worker keeps a shard before it is re-queued "
+                             f"(default: {DEFAULT_LEASE_SECONDS})")
+    add_backend_args(parser)
+    add_checkpoint_args(parser)
+    add_sampling_args(parser)
+    add_metrics_args(parser, "audit_metrics.json")
+    args = parser.parse_args()
+    if args.coordinate and args.inventory:
+        parser.error("--coordinate shards live listings; it can't be combined with --inventory")
+    if args.coordinate and args.manifest:
+        # Workers on other hosts list their shards live; the manifest is a single-host cache
+        parser.error("--coordinate lists shards on every worker; it can't be combined with --manifest")
+    if args.resume and args.local_root:
+        parser.error("--resume only applies to S3 listings; local scans simply run again")
+    if args.resume and args.manifest and not args.inventory:
+        parser.error("--resume continues live listings; with --manifest an interrupted run keeps "
+                     "every shard it finished and re-lists only the rest, so use one or the other")
+    return args
+
 def main():
+    args = parse_args()
+    metrics = RequestMetrics()
+    if args.worker:
+        audit_shards(args.worker, args.list_workers, args.lease_seconds, metrics=metrics)
+        print_metrics(metrics)
+        metrics.save(args.metrics_file)
+        print(f"\n📄 Request metrics saved to: {args.metrics_file}")
+        return
+    
     print("="*70)
     print("🔍 S3 DATASET AUDIT - ALL IMAGE DATASETS")
     print("="*70)
@@ -147,8 +498,48 @@ def main():
     all_audits = []
     all_issues = []
     
-    for dataset_prefix in datasets:
-        audit_result = audit_dataset(BUCKET, dataset_prefix)
+    manifest = None
+    if args.from_partials:
+        audit_results = audit_from_partials(args.from_partials, datasets)
+    else:
+        # One client for every dataset, with a connection per concurrent listing thread
+        backend = open_backend(args, BUCKET, max(1, args.concurrency) * args.list_workers)
+        manifest = getattr(backend, 'manifest', None)
+        if isinstance(backend, S3Backend):
+            metrics.attach(backend.s3_client)
+        if isinstance(backend, LocalBackend):
+            print(f"\n💽 Auditing local copy: {backend.root}")
+        elif backend.inventory is not None:
+            inventory = backend.inventory
+            print(f"\n📦 Using S3 Inventory ({inventory.file_format}, {len(inventory.files)} data files): {args.inventory}")
+            # One pass over the report for every dataset, instead of one per dataset
+            inventory.partition(datasets)
+        
+        if args.coordinate:
+            audit_results = audit_distributed(args.coordinate, BUCKET, datasets, backend, args.local_workers,
+                                              args.list_workers, args.samples_per_stratum, args.sample_seed,
+                                              args.lease_seconds, args.partials_dir, metrics)
+        elif args.concurrency > 1:
+            print(f"\n⚡ Auditing {len(datasets)} datasets, {args.concurrency} at a time...\n")
+            audit_results = audit_datasets_concurrently(BUCKET, datasets, args.concurrency, args.list_workers,
+                                                        backend, args.checkpoint_dir, args.resume, args.index_dir,
+                                                        args.samples_per_stratum, args.sample_seed, args.partials_dir,
+                                                        metrics)
+            for dataset_prefix, audit_result in zip(datasets, audit_results):
+                print_audit_header(backend.url(dataset_prefix))
+                if audit_result:
+                    print_audit_report(audit_result)
+                else:
+                    print("   ❌ Audit failed or no files found")
+        else:
+            audit_results = [audit_dataset(BUCKET, dataset_prefix, args.list_workers, backend=backend,
+                                           checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+                                           index_dir=args.index_dir, samples_per_stratum=args.samples_per_stratum,
+                                           sample_seed=args.sample_seed, partials_dir=args.partials_dir,
+                                           metrics=metrics)
+                             for dataset_prefix in datasets]
+    
+    for dataset_prefix, audit_result in zip(datasets, audit_results):
         if audit_result:
             all_audits.append(audit_result)
             
@@ -172,6 +563,9 @@ def main():
     
     print(f"📊 Total Files: {total_files:,}")
     print(f"💾 Total Size: {total_size:.2f} GB")
+    if manifest is not None:
+        print(f"♻️  Listing manifest: {manifest.reused_shards:,} shards reused, "
+              f"{manifest.relisted_shards:,} re-listed")
     
     # Issues report
     print(f"\n🚨 STANDARDIZATION ISSUES FOUND:")
@@ -216,6 +610,10 @@ def main():
         print(f"      │   ├── real/")
         print(f"      │   └── fake/")
         print(f"      └── metadata/")
+    
+    print_metrics(metrics)
+    metrics.save(args.metrics_file)
+    print(f"\n📄 Request metrics saved to: {args.metrics_file}")
 
 if __name__ == "__main__":
     try:
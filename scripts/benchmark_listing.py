@@ -0,0 +1,165 @@
+"""
+S3 Listing Benchmark
+Compares the sequential paginator with the parallel sharded listing engine.
+
+By default runs against an in-memory S3 stand-in with simulated request latency.
+Pass --endpoint-url to benchmark a local S3-compatible server (MinIO, moto_server).
+"""
+import argparse
+import bisect
+import threading
+import time
+
+import boto3
+from s3_client import build_client_config
+from s3_listing import list_objects_parallel
+
+class FakeS3Paginator:
+    """Minimal list_objects_v2 paginator over a sorted key list"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix='', StartAfter=None, Delimiter=None, PaginationConfig=None):
+        keys = self.client.keys
+        page_size = (PaginationConfig or {}).get('PageSize', 1000)
+        start = bisect.bisect_right(keys, StartAfter) if StartAfter else 0
+        start = max(start, bisect.bisect_left(keys, Prefix))
+
+        while True:
+            time.sleep(self.client.latency)
+            self.client.count_request()
+            contents = []
+            common_prefixes = []
+            i = start
+            while i < len(keys) and len(contents) + len(common_prefixes) < page_size:
+                key = keys[i]
+                if not key.startswith(Prefix):
+                    i = len(keys)
+                    break
+                rest = key[len(Prefix):]
+                if Delimiter and Delimiter in rest:
+                    common = Prefix + rest.split(Delimiter, 1)[0] + Delimiter
+                    common_prefixes.append({'Prefix': common})
+                    # Skip every key rolled up under this common prefix
+                    i = bisect.bisect_left(keys, common + '\U0010ffff')
+                    continue
+                contents.append({'Key': key, 'Size': self.client.sizes.get(key, 1024), 'ETag': '"0"'})
+                i += 1
+
+            truncated = i < len(keys) and keys[i].startswith(Prefix)
+            page = {'IsTruncated': truncated}
+            if contents:
+                page['Contents'] = contents
+            if common_prefixes:
+                page['CommonPrefixes'] = common_prefixes
+            yield page
+            if not truncated:
+                return
+            start = i
+
+class FakeS3Client:
+    """In-memory S3 stand-in that charges a fixed latency per list request
+
+    Objects are 1 KiB unless `sizes` maps their key to another size.
+    """
+
+    def __init__(self, keys, latency, sizes=None):
+        self.keys = sorted(keys)
+        self.latency = latency
+        self.sizes = sizes or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def get_paginator(self, operation_name):
+        return FakeS3Paginator(self)
+
+    def list_objects_v2(self, MaxKeys=1000, **kwargs):
+        return next(iter(FakeS3Paginator(self).paginate(**kwargs, PaginationConfig={'PageSize': MaxKeys})))
+
+LAYOUTS = ('parts', 'leaves', 'flat')
+
+def build_fake_keys(prefix, folders, files_per_folder, layout='parts'):
+    """Generate a dataset-shaped key space.
+
+    parts:  <prefix>/<split>/<label>/part_<folder>/<file> (many small sub-folders)
+    leaves: <prefix>/<split>/<label>/<file>, the standard layout, `folders` x `files_per_folder` files per leaf
+    flat:   <prefix>/<file>, every file in one folder
+    """
+    keys = []
+    if layout == 'flat':
+        total = 4 * folders * files_per_folder
+        return [f"{prefix}/img_{i:06d}.jpg" for i in range(total)]
+    for split in ('train', 'test'):
+        for label in ('real', 'fake'):
+            for folder in range(folders):
+                for i in range(files_per_folder):
+                    if layout == 'leaves':
+                        keys.append(f"{prefix}/{split}/{label}/img_{folder * files_per_folder + i:06d}.jpg")
+                    else:
+                        keys.append(f"{prefix}/{split}/{label}/part_{folder:03d}/img_{i:06d}.jpg")
+    return keys
+
+def list_sequential(s3_client, bucket, prefix):
+    """Baseline: one paginator, one request in flight"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    count = 0
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        count += len(page.get('Contents', []))
+    return count
+
+def run(label, fn, client):
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    requests = f"  {client.requests:>6,} requests" if hasattr(client, 'requests') else ""
+    print(f"   {label:<28} {count:>10,} objects  {elapsed:8.2f}s  {count / elapsed:>12,.0f} obj/s{requests}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs parallel S3 listing")
+    parser.add_argument('--endpoint-url', help="Local S3-compatible endpoint (default: in-memory stand-in)")
+    parser.add_argument('--bucket', default="ad-datascience")
+    parser.add_argument('--prefix', default="image-datasets/benchmark")
+    parser.add_argument('--folders', type=int, default=25, help="Folders per split/label (stand-in only)")
+    parser.add_argument('--files-per-folder', type=int, default=2000, help="Files per folder (stand-in only)")
+    parser.add_argument('--latency', type=float, default=0.03, help="Seconds per request (stand-in only)")
+    parser.add_argument('--layout', choices=LAYOUTS + ('all',), default='all',
+                        help="Key layout of the stand-in (default: all)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16, 64])
+    args = parser.parse_args()
+
+    print("="*70)
+    print("⏱️  S3 LISTING BENCHMARK")
+    print("="*70)
+
+    if args.endpoint_url:
+        s3 = boto3.client('s3', endpoint_url=args.endpoint_url, config=build_client_config(max(args.workers)))
+        print(f"   Endpoint: {args.endpoint_url}")
+        print(f"   s3://{args.bucket}/{args.prefix}\n")
+        benchmark(lambda: s3, args)
+        return
+
+    for layout in (LAYOUTS if args.layout == 'all' else (args.layout,)):
+        keys = build_fake_keys(args.prefix, args.folders, args.files_per_folder, layout)
+        print(f"   In-memory stand-in, {layout} layout: {len(keys):,} keys, {args.latency * 1000:.0f} ms/request")
+        print(f"   s3://{args.bucket}/{args.prefix}\n")
+        benchmark(lambda: FakeS3Client(keys, args.latency), args)
+        print()
+
+def benchmark(make_client, args):
+    client = make_client()
+    baseline = run("sequential paginator", lambda: list_sequential(client, args.bucket, args.prefix), client)
+    for workers in args.workers:
+        client = make_client()
+        elapsed = run(f"parallel ({workers} workers)",
+                      lambda: sum(1 for _ in list_objects_parallel(client, args.bucket, args.prefix, workers)),
+                      client)
+        print(f"   {'':<28} speedup: {baseline / elapsed:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Exact Duplicate Detection
+Finds byte-identical files across and within the datasets by grouping listed objects on
+(size, ETag) in an on-disk SQLite index, hashing only objects whose ETag isn't a plain MD5
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import combinations, groupby
+from pathlib import Path
+
+from tqdm import tqdm
+
+from analyze_dataset_details_fixed import BUCKET, DATASETS, PREFIX
+from key_classifier import classify_page, page_arrays
+from s3_listing import DEFAULT_MAX_WORKERS
+from storage_backends import add_backend_args, object_unreadable, open_backend
+
+DEFAULT_HASH_WORKERS = 16
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_BATCH_SIZE = 1000
+SAMPLE_CLUSTERS = 20
+
+def plain_md5(etag):
+    """The content MD5 carried by a single-part upload's ETag; None for multipart or missing ETags"""
+    if not etag:
+        return None
+    etag = etag.strip('"')
+    return etag if len(etag) == 32 and '-' not in etag else None
+
+def content_md5(backend, key):
+    """MD5 of an object's content, streamed in chunks"""
+    digest = hashlib.md5()
+    with closing(backend.open_object(key)) as body:
+        for chunk in iter(lambda: body.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DuplicateIndex:
+    """Listed objects in SQLite, so grouping 300k+ objects never has to fit in memory"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                id INTEGER PRIMARY KEY,
+                dataset TEXT,
+                split TEXT,
+                key TEXT,
+                size INTEGER,
+                etag TEXT,
+                md5 TEXT
+            )""")
+
+    def add_page(self, dataset, root, page):
+        """Index one listing page of a dataset"""
+        keys, _ = page_arrays(page)
+        splits = classify_page(keys, root, fields=('split',))['split'].to_pylist()
+        self.db.executemany(
+            "INSERT INTO objects (dataset, split, key, size, etag, md5) VALUES (?, ?, ?, ?, ?, ?)",
+            [(dataset, split, obj['Key'], obj['Size'], obj.get('ETag'), plain_md5(obj.get('ETag')))
+             for obj, split in zip(page, splits)
+             if not obj['Key'].endswith('/')])
+        self.db.commit()
+
+    def _shared_sizes(self):
+        """Materialize the sizes held by more than one object into a temp table, once every page is indexed"""
+        self.db.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS shared_sizes AS
+            SELECT size FROM objects WHERE size > 0 GROUP BY size HAVING COUNT(*) > 1""")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS temp.shared_sizes_size ON shared_sizes (size)")
+
+    def _unhashed_batches(self):
+        """Objects without a content MD5 that share their size with another object, in id order"""
+        self._shared_sizes()
+        last_id = 0
+        while True:
+            batch = self.db.execute("""
+                SELECT id, key FROM objects
+                WHERE md5 IS NULL AND id > ? AND size IN shared_sizes
+                ORDER BY id LIMIT ?""", (last_id, HASH_BATCH_SIZE)).fetchall()
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+    def count_unhashed(self):
+        self._shared_sizes()
+        return self.db.execute(
+            "SELECT COUNT(*) FROM objects WHERE md5 IS NULL AND size IN shared_sizes").fetchone()[0]
+
+    def hash_ambiguous(self, backend, workers=DEFAULT_HASH_WORKERS, progress=None):
+        """Stream-hash multipart (and ETag-less local) objects that could still match another object.
+
+        Returns the keys of objects that were gone or archived by the time they
+        were read; they stay unhashed and out of every cluster.
+        """
+        def hash_object(key):
+            try:
+                return content_md5(backend, key)
+            except Exception as e:
+                if not object_unreadable(e):
+                    raise
+                return None
+
+        skipped = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch in self._unhashed_batches():
+                digests = list(pool.map(lambda row: hash_object(row[1]), batch))
+                skipped.extend(key for (_, key), digest in zip(batch, digests) if digest is None)
+                self.db.executemany("UPDATE objects SET md5 = ? WHERE id = ?",
+                                    [(digest, row_id) for (row_id, _), digest in zip(batch, digests)
+                                     if digest is not None])
+                self.db.commit()
+                if progress is not None:
+                    progress.update(len(batch))
+        return skipped
+
+    def iter_clusters(self):
+        """Yield (size, md5, members) per group of identical files; members are (dataset, split, key)"""
+        self.db.execute("CREATE INDEX IF NOT EXISTS objects_content ON objects (size, md5)")
+        rows = self.db.execute("""
+            SELECT o.size, o.md5, o.dataset, o.split, o.key
+            FROM objects o JOIN (
+                SELECT size, md5 FROM objects
+                WHERE md5 IS NOT NULL AND size > 0
+                GROUP BY size, md5 HAVING COUNT(*) > 1
+            ) d ON o.size = d.size AND o.md5 = d.md5
+            ORDER BY o.size, o.md5""")
+        for (size, md5), members in groupby(rows, key=lambda row: (row[0], row[1])):
+            yield size, md5, [(dataset, split, key) for _, _, dataset, split, key in members]
+
+    def count_empty(self):
+        return self.db.execute("SELECT COUNT(*) FROM objects WHERE size = 0").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+def summarize_clusters(clusters):
+    """Duplicate counts per dataset pair and per split pair, plus a few sample clusters"""
+    summary = {"clusters": 0, "duplicate_files": 0, "wasted_bytes": 0}
+    dataset_pairs = Counter()
+    split_pairs = Counter()
+    dataset_splits = {}
+    samples = []
+
+    for size, md5, members in clusters:
+        summary["clusters"] += 1
+        summary["duplicate_files"] += len(members) - 1
+        summary["wasted_bytes"] += size * (len(members) - 1)
+
+        # A pair is counted once per cluster in which both sides hold a copy
+        locations = Counter((dataset, split or '(none)') for dataset, split, _ in members)
+        datasets = Counter(dataset for dataset, _ in locations.elements())
+        for a, b in combinations(sorted(datasets), 2):
+            dataset_pairs[f"{a} | {b}"] += 1
+        for dataset, count in datasets.items():
+            if count > 1:
+                dataset_pairs[f"{dataset} | {dataset}"] += 1
+
+        for (dataset_a, split_a), (dataset_b, split_b) in combinations(sorted(locations), 2):
+            split_pairs[f"{split_a}/{split_b}"] += 1
+            if dataset_a == dataset_b:
+                dataset_splits.setdefault(dataset_a, Counter())[f"{split_a}/{split_b}"] += 1
+        for (dataset, split), count in locations.items():
+            if count > 1:
+                split_pairs[f"{split}/{split}"] += 1
+                dataset_splits.setdefault(dataset, Counter())[f"{split}/{split}"] += 1
+
+        if len(samples) < SAMPLE_CLUSTERS:
+            samples.append({"size": size, "md5": md5, "copies": len(members),
+                            "members": [key for _, _, key in members[:10]]})
+
+    return {
+        "summary": summary,
+        "dataset_pairs": dict(dataset_pairs.most_common()),
+        "split_pairs": dict(split_pairs.most_common()),
+        "dataset_splits": {dataset: dict(counts.most_common()) for dataset, counts in dataset_splits.items()},
+        "samples": samples,
+    }
+
+def find_duplicates(backend, db_path, max_workers=DEFAULT_MAX_WORKERS, hash_workers=DEFAULT_HASH_WORKERS):
+    """List every dataset into the index, resolve ambiguous ETags and report duplicate clusters"""
+    index = DuplicateIndex(db_path)
+    try:
+        for dataset_key, info in DATASETS.items():
+            root = f"{PREFIX}/{dataset_key}/"
+            with tqdm(desc=f"Listing {info['name']}", unit=" files") as bar:
+                for _, page in backend.iter_pages(root, max_workers):
+                    index.add_page(dataset_key, root, page)
+                    bar.update(len(page))
+
+        unhashed = index.count_unhashed()
+        skipped = []
+        if unhashed:
+            print(f"\n🔐 Hashing {unhashed:,} objects whose ETag is not a content MD5...")
+            with tqdm(total=unhashed, unit=" files") as bar:
+                skipped = index.hash_ambiguous(backend, hash_workers, bar)
+
+        report = summarize_clusters(index.iter_clusters())
+        report["summary"]["empty_files"] = index.count_empty()
+        report["summary"]["unreadable_files"] = len(skipped)
+        report["unreadable_samples"] = skipped[:SAMPLE_CLUSTERS]
+        return report
+    finally:
+        index.close()
+
+def print_report(report):
+    summary = report["summary"]
+    print(f"\n{'='*70}")
+    print("🧬 EXACT DUPLICATES")
+    print(f"{'='*70}")
+    print(f"   Clusters: {summary['clusters']:,}")
+    print(f"   Redundant copies: {summary['duplicate_files']:,}")
+    print(f"   Wasted: {summary['wasted_bytes'] / (1024**3):.2f} GB")
+    if summary["empty_files"]:
+        print(f"   ⚠️  Empty files (not clustered): {summary['empty_files']:,}")
+    if summary["unreadable_files"]:
+        print(f"   ⚠️  Gone before they could be hashed (not clustered): {summary['unreadable_files']:,}")
+
+    print(f"\n📦 BY DATASET PAIR:")
+    for pair, count in report["dataset_pairs"].items():
+        print(f"   {pair}: {count:,} clusters")
+
+    print(f"\n🔀 BY SPLIT (within a dataset):")
+    for dataset, pairs in report["dataset_splits"].items():
+        leaks = {pair: count for pair, count in pairs.items() if len(set(pair.split('/'))) > 1}
+        marker = "🚨" if leaks else "  "
+        print(f"   {marker} {dataset}: " + ", ".join(f"{pair} {count:,}" for pair, count in pairs.items()))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find byte-identical images across and within the datasets")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Listing threads per dataset (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--hash-workers', type=int, default=DEFAULT_HASH_WORKERS,
+                        help=f"Concurrent downloads when hashing multipart objects (default: {DEFAULT_HASH_WORKERS})")
+    parser.add_argument('--db', help="SQLite file for the object index (default: a temporary file)")
+    parser.add_argument('--overwrite-db', action='store_true',
+                        help="Replace the --db file if it already exists")
+    parser.add_argument('--output', default="duplicate_report.json",
+                        help="Where to write the report (default: duplicate_report.json)")
+    add_backend_args(parser)
+    args = parser.parse_args()
+    if args.db and Path(args.db).exists() and not args.overwrite_db:
+        parser.error(f"{args.db} already exists; pass --overwrite-db to replace it")
+    return args
+
+def main():
+    args = parse_args()
+    backend = open_backend(args, BUCKET, max(args.list_workers, args.hash_workers))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or str(Path(tmp) / "duplicates.sqlite")
+        if args.db and args.overwrite_db:
+            Path(args.db).unlink(missing_ok=True)
+        report = find_duplicates(backend, db_path, args.list_workers, args.hash_workers)
+
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Duplicate report saved to: {args.output}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Duplicate search interrupted")
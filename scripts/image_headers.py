@@ -0,0 +1,272 @@
+"""
+Image Header Probing
+Reads only the first few KB of each image (HTTP Range requests on S3) and parses the
+JPEG/PNG/WebP/BMP/GIF header for width, height, channels and the actual file format
+"""
+import struct
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from storage_backends import object_unreadable
+
+DEFAULT_PROBE_BYTES = 16 * 1024
+# JPEG frame headers can sit behind large EXIF/ICC segments; give up past this
+MAX_HEADER_BYTES = 512 * 1024
+DEFAULT_MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024
+DEFAULT_PROBE_WORKERS = 32
+
+# File extension -> format it should contain
+EXTENSION_FORMATS = {
+    '.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP', '.bmp': 'BMP', '.gif': 'GIF',
+}
+
+# Start-of-frame markers (SOF0-SOF15 without DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+class NeedMoreData(Exception):
+    """The header continues past the bytes fetched so far"""
+
+    def __init__(self, length):
+        super().__init__(length)
+        self.length = length
+
+def _header(fmt, width, height, channels):
+    return {'format': fmt, 'width': width, 'height': height, 'channels': channels}
+
+def _parse_jpeg(data):
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            raise NeedMoreData(pos + 4)
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):
+            # Standalone markers carry no length
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image / start of scan before any frame header
+            return None
+        segment_length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 10 > len(data):
+                raise NeedMoreData(pos + 10)
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return _header('JPEG', width, height, data[pos + 9])
+        pos += 2 + segment_length
+
+def _parse_png(data):
+    if len(data) < 26 or data[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', data[16:24])
+    return _header('PNG', width, height, PNG_CHANNELS.get(data[25]))
+
+def _parse_webp(data):
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return _header('WEBP', width & 0x3FFF, height & 0x3FFF, 3)
+    if chunk == b'VP8L':
+        bits = int.from_bytes(data[21:25], 'little')
+        has_alpha = (bits >> 28) & 1
+        return _header('WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 4 if has_alpha else 3)
+    if chunk == b'VP8X':
+        has_alpha = data[20] & 0x10
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return _header('WEBP', width, height, 4 if has_alpha else 3)
+    return None
+
+def _parse_bmp(data):
+    if len(data) < 26:
+        return None
+    dib_size = struct.unpack('<I', data[14:18])[0]
+    if dib_size == 12:
+        width, height, _, bpp = struct.unpack('<HHHH', data[18:26])
+    else:
+        if len(data) < 30:
+            return None
+        width, height, _, bpp = struct.unpack('<iiHH', data[18:30])
+    # Palette and 16-bit images still decode to RGB
+    return _header('BMP', abs(width), abs(height), 4 if bpp == 32 else 3)
+
+def _parse_gif(data):
+    if len(data) < 10:
+        return None
+    width, height = struct.unpack('<HH', data[6:10])
+    return _header('GIF', width, height, 3)
+
+def parse_image_header(data):
+    """Format, width, height and channels from the leading bytes of an image file.
+
+    Returns None when the bytes are not a recognised image; raises NeedMoreData
+    when the header (typically a JPEG frame behind EXIF data) needs a longer read.
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return _parse_jpeg(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return _parse_png(data)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _parse_webp(data)
+    if data[:2] == b'BM':
+        return _parse_bmp(data)
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return _parse_gif(data)
+    return None
+
+class ByteBudget:
+    """Caps the bytes requested by probes that are still in flight"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            # A single request larger than the budget still runs, alone
+            self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+def header_reads(probe_bytes=DEFAULT_PROBE_BYTES):
+    """The reads needed to parse one image header, as a generator driven by probe_header().
+
+    Yields (start, length) ranges to fetch, is sent the bytes each read returned,
+    and finishes with the parsed header (None if unreadable) as its return value.
+    """
+    data = b''
+    want = probe_bytes
+    while True:
+        size = want - len(data)
+        chunk = yield len(data), size
+        data += chunk
+        try:
+            return parse_image_header(data)
+        except NeedMoreData as e:
+            if len(chunk) < size or e.length > MAX_HEADER_BYTES:
+                # Truncated file, or a header too deep to chase
+                return None
+            want = min(max(e.length, want * 4), MAX_HEADER_BYTES)
+
+def probe_header(backend, key, budget, probe_bytes=DEFAULT_PROBE_BYTES):
+    """Fetch just enough of an object to parse its image header"""
+    reads = header_reads(probe_bytes)
+    start, size = next(reads)
+    while True:
+        budget.acquire(size)
+        try:
+            chunk = backend.read_range(key, start, size)
+        finally:
+            budget.release(size)
+        try:
+            start, size = reads.send(chunk)
+        except StopIteration as done:
+            return done.value
+
+def probe_headers(backend, keys, max_workers=DEFAULT_PROBE_WORKERS, probe_bytes=DEFAULT_PROBE_BYTES,
+                  max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES):
+    """Yield (key, header) for each key, probing concurrently; header is None if unreadable.
+
+    `keys` is consumed lazily, so the probes can be fed straight from a listing.
+    Objects that are gone or archived give a None header; any other read error
+    (credentials, throttling that outlasted the retries...) is raised.
+    """
+    budget = ByteBudget(max_in_flight_bytes)
+    # Queued probes hold no bytes yet, so the queue itself is bounded separately
+    max_pending = max(max_workers * 4, 1)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    def finished(done):
+        for future in done:
+            key = pending.pop(future)
+            try:
+                header = future.result()
+            except Exception as e:
+                if not object_unreadable(e):
+                    raise
+                header = None
+            yield key, header
+
+    try:
+        for key in keys:
+            pending[executor.submit(probe_header, backend, key, budget, probe_bytes)] = key
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _percentile(counts, q):
+    """q-th percentile of a Counter of values"""
+    total = sum(counts.values())
+    threshold = q / 100 * (total - 1)
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen > threshold:
+            return value
+    return None
+
+class HeaderSummary:
+    """Per-dataset resolution, format and extension-mismatch counts from probed headers"""
+
+    def __init__(self):
+        self.probed = 0
+        self.unreadable = 0
+        self.formats = Counter()
+        self.channels = Counter()
+        self.resolutions = Counter()
+        self.mismatches = Counter()
+
+    def add(self, key, header):
+        self.probed += 1
+        if header is None:
+            self.unreadable += 1
+            return
+        self.formats[header['format']] += 1
+        self.channels[header['channels']] += 1
+        self.resolutions[(header['width'], header['height'])] += 1
+
+        dot = key.rfind('.')
+        extension = key[dot:].lower() if dot > key.rfind('/') + 1 else ''
+        expected = EXTENSION_FORMATS.get(extension)
+        if expected is not None and expected != header['format']:
+            self.mismatches[f"{extension}->{header['format']}"] += 1
+
+    def to_dict(self, top=20):
+        megapixels = Counter()
+        for (width, height), count in self.resolutions.items():
+            megapixels[round(width * height / 1e6, 3)] += count
+        return {
+            "probed": self.probed,
+            "unreadable": self.unreadable,
+            "formats": dict(self.formats.most_common()),
+            "channels": {str(channels): count for channels, count in self.channels.most_common()},
+            "resolutions": {f"{w}x{h}": count for (w, h), count in self.resolutions.most_common(top)},
+            "distinct_resolutions": len(self.resolutions),
+            "megapixels": {
+                "min": min(megapixels) if megapixels else None,
+                "p50": _percentile(megapixels, 50) if megapixels else None,
+                "max": max(megapixels) if megapixels else None,
+            },
+            "extension_mismatches": sum(self.mismatches.values()),
+            "mismatch_types": dict(self.mismatches.most_common()),
+        }
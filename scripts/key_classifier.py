@@ -0,0 +1,147 @@
+"""
+Vectorized Key Classifier
+Derives extension, first-level folder, split, label and depth for a whole page of keys
+at once with pyarrow.compute, instead of per-key Python string handling
+"""
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# Same rule as Path.suffix: the last dot of the file name, not leading, not trailing
+EXTENSION_PATTERN = r'(?:^|/)[^/]+(?P<extension>\.[^./]+)$'
+FOLDER_PATTERN = r'^(?P<folder>[^/]*)/'
+# Image layout expected by the statistics: <split>/<label>/<file>
+LAYOUT_PATTERN = r'^(?P<split>train|test)/(?P<label>real|fake)/'
+# First two folder levels, used to report images outside the layout
+PARENT_PATTERN = r'^(?P<parent>[^/]*(?:/[^/]*)?)/'
+# Split/label folder names at any depth (case-insensitive), normalized below
+ANY_SPLIT_PATTERN = r'(?i)(?:^|/)(?P<split>train|test|val|valid|validation)/'
+ANY_LABEL_PATTERN = r'(?i)(?:^|/)(?P<label>0_real|1_fake|real|fake)/'
+IMAGE_PATTERN = r'(?i)\.(?:' + '|'.join(ext[1:] for ext in IMAGE_EXTENSIONS) + r')$'
+
+CLASSIFIER_FIELDS = ('extension', 'folder', 'layout_split', 'layout_label', 'split', 'label', 'parent',
+                     'depth', 'is_image')
+
+SPLIT_NAMES = {'train': 'train', 'test': 'test', 'val': 'val', 'valid': 'val', 'validation': 'val'}
+LABEL_NAMES = {'real': 'real', '0_real': 'real', 'fake': 'fake', '1_fake': 'fake'}
+
+def _extract(strings, pattern):
+    """The single named group of `pattern` per string (null where it doesn't match)"""
+    if not len(strings):
+        return pa.array([], pa.string())
+    return pc.struct_field(pc.extract_regex(strings, pattern), [0])
+
+def _normalize(values, names):
+    """Map matched folder names (any case) onto their canonical split/label"""
+    lowered = pc.utf8_lower(values)
+    lookup = pa.array(list(names))
+    canonical = pa.array(list(names.values()))
+    return pc.take(canonical, pc.index_in(lowered, value_set=lookup))
+
+def relative_paths(keys, prefix):
+    """Keys with `prefix/` stripped; keys outside the prefix are returned unchanged"""
+    root = prefix.rstrip('/') + '/'
+    under_root = pc.starts_with(keys, root)
+    return pc.if_else(under_root, pc.utf8_slice_codeunits(keys, len(root)), keys)
+
+def classify_page(keys, prefix, fields=None):
+    """Classify a page of keys under a dataset prefix.
+
+    Returns a dict of pyarrow arrays aligned with `keys`: relative path, extension
+    (lowercase, null if none), first-level folder (null for top-level files),
+    layout split/label (null unless <train|test>/<real|fake>/...), split/label found
+    at any depth, parent folder (first two levels), depth and an is_image mask.
+    Pass `fields` to compute only some of them.
+    """
+    keys = pa.array(keys, pa.string()) if not isinstance(keys, pa.Array) else keys
+    relative = relative_paths(keys, prefix)
+    fields = fields or CLASSIFIER_FIELDS
+    columns = {'key': keys, 'relative': relative}
+
+    if 'layout_split' in fields or 'layout_label' in fields:
+        layout = pc.extract_regex(relative, LAYOUT_PATTERN) if len(keys) else None
+        empty = pa.array([], pa.string())
+        columns['layout_split'] = pc.struct_field(layout, [0]) if layout is not None else empty
+        columns['layout_label'] = pc.struct_field(layout, [1]) if layout is not None else empty
+    if 'extension' in fields:
+        columns['extension'] = pc.utf8_lower(_extract(relative, EXTENSION_PATTERN))
+    if 'folder' in fields:
+        columns['folder'] = _extract(relative, FOLDER_PATTERN)
+    if 'split' in fields:
+        columns['split'] = _normalize(_extract(relative, ANY_SPLIT_PATTERN), SPLIT_NAMES)
+    if 'label' in fields:
+        columns['label'] = _normalize(_extract(relative, ANY_LABEL_PATTERN), LABEL_NAMES)
+    if 'parent' in fields:
+        columns['parent'] = _extract(relative, PARENT_PATTERN)
+    if 'depth' in fields:
+        columns['depth'] = pc.count_substring(relative, '/')
+    if 'is_image' in fields:
+        columns['is_image'] = pc.match_substring_regex(keys, IMAGE_PATTERN)
+    return columns
+
+def count_values(values, mask=None):
+    """Counter of non-null values, optionally restricted to rows where `mask` is true"""
+    if mask is not None:
+        values = pc.filter(values, mask)
+    counts = Counter()
+    for entry in pc.value_counts(values).to_pylist():
+        if entry['values'] is not None:
+            counts[entry['values']] += entry['counts']
+    return counts
+
+def _true_count(mask):
+    return pc.sum(mask.cast(pa.int64())).as_py() or 0
+
+def page_arrays(page):
+    """Key and size columns of a listing page"""
+    keys = pa.array([obj['Key'] for obj in page], pa.string())
+    sizes = pa.array([obj['Size'] for obj in page], pa.int64())
+    return keys, sizes
+
+def size_strata(keys, root, classified=None):
+    """'<split>/<label>/<extension>' stratum name per key, with placeholders for missing parts"""
+    if classified is None:
+        classified = classify_page(keys, root, fields=('split', 'label', 'extension'))
+    return pc.binary_join_element_wise(
+        pc.fill_null(classified['split'], 'nosplit'),
+        pc.fill_null(classified['label'], 'unlabeled'),
+        pc.fill_null(classified['extension'], 'noext'),
+        '/')
+
+def audit_page_counts(page, prefix):
+    """Files, bytes, extension and first-level folder counts of one page, skipping the prefix itself.
+
+    Also returns the kept objects' sizes with their size strata, for size sketches.
+    """
+    keys, sizes = page_arrays(page)
+    classified = classify_page(keys, prefix, fields=('extension', 'folder', 'split', 'label'))
+    keep = pc.invert(pc.is_in(keys, value_set=pa.array([prefix, prefix + '/'])))
+    return {
+        'files': _true_count(keep),
+        'size': pc.sum(pc.filter(sizes, keep)).as_py() or 0,
+        'extensions': count_values(classified['extension'], keep),
+        'folders': count_values(classified['folder'], keep),
+        'sizes': pc.filter(sizes, keep),
+        'strata': pc.filter(size_strata(keys, prefix, classified), keep),
+    }
+
+def layout_page_counts(keys, root):
+    """Image counts per <split>_<label>, images outside that layout per parent folder, and non-image files"""
+    keys = pa.array(keys, pa.string()) if not isinstance(keys, pa.Array) else keys
+    classified = classify_page(keys, root, fields=('layout_split', 'layout_label', 'parent', 'is_image'))
+    images = classified['is_image']
+    in_layout = pc.and_(images, pc.is_valid(classified['layout_split']))
+    outside = pc.and_(images, pc.invert(in_layout))
+    parent = pc.fill_null(classified['parent'], '')
+    parent = pc.if_else(pc.equal(parent, ''), '(root)', parent)
+    category = pc.binary_join_element_wise(classified['layout_split'], classified['layout_label'], '_')
+    non_image = pc.and_(pc.invert(images), pc.invert(pc.ends_with(keys, '/')))
+    return count_values(category, in_layout), count_values(parent, outside), _true_count(non_image)
+
+def image_keys(keys):
+    """The image keys of a page, as a Python list"""
+    keys = pa.array(keys, pa.string()) if not isinstance(keys, pa.Array) else keys
+    return pc.filter(keys, pc.match_substring_regex(keys, IMAGE_PATTERN)).to_pylist()
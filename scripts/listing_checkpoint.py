@@ -0,0 +1,115 @@
+"""
+Listing Checkpoints
+Periodically saves per-shard listing positions and partial aggregates so interrupted
+audits can resume instead of starting over
+"""
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from s3_listing import Shard, discover_shards, iter_pages_parallel
+
+DEFAULT_CHECKPOINT_DIR = ".audit_checkpoints"
+DEFAULT_CHECKPOINT_INTERVAL = 30  # seconds
+CHECKPOINT_VERSION = 3
+
+class ListingCheckpoint:
+    """Resume state for one dataset listing.
+
+    Each shard remembers the last key whose page was fully aggregated. S3
+    continuation tokens are opaque and short-lived, so resuming lists the shard
+    again with StartAfter=<last key>, which continues at exactly the same place.
+    """
+
+    def __init__(self, checkpoint_dir, bucket, prefix, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.interval = interval
+        safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', f"{bucket}_{prefix}").strip('_')
+        self.path = Path(checkpoint_dir) / f"{safe_name}.json"
+        self.shards = []
+        self.aggregates = None
+        self._positions = {}
+        self._last_save = time.monotonic()
+
+    def load(self):
+        """Load a saved checkpoint; returns its partial aggregates, or None if there is none"""
+        if not self.path.exists():
+            return None
+        with open(self.path) as f:
+            state = json.load(f)
+        if (state.get("version") != CHECKPOINT_VERSION
+                or state.get("bucket") != self.bucket or state.get("prefix") != self.prefix):
+            return None
+        self.shards = [
+            {**entry, "shard": Shard(*entry["shard"])} for entry in state["shards"]
+        ]
+        self.aggregates = state["aggregates"]
+        return self.aggregates
+
+    def start(self, s3_client):
+        """Discover shards for a fresh listing"""
+        self.shards = [
+            {"shard": shard, "last_key": None, "done": False}
+            for shard in discover_shards(s3_client, self.bucket, self.prefix)
+        ]
+        self.aggregates = None
+
+    def pending_shards(self):
+        """Shards still to list, each narrowed to start after its checkpointed key"""
+        self._positions = {}
+        pending = []
+        for entry in self.shards:
+            if entry["done"]:
+                continue
+            shard = entry["shard"]
+            if entry["last_key"]:
+                shard = shard._replace(start_after=entry["last_key"])
+            self._positions[shard] = entry
+            pending.append(shard)
+        return pending
+
+    def iter_pages(self, s3_client, max_workers):
+        """Yield (shard, page) pairs for the remaining work, with (shard, None) when a shard ends"""
+        return iter_pages_parallel(s3_client, self.bucket, self.prefix, max_workers,
+                                   shards=self.pending_shards(), signal_done=True)
+
+    def page_done(self, shard, page, snapshot):
+        """Record a fully aggregated page; saves if the interval elapsed"""
+        self._positions[shard]["last_key"] = page[-1]['Key']
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save(snapshot())
+
+    def shard_done(self, shard):
+        self._positions[shard]["done"] = True
+
+    def save(self, aggregates):
+        """Atomically write shard positions and partial aggregates"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "bucket": self.bucket,
+            "prefix": self.prefix,
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "shards": [{**entry, "shard": list(entry["shard"])} for entry in self.shards],
+            "aggregates": aggregates,
+        }
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def clear(self):
+        """Remove the checkpoint after a completed listing"""
+        self.path.unlink(missing_ok=True)
+
+def add_checkpoint_args(parser):
+    """Command-line options for resumable listings"""
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue interrupted listings from their last checkpoint")
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR,
+                        help=f"Where listing checkpoints are kept (default: {DEFAULT_CHECKPOINT_DIR})")
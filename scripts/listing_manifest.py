@@ -0,0 +1,332 @@
+"""
+Listing Manifest Store
+Persists per-shard S3 listings on local disk so re-audits only re-list what changed
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from s3_listing import DEFAULT_MAX_WORKERS, Shard, discover_shards, iter_pages_parallel, list_folders
+
+DEFAULT_MANIFEST_DIR = ".listing_manifest"
+INDEX_FILE = "index.json"
+MANIFEST_VERSION = 3
+# Objects per digested page of a shard listing
+PAGE_SIZE = 1000
+# Pages compared per shard besides the last one; shards with no more pages are compared in full
+SAMPLED_PAGES = 3
+
+def shard_id(bucket, shard):
+    """Stable identifier for a shard of a bucket"""
+    raw = json.dumps([bucket, shard.prefix, shard.start_after, shard.end_at, shard.delimited])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _object_line(obj):
+    return f"{obj['Key']}\0{obj['Size']}\0{obj.get('ETag', '')}\n".encode()
+
+def _in_shard(shard, key):
+    if shard.end_at is not None and key > shard.end_at:
+        return False
+    return key.startswith(shard.prefix) and (shard.start_after is None or key > shard.start_after)
+
+def check_shard(s3_client, bucket, shard, entry, slots=0, stem=None, sample=SAMPLED_PAGES):
+    """Compare a cached shard listing with S3 page by page: 'unchanged', 'changed' or 'outgrown'.
+
+    The manifest keeps a digest of every PAGE_SIZE objects of a shard along
+    with the key the page starts after, so each page is re-listed with one
+    request (StartAfter=that key) and compared. The last page is always
+    compared, which catches appended objects; of the others `sample` random
+    pages are, so shards of up to sample + 1 pages are compared in full and
+    larger ones are spot-checked. `slots` is how many sub-folders a delimited
+    listing returns alongside the shard's objects.
+
+    Key-stem shards (see split_key_space) don't cover the keys between stems, so
+    they are probed under the whole split folder: `stem` is (folder, where the
+    previous stem's objects end, where the next stem starts). A key between
+    stems makes the shard 'outgrown': the folder must be split again.
+    """
+    folder, previous_end, next_start = stem or (shard.prefix, shard.start_after, None)
+    pages = entry["pages"] or [[None, 0, hashlib.sha1().hexdigest()]]
+    checked = list(range(len(pages) - 1))
+    if len(checked) > sample:
+        checked = random.sample(checked, sample)
+    for i in checked + [len(pages) - 1]:
+        after, count, page_digest = pages[i]
+        last = i == len(pages) - 1
+        kwargs = {'Bucket': bucket, 'Prefix': folder, 'MaxKeys': count + slots + (1 if last else 0)}
+        if shard.delimited:
+            kwargs['Delimiter'] = '/'
+        after = after if i else previous_end
+        if after:
+            kwargs['StartAfter'] = after
+        contents = s3_client.list_objects_v2(**kwargs).get('Contents', [])
+
+        if stem and any(not _in_shard(shard, obj['Key']) and (next_start is None or obj['Key'] < next_start)
+                        for obj in contents):
+            return 'outgrown'
+        digest = hashlib.sha1()
+        for obj in contents[:count]:
+            digest.update(_object_line(obj))
+        if len(contents) < count or digest.hexdigest() != page_digest:
+            return 'changed'
+        # Whatever follows the last page must belong to another shard
+        if last and any(_in_shard(shard, obj['Key']) for obj in contents[count:]):
+            return 'changed'
+    return 'unchanged'
+
+def _encode_record(obj):
+    last_modified = obj.get('LastModified')
+    if isinstance(last_modified, datetime):
+        last_modified = last_modified.astimezone(timezone.utc).isoformat()
+    return [obj['Key'], obj['Size'], obj.get('ETag'), last_modified]
+
+def _decode_record(row):
+    return {'Key': row[0], 'Size': row[1], 'ETag': row[2], 'LastModified': row[3]}
+
+class ManifestStore:
+    """On-disk store of shard listings (key, size, ETag, LastModified) plus an index"""
+
+    def __init__(self, root=DEFAULT_MANIFEST_DIR, refresh=False):
+        self.root = Path(root)
+        self.refresh = refresh
+        self.shard_dir = self.root / "shards"
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.index = {"version": MANIFEST_VERSION, "shards": {}, "layouts": {}, "dirty": []}
+        self.reused_shards = 0
+        self.relisted_shards = 0
+
+        index_path = self.root / INDEX_FILE
+        if index_path.exists():
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get("version") == MANIFEST_VERSION:
+                self.index = index
+
+    def save(self):
+        """Atomically write the index"""
+        with self._lock:
+            tmp_path = self.root / (INDEX_FILE + ".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f, indent=1)
+            os.replace(tmp_path, self.root / INDEX_FILE)
+
+    def mark_dirty(self, prefix):
+        """Force every shard overlapping `prefix` to be re-listed on the next run"""
+        with self._lock:
+            if prefix not in self.index["dirty"]:
+                self.index["dirty"].append(prefix)
+
+    def is_dirty(self, shard):
+        return any(shard.prefix.startswith(p) or p.startswith(shard.prefix) for p in self.index["dirty"])
+
+    def clear_dirty(self, root_prefix):
+        """Drop dirty marks covered by a completed listing of `root_prefix`"""
+        with self._lock:
+            self.index["dirty"] = [p for p in self.index["dirty"] if not p.startswith(root_prefix)]
+
+    def count_shard(self, reused):
+        with self._lock:
+            if reused:
+                self.reused_shards += 1
+            else:
+                self.relisted_shards += 1
+
+    def entry(self, bucket, shard):
+        return self.index["shards"].get(shard_id(bucket, shard))
+
+    def read_shard(self, bucket, shard):
+        """Yield the cached object records of a shard"""
+        with gzip.open(self.shard_dir / f"{shard_id(bucket, shard)}.jsonl.gz", 'rt') as f:
+            for line in f:
+                yield _decode_record(json.loads(line))
+
+    def layout(self, bucket, prefix):
+        """(shards, {folder: [sub-folders, has direct objects]}) discovery found for a prefix last time, or None"""
+        layout = self.index["layouts"].get(f"{bucket}/{prefix}")
+        if layout is None:
+            return None
+        return [Shard(*shard) for shard in layout["shards"]], layout["folders"]
+
+    def save_layout(self, bucket, prefix, shards, folders):
+        with self._lock:
+            self.index["layouts"][f"{bucket}/{prefix}"] = {
+                "shards": [list(shard) for shard in shards],
+                "folders": folders,
+            }
+
+    def open_shard_writer(self, bucket, shard):
+        return ShardWriter(self, bucket, shard)
+
+    def _commit(self, bucket, shard, writer):
+        sid = shard_id(bucket, shard)
+        os.replace(writer.tmp_path, self.shard_dir / f"{sid}.jsonl.gz")
+        with self._lock:
+            self.index["shards"][sid] = {
+                "bucket": bucket,
+                "prefix": shard.prefix,
+                "start_after": shard.start_after,
+                "end_at": shard.end_at,
+                "delimited": shard.delimited,
+                "object_count": writer.object_count,
+                "pages": writer.pages,
+                "last_key": writer.last_key,
+                "listed_at": datetime.now(timezone.utc).isoformat(),
+            }
+        # Persisted per shard, so an interrupted run keeps every shard it finished
+        self.save()
+
+class ShardWriter:
+    """Streams a shard's records to a temp file; commit() publishes it to the store.
+
+    Also keeps what check_shard() compares against: for every PAGE_SIZE
+    records, the key before them, their count and a digest.
+    """
+
+    def __init__(self, store, bucket, shard):
+        self.store = store
+        self.bucket = bucket
+        self.shard = shard
+        self.object_count = 0
+        self.pages = []
+        self.last_key = None
+        self._digest = None
+        self.tmp_path = store.shard_dir / f"{shard_id(bucket, shard)}.jsonl.gz.tmp"
+        self.file = gzip.open(self.tmp_path, 'wt')
+
+    def write_page(self, page):
+        for obj in page:
+            self.file.write(json.dumps(_encode_record(obj)) + "\n")
+            if self.object_count % PAGE_SIZE == 0:
+                self._close_page()
+                self._digest = hashlib.sha1()
+                self.pages.append([self.last_key, 0, None])
+            self._digest.update(_object_line(obj))
+            self.pages[-1][1] += 1
+            self.object_count += 1
+            self.last_key = obj['Key']
+
+    def _close_page(self):
+        if self.pages:
+            self.pages[-1][2] = self._digest.hexdigest()
+
+    def commit(self):
+        self._close_page()
+        self.file.close()
+        self.store._commit(self.bucket, self.shard, self)
+
+    def abort(self):
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+def _discover(s3_client, bucket, prefix, manifest, max_workers):
+    folders = {}
+    shards = discover_shards(s3_client, bucket, prefix, max_workers=max_workers, folders=folders)
+    manifest.save_layout(bucket, prefix, shards, folders)
+    return shards, folders
+
+def _check_shards(s3_client, bucket, prefix, manifest, shards, folders, max_workers):
+    """{shard: check_shard() result} for every shard of a layout"""
+    # Shards that aren't folders found by discovery split a folder by key stem
+    known = {prefix}.union(*(children for children, _ in folders.values()))
+    split = {}
+    for shard in shards:
+        if shard.prefix not in known:
+            folder = max((k for k in known if shard.prefix.startswith(k)), key=len)
+            split.setdefault(folder, []).append(shard)
+    bounds = {}
+    for folder, stems in split.items():
+        for i, shard in enumerate(stems):
+            # The first stem is listed from the start of its folder
+            previous = manifest.entry(bucket, stems[i - 1]) if i else {"last_key": None}
+            if previous is not None:
+                bounds[shard] = (folder, previous["last_key"], stems[i + 1].prefix if i + 1 < len(stems) else None)
+
+    def check(shard):
+        entry = manifest.entry(bucket, shard)
+        if manifest.refresh or entry is None or manifest.is_dirty(shard):
+            return 'changed'
+        if shard.prefix not in known:
+            if shard not in bounds:
+                # The previous stem was never listed, so where this one starts is unknown
+                return 'changed'
+            return check_shard(s3_client, bucket, shard, entry, stem=bounds[shard])
+        # Sub-folders take up MaxKeys slots of delimited listings too
+        slots = len(folders[shard.prefix][0]) if shard.delimited else 0
+        return check_shard(s3_client, bucket, shard, entry, slots)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(shards, pool.map(check, shards)))
+
+def list_objects_incremental(s3_client, bucket, prefix, manifest, max_workers=DEFAULT_MAX_WORKERS):
+    """Yield every object under a prefix, re-listing only shards that changed since the last run.
+
+    The shard layout from the last discovery is reused while the folders it
+    divided still have the same sub-folders and loose objects (one request per
+    folder), and discovery only runs again when they don't. Each shard is then
+    checked page by page (see check_shard()) and either read from the manifest
+    or re-listed. Shards too large to compare in full are spot-checked, so
+    use mark_dirty() for prefixes known to have changed.
+    """
+    layout = None if manifest.refresh else manifest.layout(bucket, prefix)
+    if layout is not None and list_folders(s3_client, bucket, list(layout[1]), max_workers) == layout[1]:
+        shards, folders = layout
+    else:
+        shards, folders = _discover(s3_client, bucket, prefix, manifest, max_workers)
+    checked = _check_shards(s3_client, bucket, prefix, manifest, shards, folders, max_workers)
+    if 'outgrown' in checked.values():
+        shards, folders = _discover(s3_client, bucket, prefix, manifest, max_workers)
+        checked = _check_shards(s3_client, bucket, prefix, manifest, shards, folders, max_workers)
+
+    stale = []
+    for shard, state in checked.items():
+        if state == 'unchanged':
+            manifest.count_shard(reused=True)
+            yield from manifest.read_shard(bucket, shard)
+        else:
+            stale.append(shard)
+
+    writers = {}
+    try:
+        for shard, page in iter_pages_parallel(s3_client, bucket, prefix, max_workers,
+                                               shards=stale, signal_done=True):
+            if shard not in writers:
+                writers[shard] = manifest.open_shard_writer(bucket, shard)
+            if page is None:
+                writers.pop(shard).commit()
+                manifest.count_shard(reused=False)
+                continue
+            writers[shard].write_page(page)
+            yield from page
+        manifest.clear_dirty(prefix)
+    finally:
+        for writer in writers.values():
+            writer.abort()
+        manifest.save()
+
+def add_manifest_args(parser):
+    """Command-line options for the incremental listing manifest"""
+    parser.add_argument('--manifest-dir', default=DEFAULT_MANIFEST_DIR,
+                        help=f"Where cached shard listings are kept (default: {DEFAULT_MANIFEST_DIR})")
+    parser.add_argument('--manifest', action='store_true',
+                        help="Reuse cached shard listings that still match S3 (large shards are "
+                             "spot-checked, so pair with --mark-dirty for known changes)")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Re-list every shard and rewrite the manifest")
+    parser.add_argument('--mark-dirty', action='append', default=[], metavar='PREFIX',
+                        help="Force shards under PREFIX to be re-listed (repeatable)")
+
+def open_manifest(args):
+    """Open the manifest store selected on the command line, or None unless --manifest"""
+    if not args.manifest:
+        return None
+    manifest = ManifestStore(args.manifest_dir, refresh=args.refresh)
+    for prefix in args.mark_dirty:
+        manifest.mark_dirty(prefix)
+    return manifest
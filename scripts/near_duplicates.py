@@ -0,0 +1,343 @@
+"""
+Near-Duplicate and Train/Test Leakage Detection
+Decodes every image in a process pool into 64-bit pHash/dHash values and finds pairs
+within a small Hamming distance with a multi-index hash search (no all-pairs scan)
+"""
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+import numpy as np
+from tqdm import tqdm
+
+from analyze_dataset_details_fixed import BUCKET, DATASETS, PREFIX
+from key_classifier import classify_page, image_keys
+from s3_listing import DEFAULT_MAX_WORKERS, batched
+from storage_backends import DEFAULT_FETCH_WORKERS, add_backend_args, open_backend, prefetch_objects
+
+DEFAULT_PHASH_THRESHOLD = 6
+DEFAULT_DHASH_THRESHOLD = 10
+DEFAULT_DECODE_BATCH = 64
+# Larger groups of images with identical hashes (blank or solid-colour images hash alike)
+# are left out of the pair search and reported as groups instead
+DEFAULT_MAX_EXACT_GROUP = 1000
+# The 64-bit hash is searched as four 16-bit chunks
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+QUERY_BLOCK = 8192
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+DCT_32 = _dct_matrix(32)
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+def image_hashes(data):
+    """(pHash, dHash) of an encoded image as 64-bit ints, or None if it can't be decoded"""
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            # JPEGs can be decoded straight at a reduced scale
+            image.draft('L', (64, 64))
+            gray = image.convert('L')
+    except Exception:
+        return None
+
+    pixels = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (DCT_32 @ pixels @ DCT_32.T)[:8, :8].ravel()
+    # The DC term only carries overall brightness
+    phash = _pack(low > np.median(low[1:]))
+
+    small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    dhash = _pack(small[:, 1:] > small[:, :-1])
+    return phash, dhash
+
+def hash_batch(blobs):
+    """Process-pool entry point: hashes for a batch of encoded images"""
+    return [image_hashes(data) if data else None for data in blobs]
+
+def popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1)
+
+def _neighbour_masks(radius):
+    """Every CHUNK_BITS-bit XOR mask with at most `radius` bits set"""
+    masks = [0]
+    for _ in range(radius):
+        masks = sorted({*masks, *(mask | (1 << bit) for mask in masks for bit in range(CHUNK_BITS))})
+    return np.array(masks, dtype=np.uint64)
+
+def exact_groups(phashes, dhashes):
+    """(group of each hash, first index of each group, group sizes) for identical (pHash, dHash) values"""
+    combined = np.stack([np.asarray(phashes, dtype=np.uint64), np.asarray(dhashes, dtype=np.uint64)], axis=1)
+    _, first, inverse, counts = np.unique(combined, axis=0, return_index=True, return_inverse=True,
+                                          return_counts=True)
+    return inverse.ravel(), first, counts
+
+def _search(phashes, dhashes, phash_threshold, dhash_threshold):
+    """Index pairs (i < j) of distinct hashes within the thresholds, by multi-index hashing"""
+    n = len(phashes)
+    masks = _neighbour_masks(phash_threshold // CHUNKS)
+    found = []
+    for chunk in range(CHUNKS):
+        values = (phashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64((1 << CHUNK_BITS) - 1)
+        order = np.argsort(values, kind='stable')
+        sorted_values = values[order]
+
+        for start in range(0, n, QUERY_BLOCK):
+            block = np.arange(start, min(start + QUERY_BLOCK, n))
+            for mask in masks:
+                queries = values[block] ^ mask
+                left = np.searchsorted(sorted_values, queries, side='left')
+                right = np.searchsorted(sorted_values, queries, side='right')
+                counts = right - left
+                if not counts.any():
+                    continue
+                # Expand each query into its bucket of candidate partners
+                i = np.repeat(block, counts)
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                j = order[np.repeat(left, counts) + offsets]
+                keep = i < j
+                i, j = i[keep], j[keep]
+                close = ((popcount(phashes[i] ^ phashes[j]) <= phash_threshold)
+                         & (popcount(dhashes[i] ^ dhashes[j]) <= dhash_threshold))
+                if close.any():
+                    found.append(i[close] * n + j[close])
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    # The same pair can match on several chunks
+    codes = np.unique(np.concatenate(found))
+    return np.stack([codes // n, codes % n], axis=1)
+
+def near_duplicate_pairs(phashes, dhashes, phash_threshold=DEFAULT_PHASH_THRESHOLD,
+                         dhash_threshold=DEFAULT_DHASH_THRESHOLD, max_group=DEFAULT_MAX_EXACT_GROUP):
+    """Index pairs (i < j) whose pHash and dHash are both within the thresholds.
+
+    Identical hashes are collapsed first, so each distinct value is searched once
+    however many images share it. Multi-index hashing: if two 64-bit hashes
+    differ in at most r bits, at least one of their four 16-bit chunks differs
+    in at most r // 4 bits. Each chunk is sorted once, and every hash only
+    probes its own chunk values flipped by those few bits. Images in groups of
+    more than `max_group` identical hashes are left out (see exact_groups()).
+    """
+    phashes = np.asarray(phashes, dtype=np.uint64)
+    dhashes = np.asarray(dhashes, dtype=np.uint64)
+    if len(phashes) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    group_of, first, counts = exact_groups(phashes, dhashes)
+    searched = np.flatnonzero(counts <= max_group)
+    group_pairs = searched[_search(phashes[first[searched]], dhashes[first[searched]],
+                                   phash_threshold, dhash_threshold)]
+    order = np.argsort(group_of, kind='stable')
+    starts = np.cumsum(counts) - counts
+
+    def members(group):
+        return order[starts[group]:starts[group] + counts[group]]
+
+    single = (counts[group_pairs[:, 0]] == 1) & (counts[group_pairs[:, 1]] == 1)
+    pairs = [first[group_pairs[single]]]
+    for a, b in group_pairs[~single].tolist():
+        i, j = np.meshgrid(members(a), members(b), indexing='ij')
+        pairs.append(np.stack([i.ravel(), j.ravel()], axis=1))
+    # Identical hashes are near-duplicates of each other
+    for group in searched[counts[searched] > 1].tolist():
+        group_members = members(group)
+        i, j = np.triu_indices(len(group_members), k=1)
+        pairs.append(np.stack([group_members[i], group_members[j]], axis=1))
+
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return np.unique(pairs, axis=0).astype(np.int64)
+
+class ImageHashes:
+    """Hashes of every decoded image, with the dataset and split each came from"""
+
+    def __init__(self):
+        self.keys = []
+        self.datasets = []
+        self.splits = []
+        self.phashes = []
+        self.dhashes = []
+        self.undecodable = Counter()
+
+    def add(self, dataset, split, key, hashes):
+        if hashes is None:
+            self.undecodable[dataset] += 1
+            return
+        self.keys.append(key)
+        self.datasets.append(dataset)
+        self.splits.append(split)
+        self.phashes.append(hashes[0])
+        self.dhashes.append(hashes[1])
+
+def hash_datasets(backend, max_workers=DEFAULT_MAX_WORKERS, decode_workers=None,
+                  fetch_workers=DEFAULT_FETCH_WORKERS, batch_size=DEFAULT_DECODE_BATCH):
+    """Stream every image through fetch threads into a decode process pool"""
+    hashes = ImageHashes()
+    decode_workers = decode_workers or os.cpu_count() or 1
+
+    def listed_images():
+        for dataset_key in DATASETS:
+            root = f"{PREFIX}/{dataset_key}/"
+            for _, page in backend.iter_pages(root, max_workers):
+                keys = image_keys([obj['Key'] for obj in page])
+                if not keys:
+                    continue
+                splits = classify_page(keys, root, fields=('split',))['split'].to_pylist()
+                for key, split in zip(keys, splits):
+                    yield dataset_key, split, key
+
+    with ProcessPoolExecutor(max_workers=decode_workers) as decoders, \
+            tqdm(desc="Hashing images", unit=" images") as bar:
+        # Only the prefetch queue and a few batches of encoded bytes are held at once
+        max_pending = decode_workers * 2
+        downloads = prefetch_objects(backend, listed_images(), key=lambda item: item[2], workers=fetch_workers)
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                batch = pending.pop(future)
+                for (dataset, split, key), result in zip(batch, future.result()):
+                    hashes.add(dataset, split, key, result)
+                bar.update(len(batch))
+
+        for downloaded in batched(downloads, batch_size):
+            batch = [item for item, _ in downloaded]
+            pending[decoders.submit(hash_batch, [data for _, data in downloaded])] = batch
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    return hashes
+
+def leakage_report(hashes, pairs, max_group=DEFAULT_MAX_EXACT_GROUP):
+    """Per-dataset train/test leakage and cross-dataset near-duplicate counts, plus the groups of
+    identical hashes too large to pair up"""
+    per_dataset = defaultdict(lambda: {"images_hashed": 0, "test_images": 0, "leaked_test_images": 0,
+                                       "train_test_pairs": 0, "within_split_pairs": 0})
+    for dataset, split in zip(hashes.datasets, hashes.splits):
+        per_dataset[dataset]["images_hashed"] += 1
+        if split == 'test':
+            per_dataset[dataset]["test_images"] += 1
+
+    leaked = set()
+    cross_dataset = Counter()
+    for i, j in pairs.tolist():
+        dataset_i, dataset_j = hashes.datasets[i], hashes.datasets[j]
+        if dataset_i != dataset_j:
+            cross_dataset[" | ".join(sorted((dataset_i, dataset_j)))] += 1
+            continue
+        splits = {hashes.splits[i], hashes.splits[j]}
+        if splits == {'train', 'test'}:
+            per_dataset[dataset_i]["train_test_pairs"] += 1
+            leaked.add(i if hashes.splits[i] == 'test' else j)
+        elif len(splits) == 1:
+            per_dataset[dataset_i]["within_split_pairs"] += 1
+
+    for index in leaked:
+        per_dataset[hashes.datasets[index]]["leaked_test_images"] += 1
+    for dataset in hashes.undecodable:
+        per_dataset[dataset]
+    for dataset, stats in per_dataset.items():
+        stats["undecodable"] = hashes.undecodable[dataset]
+        stats["test_leak_rate"] = (round(stats["leaked_test_images"] / stats["test_images"], 4)
+                                   if stats["test_images"] else 0.0)
+
+    large_groups = []
+    if hashes.keys:
+        group_of, first, counts = exact_groups(hashes.phashes, hashes.dhashes)
+        for group in np.flatnonzero(counts > max_group)[np.argsort(-counts[counts > max_group])].tolist():
+            index = int(first[group])
+            large_groups.append({
+                "phash": f"{hashes.phashes[index]:016x}",
+                "dhash": f"{hashes.dhashes[index]:016x}",
+                "images": int(counts[group]),
+                "datasets": dict(Counter(hashes.datasets[i] for i in np.flatnonzero(group_of == group).tolist())),
+            })
+
+    samples = [{"a": hashes.keys[i], "b": hashes.keys[j]} for i, j in pairs[:20].tolist()]
+    return {
+        "datasets": dict(per_dataset),
+        "cross_dataset_pairs": dict(cross_dataset.most_common()),
+        "total_pairs": int(len(pairs)),
+        "large_exact_groups": large_groups,
+        "samples": samples,
+    }
+
+def print_report(report):
+    print(f"\n{'='*70}")
+    print("🔎 NEAR-DUPLICATES & TRAIN/TEST LEAKAGE")
+    print(f"{'='*70}")
+    print(f"   Near-duplicate pairs: {report['total_pairs']:,}")
+    for dataset, stats in report["datasets"].items():
+        name = DATASETS.get(dataset, {}).get('name', dataset)
+        marker = "🚨" if stats["leaked_test_images"] else "✅"
+        print(f"\n   {marker} {name}:")
+        print(f"      Test images with a near-duplicate in train: {stats['leaked_test_images']:,} "
+              f"of {stats['test_images']:,} ({stats['test_leak_rate']*100:.2f}%)")
+        print(f"      Within-split pairs: {stats['within_split_pairs']:,}")
+        if stats["undecodable"]:
+            print(f"      ⚠️  Undecodable images: {stats['undecodable']:,}")
+    if report["cross_dataset_pairs"]:
+        print(f"\n   📦 Across datasets:")
+        for pair, count in report["cross_dataset_pairs"].items():
+            print(f"      {pair}: {count:,} pairs")
+    if report["large_exact_groups"]:
+        print(f"\n   ⚠️  Identical hashes shared by too many images to pair (e.g. blank images):")
+        for group in report["large_exact_groups"][:5]:
+            print(f"      pHash {group['phash']}: {group['images']:,} images")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find near-duplicate images and train/test leakage with perceptual hashes")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Listing threads per dataset (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_FETCH_WORKERS,
+                        help=f"Concurrent image downloads (default: {DEFAULT_FETCH_WORKERS})")
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help="Decoder processes (default: one per CPU)")
+    parser.add_argument('--phash-threshold', type=int, default=DEFAULT_PHASH_THRESHOLD,
+                        help=f"Max pHash Hamming distance (default: {DEFAULT_PHASH_THRESHOLD})")
+    parser.add_argument('--dhash-threshold', type=int, default=DEFAULT_DHASH_THRESHOLD,
+                        help=f"Max dHash Hamming distance (default: {DEFAULT_DHASH_THRESHOLD})")
+    parser.add_argument('--max-exact-group', type=int, default=DEFAULT_MAX_EXACT_GROUP,
+                        help="Report larger groups of identical hashes instead of pairing them "
+                             f"(default: {DEFAULT_MAX_EXACT_GROUP})")
+    parser.add_argument('--output', default="leakage_report.json",
+                        help="Where to write the report (default: leakage_report.json)")
+    add_backend_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    backend = open_backend(args, BUCKET, max(args.list_workers, args.fetch_workers))
+
+    hashes = hash_datasets(backend, args.list_workers, args.decode_workers, args.fetch_workers)
+    pairs = near_duplicate_pairs(hashes.phashes, hashes.dhashes, args.phash_threshold, args.dhash_threshold,
+                                 args.max_exact_group)
+    report = leakage_report(hashes, pairs, args.max_exact_group)
+
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Leakage report saved to: {args.output}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Leakage search interrupted")
@@ -0,0 +1,167 @@
+"""
+Columnar Object Index
+Streams every listed object into a Parquet index partitioned by dataset, so later
+questions can be answered from local disk instead of listing S3 again
+"""
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_INDEX_DIR = "object_index"
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+def index_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('dataset', pa.string()),
+        ('split', pa.string()),
+        ('label', pa.string()),
+        ('key', pa.string()),
+        ('size', pa.int64()),
+        ('extension', pa.string()),
+        ('etag', pa.string()),
+        ('last_modified', pa.timestamp('ms', tz='UTC')),
+        ('depth', pa.int16()),
+    ])
+
+def dataset_name(prefix):
+    """Partition name for a dataset prefix (its last path component)"""
+    return prefix.rstrip('/').split('/')[-1]
+
+def _timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+class ObjectIndexWriter:
+    """Writes one dataset's object records into <root>/dataset=<name>/ in row-group batches.
+
+    Rows go to a hidden staging partition that is sorted by key and only then
+    replaces the live one on close(complete=True), so readers never see a
+    half-written index. rotate() closes the current part file at each listing
+    checkpoint; a resumed listing drops parts written after its checkpoint and
+    appends new ones.
+    """
+
+    def __init__(self, root, prefix, keep_parts=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.root = Path(root)
+        self.prefix = prefix.rstrip('/') + '/'
+        self.dataset = dataset_name(prefix)
+        self.row_group_size = row_group_size
+        self.schema = index_schema()
+        self.partition = self.root / f"dataset={self.dataset}"
+        self.staging = self.root / f".staging-dataset={self.dataset}"
+
+        if keep_parts is None:
+            shutil.rmtree(self.staging, ignore_errors=True)
+        else:
+            for path in self.staging.glob("part-*.parquet"):
+                if int(path.stem.split('-')[1]) >= keep_parts:
+                    path.unlink()
+        self.staging.mkdir(parents=True, exist_ok=True)
+
+        self.part = keep_parts or 0
+        self.writer = None
+        self.batches = []
+        self.buffered_rows = 0
+        self.rows_written = 0
+
+    def add_page(self, page):
+        """Buffer a page of listing records; writes a row group once enough rows are buffered"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from key_classifier import classify_page, page_arrays
+
+        keys, sizes = page_arrays(page)
+        classified = classify_page(keys, self.prefix, fields=('extension', 'split', 'label', 'depth'))
+        etags = pc.utf8_trim(pa.array([obj.get('ETag') for obj in page], pa.string()), '"')
+        batch = pa.RecordBatch.from_arrays([
+            pa.array([self.dataset] * len(page), pa.string()),
+            classified['split'],
+            classified['label'],
+            keys,
+            sizes,
+            classified['extension'],
+            pc.if_else(pc.equal(etags, ''), pa.scalar(None, pa.string()), etags),
+            pa.array([_timestamp(obj.get('LastModified')) for obj in page], pa.timestamp('ms', tz='UTC')),
+            classified['depth'].cast(pa.int16()),
+        ], schema=self.schema)
+
+        # Only objects under the dataset root, not the root marker itself
+        keep = pc.and_(pc.starts_with(keys, self.prefix), pc.not_equal(classified['relative'], ''))
+        batch = batch.filter(keep)
+        self.batches.append(batch)
+        self.buffered_rows += batch.num_rows
+
+        if self.buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.buffered_rows:
+            self.batches = []
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.staging / f"part-{self.part:05d}.parquet", self.schema,
+                                           compression='zstd')
+        table = pa.Table.from_batches(self.batches, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += table.num_rows
+        self.batches = []
+        self.buffered_rows = 0
+
+    def rotate(self):
+        """Close the current part file; returns the number of finished parts"""
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.part += 1
+        return self.part
+
+    def sort_parts(self):
+        """Rewrite the staged parts as one file in key order.
+
+        Parallel listings interleave shards, so every part spans the whole key
+        range; sorted, each row group covers a narrow key range and key lookups
+        or keyset pages skip every row group outside it. DuckDB sorts out of
+        core, spilling to the staging directory.
+        """
+        import duckdb
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parts = sorted(self.staging.glob("part-*.parquet"))
+        if not parts:
+            return
+        spill = self.staging / ".sort-spill"
+        sorted_path = self.staging / "sorted.parquet.tmp"
+        db = duckdb.connect(config={'temp_directory': str(spill)})
+        try:
+            rows = db.execute("SELECT * FROM read_parquet(?) ORDER BY key",
+                              [[str(path) for path in parts]]).fetch_record_batch(self.row_group_size)
+            with pq.ParquetWriter(sorted_path, self.schema, compression='zstd') as writer:
+                for batch in rows:
+                    writer.write_table(pa.Table.from_batches([batch]).cast(self.schema),
+                                       row_group_size=self.row_group_size)
+        finally:
+            db.close()
+            shutil.rmtree(spill, ignore_errors=True)
+        for path in parts:
+            path.unlink()
+        sorted_path.rename(self.staging / "part-00000.parquet")
+
+    def close(self, complete=True):
+        """Finish the last part; a complete listing is sorted and replaces the dataset's live partition"""
+        self.rotate()
+        if complete:
+            self.sort_parts()
+            shutil.rmtree(self.partition, ignore_errors=True)
+            self.staging.rename(self.partition)
+
+def open_index(root=DEFAULT_INDEX_DIR):
+    """Open the index as a pyarrow dataset (filters on `dataset` prune whole partitions)"""
+    import pyarrow.dataset as ds
+    return ds.dataset(root, format='parquet', partitioning='hive', schema=index_schema())
@@ -0,0 +1,276 @@
+"""
+Pixel Statistics
+Streams every image through a bounded prefetch queue into a pool of decoder processes and
+reduces them into mergeable per dataset/label accumulators: channel mean/std, JPEG quality
+estimate, entropy and file bytes per pixel
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+import numpy as np
+from tqdm import tqdm
+
+from analyze_dataset_details_fixed import BUCKET, DATASETS, PREFIX
+from key_classifier import classify_page, image_keys
+from s3_listing import DEFAULT_MAX_WORKERS, batched
+from sampling import DEFAULT_SAMPLE_SEED, StratifiedSampler, add_sampling_args
+from storage_backends import (DEFAULT_FETCH_WORKERS, DEFAULT_PREFETCH, add_backend_args, open_backend,
+                              prefetch_objects)
+
+DEFAULT_DECODE_BATCH = 32
+
+# libjpeg's standard luminance table (quality 50), natural order as in PIL's Image.quantization
+JPEG_LUMINANCE_TABLE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+], dtype=np.float64)
+PIXEL_VALUES = np.arange(256, dtype=np.float64)
+
+class RunningStats:
+    """Count, mean, variance, min and max of a vector-valued stream.
+
+    Batches and other accumulators are folded in with the parallel-variance
+    (Chan et al.) form of Welford's update, so partial results from any number
+    of workers merge exactly.
+    """
+
+    def __init__(self, size=1):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def merge_moments(self, count, mean, m2, low, high):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+        self.min = np.minimum(self.min, low)
+        self.max = np.maximum(self.max, high)
+
+    def add(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        self.merge_moments(1, value, 0.0, value, value)
+
+    def add_histograms(self, histograms):
+        """Fold in pixel values given as one 256-bin histogram per channel"""
+        histograms = np.asarray(histograms, dtype=np.float64)
+        count = histograms[0].sum()
+        if not count:
+            return
+        mean = histograms @ PIXEL_VALUES / count
+        m2 = (histograms * (PIXEL_VALUES[None, :] - mean[:, None]) ** 2).sum(axis=1)
+        present = histograms > 0
+        low = np.array([PIXEL_VALUES[row].min() for row in present])
+        high = np.array([PIXEL_VALUES[row].max() for row in present])
+        self.merge_moments(count, mean, m2, low, high)
+
+    def merge(self, other):
+        self.merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+
+    def to_dict(self):
+        if not self.count:
+            return None
+        std = np.sqrt(self.m2 / self.count)
+        values = {"mean": self.mean, "std": std, "min": self.min, "max": self.max}
+        if len(self.mean) == 1:
+            return {name: round(float(value[0]), 4) for name, value in values.items()}
+        return {name: [round(float(v), 4) for v in value] for name, value in values.items()}
+
+class PixelAccumulator:
+    """Everything measured for one dataset/label stratum"""
+
+    def __init__(self):
+        self.images = 0
+        self.undecodable = 0
+        self.channels = RunningStats(3)
+        self.entropy = RunningStats()
+        self.bytes_per_pixel = RunningStats()
+        self.jpeg_quality = RunningStats()
+
+    def merge(self, other):
+        self.images += other.images
+        self.undecodable += other.undecodable
+        self.channels.merge(other.channels)
+        self.entropy.merge(other.entropy)
+        self.bytes_per_pixel.merge(other.bytes_per_pixel)
+        self.jpeg_quality.merge(other.jpeg_quality)
+
+    def to_dict(self):
+        channels = self.channels.to_dict()
+        return {
+            "images": self.images,
+            "undecodable": self.undecodable,
+            "channel_mean": channels["mean"] if channels else None,
+            "channel_std": channels["std"] if channels else None,
+            "entropy_bits": self.entropy.to_dict(),
+            "bytes_per_pixel": self.bytes_per_pixel.to_dict(),
+            "jpeg_images": self.jpeg_quality.count,
+            "jpeg_quality": self.jpeg_quality.to_dict(),
+        }
+
+def estimate_jpeg_quality(quantization):
+    """libjpeg quality setting (1-100) that would produce this luminance table"""
+    table = np.asarray(quantization[0], dtype=np.float64)
+    if len(table) != 64:
+        return None
+    scale = float(np.median(table * 100 / JPEG_LUMINANCE_TABLE))
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return min(max(quality, 1.0), 100.0)
+
+def measure_image(accumulator, data):
+    """Decode one image and fold its measurements into `accumulator`"""
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            quantization = getattr(image, 'quantization', None) if image.format == 'JPEG' else None
+            rgb = image.convert('RGB')
+    except Exception:
+        accumulator.undecodable += 1
+        return
+
+    width, height = rgb.size
+    histograms = np.array(rgb.histogram(), dtype=np.float64).reshape(3, 256)
+    accumulator.channels.add_histograms(histograms)
+
+    gray = np.array(rgb.convert('L').histogram(), dtype=np.float64)
+    probabilities = gray[gray > 0] / gray.sum()
+    accumulator.entropy.add(-(probabilities * np.log2(probabilities)).sum())
+    accumulator.bytes_per_pixel.add(len(data) / (width * height))
+    if quantization:
+        quality = estimate_jpeg_quality(quantization)
+        if quality is not None:
+            accumulator.jpeg_quality.add(quality)
+    accumulator.images += 1
+
+def reduce_batch(items):
+    """Process-pool entry point: per-stratum accumulators for a batch of (stratum, data) pairs"""
+    accumulators = defaultdict(PixelAccumulator)
+    for stratum, data in items:
+        if data is None:
+            accumulators[stratum].undecodable += 1
+        else:
+            measure_image(accumulators[stratum], data)
+    return dict(accumulators)
+
+def analyze_pixel_statistics(backend, max_workers=DEFAULT_MAX_WORKERS, decode_workers=None,
+                             fetch_workers=DEFAULT_FETCH_WORKERS, prefetch=DEFAULT_PREFETCH,
+                             batch_size=DEFAULT_DECODE_BATCH, samples_per_stratum=0, sample_seed=DEFAULT_SAMPLE_SEED):
+    """Per dataset/label pixel statistics over every image, or a stratified sample of them"""
+    decode_workers = decode_workers or os.cpu_count() or 1
+    totals = defaultdict(PixelAccumulator)
+
+    def listed_images():
+        for dataset_key in DATASETS:
+            root = f"{PREFIX}/{dataset_key}/"
+            for _, page in backend.iter_pages(root, max_workers):
+                keys = image_keys([obj['Key'] for obj in page])
+                if not keys:
+                    continue
+                labels = classify_page(keys, root, fields=('label',))['label'].to_pylist()
+                for key, label in zip(keys, labels):
+                    yield (dataset_key, label or 'unlabeled'), key
+
+    def sampled_images():
+        # The whole listing is needed before a bottom-k sample is final; only the sample is kept
+        sampler = StratifiedSampler(samples_per_stratum, sample_seed)
+        for dataset_key in DATASETS:
+            root = f"{PREFIX}/{dataset_key}/"
+            for _, page in backend.iter_pages(root, max_workers):
+                sampler.add_page(image_keys([obj['Key'] for obj in page]), root, dataset_key)
+        for stratum, keys in sampler.samples().items():
+            dataset_key, _, label = stratum.split('/')
+            for key in keys:
+                yield (dataset_key, label), key
+
+    with ProcessPoolExecutor(max_workers=decode_workers) as decoders, \
+            tqdm(desc="Measuring images", unit=" images") as bar:
+        images = sampled_images() if samples_per_stratum > 0 else listed_images()
+        downloads = prefetch_objects(backend, images, key=lambda item: item[1],
+                                     workers=fetch_workers, max_queued=prefetch)
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                bar.update(pending.pop(future))
+                for stratum, accumulator in future.result().items():
+                    totals[stratum].merge(accumulator)
+
+        for downloaded in batched(downloads, batch_size):
+            items = [(stratum, data) for (stratum, _), data in downloaded]
+            pending[decoders.submit(reduce_batch, items)] = len(items)
+            # Bounded so encoded bytes waiting for a decoder never pile up
+            if len(pending) >= decode_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    results = {}
+    for (dataset_key, label), accumulator in sorted(totals.items()):
+        results.setdefault(dataset_key, {})[label] = accumulator.to_dict()
+    return results
+
+def print_report(results):
+    print(f"\n{'='*70}")
+    print("🎨 PIXEL STATISTICS")
+    print(f"{'='*70}")
+    for dataset_key, labels in results.items():
+        print(f"\n📦 {DATASETS.get(dataset_key, {}).get('name', dataset_key)}:")
+        for label, stats in labels.items():
+            print(f"   {label}: {stats['images']:,} images"
+                  + (f", {stats['undecodable']:,} undecodable" if stats['undecodable'] else ""))
+            if not stats['images']:
+                continue
+            print(f"      RGB mean: {', '.join(f'{v:.1f}' for v in stats['channel_mean'])}"
+                  f"  std: {', '.join(f'{v:.1f}' for v in stats['channel_std'])}")
+            print(f"      Entropy: {stats['entropy_bits']['mean']:.2f} bits"
+                  f"  Bytes/pixel: {stats['bytes_per_pixel']['mean']:.3f}")
+            if stats['jpeg_quality']:
+                print(f"      JPEG quality: {stats['jpeg_quality']['mean']:.1f} "
+                      f"({stats['jpeg_images']:,} JPEGs)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per dataset/label pixel statistics of every image")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Listing threads per dataset (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_FETCH_WORKERS,
+                        help=f"Concurrent image downloads (default: {DEFAULT_FETCH_WORKERS})")
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help="Decoder processes (default: one per CPU)")
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH,
+                        help=f"Max images downloaded ahead of the decoders (default: {DEFAULT_PREFETCH})")
+    parser.add_argument('--output', default="pixel_statistics.json",
+                        help="Where to write the statistics (default: pixel_statistics.json)")
+    add_sampling_args(parser, default=0)
+    add_backend_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    backend = open_backend(args, BUCKET, max(args.list_workers, args.fetch_workers))
+    results = analyze_pixel_statistics(backend, args.list_workers, args.decode_workers, args.fetch_workers,
+                                       args.prefetch, samples_per_stratum=args.samples_per_stratum,
+                                       sample_seed=args.sample_seed)
+    print_report(results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Pixel statistics saved to: {args.output}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Pixel statistics interrupted")
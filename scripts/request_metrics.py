@@ -0,0 +1,236 @@
+"""
+Request Metrics
+Per-operation latency histograms, retries, throttles and bytes of S3 requests, recorded through
+the boto3 client's event hooks, plus timers for the local work between requests, so a slow
+audit shows whether S3, the network or the Python aggregation loop held it up
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from size_sketch import SizeSketch
+
+# Error codes S3 (and other AWS APIs) use when asking clients to slow down
+THROTTLE_CODES = {'SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded',
+                  'TooManyRequestsException', 'RequestThrottled', '503'}
+LATENCY_QUANTILES = {"p50": 0.50, "p90": 0.90, "p99": 0.99}
+COUNTERS = ('requests', 'errors', 'retries', 'throttles', 'bytes', 'objects')
+_START = 'request_metrics_start'
+_OPERATION = 'request_metrics_operation'
+
+class OperationMetrics:
+    """Counters and a latency histogram (microseconds, log-bucketed) of one API operation"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes = 0
+        self.objects = 0
+        self.latency = SizeSketch()
+
+    def merge(self, other):
+        for counter in COUNTERS:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+        self.latency.merge(other.latency)
+
+    def state(self):
+        """Counters and the whole latency sketch, unlike to_dict()'s quantiles"""
+        return {**{counter: getattr(self, counter) for counter in COUNTERS}, "latency": self.latency.to_dict()}
+
+    @classmethod
+    def from_state(cls, state):
+        metrics = cls()
+        for counter in COUNTERS:
+            setattr(metrics, counter, state[counter])
+        metrics.latency = SizeSketch.from_dict(state["latency"])
+        return metrics
+
+    def to_dict(self):
+        latency = {name: round(self.latency.quantile(q) / 1000, 2) if self.latency.count else None
+                   for name, q in LATENCY_QUANTILES.items()}
+        latency["max"] = round(self.latency.max / 1000, 2) if self.latency.count else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "bytes": self.bytes,
+            "objects": self.objects,
+            "latency_ms": latency,
+        }
+
+class RequestMetrics:
+    """Thread-safe request and stage metrics of one run.
+
+    attach() hooks a boto3 client: before-call/after-call give the latency of
+    each API call (retries and backoff included), needs-retry sees every failed
+    attempt, so throttling shows up even when the retry then succeeds. Clients
+    outside botocore can call record() directly.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.operations = {}
+        self.stages = {}
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    def _operation(self, name):
+        if name not in self.operations:
+            self.operations[name] = OperationMetrics()
+        return self.operations[name]
+
+    def attach(self, s3_client):
+        """Record every request the client makes from now on; returns the client"""
+        events = s3_client.meta.events
+        events.register('before-call.s3', self._before_call, unique_id='request-metrics-before-call')
+        events.register('after-call.s3', self._after_call, unique_id='request-metrics-after-call')
+        events.register('after-call-error.s3', self._after_call_error, unique_id='request-metrics-call-error')
+        events.register('needs-retry.s3', self._needs_retry, unique_id='request-metrics-needs-retry')
+        return s3_client
+
+    def _before_call(self, model, context, **kwargs):
+        context[_START] = time.perf_counter()
+        context[_OPERATION] = model.name
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        metadata = parsed.get('ResponseMetadata', {})
+        size = metadata.get('HTTPHeaders', {}).get('content-length')
+        if size is None:
+            # Listings usually come chunked; their body is already read (streamed bodies aren't touched)
+            size = 0 if model.has_streaming_output else len(http_response.content or b'')
+        self.record(model.name, time.perf_counter() - context.get(_START, self.started), int(size),
+                    retries=metadata.get('RetryAttempts', 0), error=http_response.status_code >= 300,
+                    objects=len(parsed.get('Contents', [])))
+
+    def _after_call_error(self, exception, context, **kwargs):
+        # Connection errors that outlasted every retry; the model isn't passed here
+        self.record(context.get(_OPERATION, 'unknown'), time.perf_counter() - context.get(_START, self.started), 0,
+                    error=True)
+
+    def _needs_retry(self, response, operation, attempts, caught_exception=None, **kwargs):
+        if response is None:
+            return None
+        http_response, parsed = response
+        code = parsed.get('Error', {}).get('Code')
+        if http_response.status_code in (429, 503) or code in THROTTLE_CODES:
+            with self._lock:
+                self._operation(operation.name).throttles += 1
+        # Leaves the retry decision to botocore's own handler
+        return None
+
+    def record(self, operation, seconds, size, retries=0, throttles=0, error=False, objects=0):
+        """Record one finished request"""
+        with self._lock:
+            metrics = self._operation(operation)
+            metrics.requests += 1
+            metrics.errors += bool(error)
+            metrics.retries += retries
+            metrics.throttles += throttles
+            metrics.bytes += size
+            metrics.objects += objects
+            metrics.latency.add([max(1, int(seconds * 1e6))])
+
+    @contextmanager
+    def timer(self, stage):
+        """Add the block's wall time to `stage` (summed over threads)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def timed_pages(self, pages):
+        """Pass pages (or (shard, page) pairs) through, timing how long the consumer waits for each
+        as 'listing_wait'; end-of-shard markers (page None) aren't counted as pages"""
+        iterator = iter(pages)
+        while True:
+            with self.timer('listing_wait'):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            page = item[1] if isinstance(item, tuple) else item
+            if page is not None:
+                with self._lock:
+                    self.pages += 1
+            yield item
+
+    def state(self):
+        """Mergeable form of the metrics (JSON-serializable), e.g. to hand a worker process's metrics back"""
+        with self._lock:
+            return {
+                "operations": {name: metrics.state() for name, metrics in self.operations.items()},
+                "stages": dict(self.stages),
+                "pages": self.pages,
+            }
+
+    def merge_state(self, state):
+        """Add the requests, stage times and pages of another RequestMetrics' state()"""
+        with self._lock:
+            for name, operation_state in state["operations"].items():
+                self._operation(name).merge(OperationMetrics.from_state(operation_state))
+            for stage, seconds in state["stages"].items():
+                self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.pages += state["pages"]
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            operations = {name: metrics.to_dict() for name, metrics in sorted(self.operations.items())}
+            stages = {stage: round(seconds, 3) for stage, seconds in sorted(self.stages.items())}
+            pages = self.pages
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "operations": operations,
+            "pages": pages,
+            "pages_per_second": round(pages / elapsed, 2) if elapsed else None,
+            "stages_seconds": stages,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:,.1f} {unit}" if unit != 'B' else f"{size:,} B"
+        size /= 1024
+
+def print_metrics(metrics):
+    """Print where a run's time went"""
+    report = metrics.to_dict()
+    print(f"\n{'='*70}")
+    print("⏱️  REQUEST METRICS")
+    print(f"{'='*70}")
+    for name, op in report["operations"].items():
+        latency = op["latency_ms"]
+        print(f"   {name}: {op['requests']:,} requests, p50 {latency['p50']} ms, p90 {latency['p90']} ms, "
+              f"p99 {latency['p99']} ms, max {latency['max']} ms, {_format_bytes(op['bytes'])}")
+        if op["retries"] or op["throttles"] or op["errors"]:
+            print(f"      ⚠️  {op['retries']:,} retries, {op['throttles']:,} throttled (503 SlowDown), "
+                  f"{op['errors']:,} failed")
+    if report["pages"]:
+        print(f"   Pages: {report['pages']:,} ({report['pages_per_second']:,} pages/s)")
+    stages = report["stages_seconds"]
+    print(f"   Time: {report['elapsed_seconds']:,.1f} s total"
+          + "".join(f", {seconds:,.1f} s {stage.replace('_', ' ')}" for stage, seconds in stages.items()))
+
+    throttles = sum(op["throttles"] for op in report["operations"].values())
+    if throttles:
+        print(f"   🐢 S3 throttled {throttles:,} requests: lower --list-workers/--concurrency or spread prefixes")
+    elif stages.get("aggregation", 0) > stages.get("listing_wait", 0):
+        print("   🐍 More time aggregating than waiting for listings: the Python loop is the bottleneck")
+    elif stages.get("listing_wait"):
+        print("   🌐 Mostly waiting for listings: S3 latency or the network is the bottleneck")
+
+def add_metrics_args(parser, default):
+    """Command-line option for the metrics file"""
+    parser.add_argument('--metrics-file', default=default,
+                        help=f"Where to write request and timing metrics (default: {default})")
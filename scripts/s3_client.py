@@ -0,0 +1,40 @@
+"""
+Shared S3 Client
+Builds one pooled boto3 S3 client per process and reuses it across datasets and threads
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+
+from s3_listing import DEFAULT_MAX_WORKERS
+
+MAX_RETRY_ATTEMPTS = 10
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+_client = None
+_client_pool_size = 0
+_client_lock = threading.Lock()
+
+def build_client_config(max_pool_connections):
+    """Client config sized for `max_pool_connections` concurrent requests"""
+    return Config(
+        max_pool_connections=max_pool_connections,
+        retries={'mode': 'adaptive', 'max_attempts': MAX_RETRY_ATTEMPTS},
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+
+def get_s3_client(max_pool_connections=DEFAULT_MAX_WORKERS):
+    """Return the shared S3 client, rebuilding it only if a larger pool is needed"""
+    global _client, _client_pool_size
+
+    with _client_lock:
+        if _client is None or max_pool_connections > _client_pool_size:
+            # A private session avoids the thread-unsafe default session
+            session = boto3.session.Session()
+            _client = session.client('s3', config=build_client_config(max_pool_connections))
+            _client_pool_size = max_pool_connections
+        return _client
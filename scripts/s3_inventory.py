@@ -0,0 +1,232 @@
+"""
+S3 Inventory Reader
+Streams object records from an S3 Inventory report (manifest.json + CSV.gz/Parquet/ORC data files)
+instead of listing the bucket
+"""
+import csv
+import gzip
+import json
+import pickle
+import shutil
+import tempfile
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import unquote_plus
+
+DEFAULT_BATCH_SIZE = 50_000
+
+# Inventory column name (lowercased, underscores removed) -> listing record field
+COLUMN_FIELDS = {
+    'key': 'Key',
+    'size': 'Size',
+    'etag': 'ETag',
+    'lastmodifieddate': 'LastModified',
+}
+VERSION_COLUMNS = ('islatest', 'isdeletemarker')
+
+def _normalize(name):
+    return name.strip().lower().replace('_', '')
+
+def _split_s3_url(url):
+    bucket, _, key = url[len('s3://'):].partition('/')
+    return bucket, key
+
+def _to_record(key, size, etag, last_modified):
+    if isinstance(last_modified, datetime):
+        last_modified = last_modified.astimezone(timezone.utc).isoformat()
+    return {
+        'Key': key,
+        'Size': int(size) if size not in (None, '') else 0,
+        'ETag': etag,
+        'LastModified': last_modified,
+    }
+
+class InventoryReader:
+    """Reads an S3 Inventory report from a local path or an s3:// URL"""
+
+    def __init__(self, location, s3_client=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.location = str(location)
+        self.s3_client = s3_client
+        self.batch_size = batch_size
+        self.is_s3 = self.location.startswith('s3://')
+
+        if not self.is_s3 and Path(self.location).is_dir():
+            self.location = str(Path(self.location) / 'manifest.json')
+        if self.is_s3 and not self.location.endswith('.json'):
+            self.location = self.location.rstrip('/') + '/manifest.json'
+
+        # {prefix: spool file} written by partition()
+        self.partitions = {}
+        self._spool_dir = None
+
+        with closing(self._open(self.location)) as f:
+            self.manifest = json.load(f)
+        self.file_format = self.manifest['fileFormat'].upper()
+        self.files = [entry['key'] for entry in self.manifest['files']]
+        if self.file_format not in ('CSV', 'PARQUET', 'ORC'):
+            raise ValueError(f"Unsupported inventory format: {self.file_format}")
+
+    def _open(self, location):
+        if location.startswith('s3://'):
+            bucket, key = _split_s3_url(location)
+            return self.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        return open(location, 'rb')
+
+    def _data_location(self, key):
+        """Resolve a data file key from the manifest to a readable location"""
+        if self.is_s3:
+            # Data files live in the destination bucket named in the manifest
+            bucket = self.manifest['destinationBucket'].split(':::')[-1]
+            return f"s3://{bucket}/{key}"
+
+        manifest_dir = Path(self.location).parent
+        name = Path(key).name
+        for candidate in (manifest_dir / key, manifest_dir / 'data' / name,
+                          manifest_dir.parent / 'data' / name, manifest_dir / name):
+            if candidate.exists():
+                return str(candidate)
+        raise FileNotFoundError(f"Inventory data file not found locally: {key}")
+
+    def _local_copy(self, location):
+        """Columnar formats need a seekable file, so S3 data files are spooled to a temp file"""
+        if not location.startswith('s3://'):
+            return open(location, 'rb')
+        tmp = tempfile.TemporaryFile()
+        with closing(self._open(location)) as body:
+            shutil.copyfileobj(body, tmp, length=8 * 1024 * 1024)
+        tmp.seek(0)
+        return tmp
+
+    def _routed_batches(self, prefixes):
+        """Yield (prefix, records) for every prefix, reading each data file once"""
+        for key in self.files:
+            location = self._data_location(key)
+            if self.file_format == 'CSV':
+                yield from self._csv_batches(location, prefixes)
+            else:
+                yield from self._columnar_batches(location, prefixes)
+
+    def partition(self, prefixes):
+        """Split the records under each of `prefixes` into a local spool file in one pass over the report.
+
+        Audits read one prefix at a time; without this each of them would
+        re-read (and for S3 re-download) every data file.
+        """
+        prefixes = [prefix for prefix in dict.fromkeys(prefixes) if prefix not in self.partitions]
+        if not prefixes:
+            return
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.TemporaryDirectory(prefix='inventory-')
+        paths = {prefix: Path(self._spool_dir.name) / f"{len(self.partitions) + i}.pickle"
+                 for i, prefix in enumerate(prefixes)}
+        spools = {prefix: open(path, 'wb') for prefix, path in paths.items()}
+        try:
+            for prefix, batch in self._routed_batches(prefixes):
+                pickle.dump(batch, spools[prefix], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for spool in spools.values():
+                spool.close()
+        self.partitions.update(paths)
+
+    def _spooled_batches(self, path, prefix):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                batch = [record for record in batch if record['Key'].startswith(prefix)]
+                if batch:
+                    yield batch
+
+    def iter_batches(self, prefix=''):
+        """Yield lists of listing-style records under `prefix`, one data-file chunk at a time
+        (or spool chunk, if a partitioned prefix covers it)"""
+        for partitioned, path in self.partitions.items():
+            if prefix.startswith(partitioned):
+                yield from self._spooled_batches(path, prefix)
+                return
+        for _, batch in self._routed_batches([prefix]):
+            yield batch
+
+    def iter_objects(self, prefix=''):
+        """Yield every record under `prefix`"""
+        for batch in self.iter_batches(prefix):
+            yield from batch
+
+    def close(self):
+        """Delete the partition spool files"""
+        if self._spool_dir is not None:
+            self._spool_dir.cleanup()
+            self._spool_dir = None
+        self.partitions = {}
+
+    def _csv_batches(self, location, prefixes):
+        columns = [_normalize(name) for name in self.manifest['fileSchema'].split(',')]
+        index = {name: columns.index(name) for name in (*COLUMN_FIELDS, *VERSION_COLUMNS) if name in columns}
+
+        with closing(self._open(location)) as raw, gzip.open(raw, 'rt', newline='') as f:
+            batches = {prefix: [] for prefix in prefixes}
+            for row in csv.reader(f):
+                # Keys are URL-encoded in CSV inventories
+                key = unquote_plus(row[index['key']])
+                matches = [prefix for prefix in prefixes if key.startswith(prefix)]
+                if not matches:
+                    continue
+                if 'islatest' in index and row[index['islatest']].lower() == 'false':
+                    continue
+                if 'isdeletemarker' in index and row[index['isdeletemarker']].lower() == 'true':
+                    continue
+                record = _to_record(
+                    key,
+                    row[index['size']] if 'size' in index else 0,
+                    row[index['etag']] if 'etag' in index else None,
+                    row[index['lastmodifieddate']] if 'lastmodifieddate' in index else None,
+                )
+                for prefix in matches:
+                    batches[prefix].append(record)
+                    if len(batches[prefix]) >= self.batch_size:
+                        yield prefix, batches[prefix]
+                        batches[prefix] = []
+            for prefix, batch in batches.items():
+                if batch:
+                    yield prefix, batch
+
+    def _columnar_batches(self, location, prefixes):
+        import pyarrow.compute as pc
+
+        with self._local_copy(location) as f:
+            if self.file_format == 'PARQUET':
+                import pyarrow.parquet as pq
+                parquet_file = pq.ParquetFile(f)
+                record_batches = parquet_file.iter_batches(batch_size=self.batch_size)
+            else:
+                import pyarrow.orc as orc
+                orc_file = orc.ORCFile(f)
+                record_batches = (orc_file.read_stripe(i) for i in range(orc_file.nstripes))
+
+            for record_batch in record_batches:
+                names = {_normalize(name): name for name in record_batch.schema.names}
+                current = None
+                if 'islatest' in names:
+                    current = pc.fill_null(record_batch.column(names['islatest']), True)
+                if 'isdeletemarker' in names:
+                    live = pc.invert(pc.fill_null(record_batch.column(names['isdeletemarker']), False))
+                    current = live if current is None else pc.and_(current, live)
+                if current is not None:
+                    record_batch = record_batch.filter(current)
+
+                for prefix in prefixes:
+                    filtered = record_batch.filter(pc.starts_with(record_batch.column(names['key']), prefix))
+                    if filtered.num_rows == 0:
+                        continue
+                    columns = {
+                        field: filtered.column(names[name]).to_pylist() if name in names else [None] * filtered.num_rows
+                        for name, field in COLUMN_FIELDS.items()
+                    }
+                    yield prefix, [
+                        _to_record(key, size, etag, last_modified)
+                        for key, size, etag, last_modified in zip(
+                            columns['Key'], columns['Size'], columns['ETag'], columns['LastModified'])
+                    ]
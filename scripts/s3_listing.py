@@ -0,0 +1,322 @@
+"""
+Parallel S3 Listing Engine
+Splits a prefix into shards and lists them concurrently on a bounded thread pool
+"""
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_TARGET_SHARDS = 64
+MAX_DISCOVERY_DEPTH = 3
+# Folders without sub-folders are only split by key stem when they hold more pages than this,
+# and into at most this many shards, so that each averages more than a page
+SPLIT_MIN_PAGES = 10
+
+# Sorts after every character S3 keys contain; StartAfter=<stem>+KEY_SPACE_END skips all keys under a stem
+KEY_SPACE_END = "\U0010ffff"
+
+# A shard covers keys under `prefix` in the range (start_after, end_at].
+# `delimited` shards only list objects directly under `prefix` (Delimiter='/').
+Shard = namedtuple('Shard', ['prefix', 'start_after', 'end_at', 'delimited'])
+Shard.__new__.__defaults__ = (None, None, False)
+
+_DONE = object()
+_FED = object()
+
+# Set by cancel_listings() to stop every in-progress listing (e.g. on Ctrl-C)
+_cancelled = threading.Event()
+
+class ListingCancelled(Exception):
+    """Raised in a listing consumer when listings are cancelled or the main thread exits"""
+
+def cancel_listings():
+    """Stop all in-progress parallel listings; their consumers raise ListingCancelled"""
+    _cancelled.set()
+
+def _listing_active():
+    return not _cancelled.is_set() and threading.main_thread().is_alive()
+
+def _list_level(s3_client, bucket, prefix):
+    """Classify one directory level: (child prefixes, has direct objects, truncated).
+
+    A level whose first page has no sub-folders is a leaf and is not read any
+    further: it becomes one recursive shard, which also covers any sub-folder
+    sorting after that first page. Only levels with sub-folders are paged to
+    the end to collect all of them.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    children = []
+    direct_objects = False
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        page_children = [cp['Prefix'] for cp in page.get('CommonPrefixes', [])]
+        if not children and not page_children:
+            return [], bool(page.get('Contents')), bool(page.get('IsTruncated'))
+        children.extend(page_children)
+        direct_objects = direct_objects or bool(page.get('Contents'))
+    return children, direct_objects, False
+
+def _deeper_than(s3_client, bucket, prefix, pages):
+    """Whether listing `prefix` takes more than `pages` pages (reads at most pages + 1 of them)"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for i, page in enumerate(paginator.paginate(Bucket=bucket, Prefix=prefix)):
+        if i == pages:
+            return True
+    return False
+
+def _first_key(s3_client, bucket, prefix, start_after=None):
+    """The first key under `prefix` after `start_after` (one MaxKeys=1 request), or None"""
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': 1}
+    if start_after:
+        kwargs['StartAfter'] = start_after
+    contents = s3_client.list_objects_v2(**kwargs).get('Contents', [])
+    return contents[0]['Key'] if contents else None
+
+def _branch(s3_client, bucket, stem, first_key=None):
+    """(branches, whether `stem` itself is a key): {stem one character longer: its first key} for the keys under `stem`.
+
+    Skip-scans the key space: each request returns the first key of the next
+    branch and StartAfter then jumps over everything under it, so a stem costs
+    one request per branch, however many keys it holds. `first_key`, if known
+    (from the probe that found the stem), saves the first request.
+    """
+    branches = {}
+    is_key = False
+    start_after = None
+    key = first_key
+    while True:
+        if key is None:
+            key = _first_key(s3_client, bucket, stem, start_after)
+            if key is None:
+                return branches, is_key
+        if key == stem:
+            is_key = True
+            start_after = key
+        else:
+            branch = key[:len(stem) + 1]
+            branches[branch] = key
+            start_after = branch + KEY_SPACE_END
+        key = None
+
+def split_key_space(s3_client, bucket, prefix, target_shards=DEFAULT_TARGET_SHARDS, max_workers=DEFAULT_MAX_WORKERS):
+    """Split a flat prefix into about `target_shards` shards by the key stems that actually occur.
+
+    Stems are refined breadth-first, one character at a time, with skip-scan
+    probes across the whole key range, so the shards follow the real key
+    distribution (e.g. img_0…, img_1… for img_000000…img_199999) rather than
+    the first page. Each shard lists one stem with Prefix=, so it ends exactly
+    where its keys do.
+    """
+    stems = [prefix]
+    first_keys = {prefix: None}
+    exact_keys = []
+    expandable = [prefix]
+    branching = 2.0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while expandable and len(stems) + len(exact_keys) < target_shards:
+            # Refine only as many stems as should reach the target, judging by the branching seen so far
+            wanted = max(1, int((target_shards - len(stems) - len(exact_keys)) / max(1.0, branching - 1)))
+            batch = expandable[:wanted]
+            expandable = expandable[wanted:]
+            results = dict(zip(batch, pool.map(
+                lambda stem: _branch(s3_client, bucket, stem, first_keys[stem]), batch)))
+
+            refined = []
+            for stem in stems:
+                if stem not in results:
+                    refined.append(stem)
+                    continue
+                branches, is_key = results[stem]
+                if is_key:
+                    exact_keys.append(stem)
+                refined.extend(branches)
+                expandable.extend(branches)
+                first_keys.update(branches)
+            branching = sum(len(branches) for branches, _ in results.values()) / len(results)
+            stems = refined
+
+    shards = [Shard(stem) for stem in stems] + [Shard(key, end_at=key) for key in exact_keys]
+    return sorted(shards, key=lambda shard: shard.prefix) or [Shard(prefix)]
+
+def iter_discovered_shards(s3_client, bucket, prefix, target_shards=DEFAULT_TARGET_SHARDS,
+                           max_depth=MAX_DISCOVERY_DEPTH, max_workers=DEFAULT_MAX_WORKERS, folders=None):
+    """Yield shards as discovery finds them, level by level with Delimiter='/'.
+
+    Each level's folders are probed concurrently, and leaves (first page without
+    sub-folders) are yielded right away, so their listing can start while deeper
+    levels are still being discovered. Leaves more than SPLIT_MIN_PAGES pages
+    deep are split by key stem (see split_key_space) into up to SPLIT_MIN_PAGES
+    shards each, within what is left of `target_shards`. If `folders` is a
+    dict, every folder that was divided is recorded in it as [sub-folders,
+    has direct objects].
+    """
+    frontier = [prefix]
+    yielded = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for depth in range(max_depth + 1):
+            levels = list(pool.map(lambda level_prefix: _list_level(s3_client, bucket, level_prefix), frontier))
+            next_frontier = []
+            truncated_leaves = []
+            for level_prefix, (children, direct_objects, truncated) in zip(frontier, levels):
+                if not children:
+                    if truncated:
+                        truncated_leaves.append(level_prefix)
+                        continue
+                    yielded += 1
+                    yield Shard(level_prefix)
+                    continue
+                if folders is not None:
+                    folders[level_prefix] = [children, direct_objects]
+                if direct_objects:
+                    yielded += 1
+                    yield Shard(level_prefix, delimited=True)
+                next_frontier.extend(children)
+
+            if truncated_leaves:
+                # Shards each leaf may add beyond itself
+                spare = (target_shards - yielded - len(next_frontier)) // len(truncated_leaves) - 1
+
+                def split_leaf(leaf):
+                    if spare > 0 and _deeper_than(s3_client, bucket, leaf, SPLIT_MIN_PAGES):
+                        return split_key_space(s3_client, bucket, leaf, min(spare + 1, SPLIT_MIN_PAGES), max_workers)
+                    return [Shard(leaf)]
+
+                for shards in pool.map(split_leaf, truncated_leaves):
+                    yielded += len(shards)
+                    yield from shards
+
+            frontier = next_frontier
+            if not frontier:
+                return
+            if yielded + len(frontier) >= target_shards or depth == max_depth:
+                for level_prefix in frontier:
+                    yield Shard(level_prefix)
+                return
+
+def discover_shards(s3_client, bucket, prefix, target_shards=DEFAULT_TARGET_SHARDS,
+                    max_depth=MAX_DISCOVERY_DEPTH, max_workers=DEFAULT_MAX_WORKERS, folders=None):
+    """Find sub-prefixes with Delimiter='/' until there are enough shards to list in parallel"""
+    return list(iter_discovered_shards(s3_client, bucket, prefix, target_shards, max_depth, max_workers, folders))
+
+def list_folders(s3_client, bucket, folders, max_workers=DEFAULT_MAX_WORKERS):
+    """{folder: [sub-folders, has direct objects]} as recorded by discovery, re-read with one request each (usually)"""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        levels = pool.map(lambda folder: list(_list_level(s3_client, bucket, folder)[:2]), folders)
+        return dict(zip(folders, levels))
+
+def list_shard(s3_client, bucket, shard):
+    """Yield pages (lists of object dicts) for a single shard"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    kwargs = {'Bucket': bucket, 'Prefix': shard.prefix}
+    if shard.start_after:
+        kwargs['StartAfter'] = shard.start_after
+    if shard.delimited:
+        kwargs['Delimiter'] = '/'
+
+    for page in paginator.paginate(**kwargs):
+        contents = page.get('Contents', [])
+        if shard.end_at is not None and contents and contents[-1]['Key'] > shard.end_at:
+            contents = [obj for obj in contents if obj['Key'] <= shard.end_at]
+            if contents:
+                yield contents
+            return
+        if contents:
+            yield contents
+
+def iter_pages_parallel(s3_client, bucket, prefix, max_workers=DEFAULT_MAX_WORKERS,
+                        shards=None, signal_done=False):
+    """Yield (shard, page) pairs from all shards of a prefix, listed concurrently.
+
+    `shards` may be any iterable; by default shards are discovered while the
+    first ones are already being listed. With signal_done=True, a (shard, None)
+    pair follows the last page of each shard.
+    """
+    if shards is None:
+        shards = iter_discovered_shards(s3_client, bucket, prefix,
+                                        target_shards=max(DEFAULT_TARGET_SHARDS, max_workers * 4),
+                                        max_workers=max_workers)
+
+    pages = queue.Queue(maxsize=max_workers * 4)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the consumer abandoned the stream or the interpreter is exiting
+        while not stop.is_set() and _listing_active():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(shard):
+        try:
+            for page in list_shard(s3_client, bucket, shard):
+                if not put((shard, page)):
+                    return
+        except Exception as e:
+            put((shard, e))
+        finally:
+            put((shard, _DONE))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def feed():
+        # Submits shards as they are discovered, then reports how many there were
+        submitted = 0
+        try:
+            for shard in shards:
+                if stop.is_set():
+                    return
+                executor.submit(worker, shard)
+                submitted += 1
+        except Exception as e:
+            put((None, e))
+        finally:
+            put((_FED, submitted))
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        finished = 0
+        total = None
+        while total is None or finished < total:
+            try:
+                shard, item = pages.get(timeout=0.5)
+            except queue.Empty:
+                if not _listing_active():
+                    raise ListingCancelled(f"Listing of {prefix} was cancelled")
+                continue
+            if shard is _FED:
+                total = item
+            elif item is _DONE:
+                finished += 1
+                if signal_done:
+                    yield shard, None
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield shard, item
+    finally:
+        stop.set()
+        feeder.join()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def batched(objects, size=1000):
+    """Group a stream of objects into page-sized lists"""
+    page = []
+    for obj in objects:
+        page.append(obj)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+def list_objects_parallel(s3_client, bucket, prefix, max_workers=DEFAULT_MAX_WORKERS,
+                          shards=None):
+    """Yield every object under a prefix as a merged stream from concurrent shard listings"""
+    for _, page in iter_pages_parallel(s3_client, bucket, prefix, max_workers, shards):
+        yield from page
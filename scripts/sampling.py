@@ -0,0 +1,85 @@
+"""
+Stratified Sampling
+Reproducible N-per-stratum samples picked in a single pass over a listing: every key gets a
+seeded hash priority and each stratum keeps the N lowest, whatever order the keys arrive in
+"""
+import hashlib
+import heapq
+
+from key_classifier import classify_page
+
+DEFAULT_SAMPLES_PER_STRATUM = 3
+DEFAULT_SAMPLE_SEED = 0
+
+def sample_priority(key, seed=DEFAULT_SAMPLE_SEED):
+    """Pseudo-random but fixed 64-bit priority of a key under a seed"""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8, key=str(seed).encode('utf-8'))
+    return int.from_bytes(digest.digest(), 'big')
+
+def stratum_name(split, label):
+    return f"{split or 'nosplit'}/{label or 'unlabeled'}"
+
+class StratifiedSampler:
+    """Bottom-k sample of keys per stratum.
+
+    Keeping the k smallest hash priorities is a reservoir sample that depends only
+    on the seed and the set of keys, not on listing order, so parallel shards,
+    resumed listings and repeated runs all pick the same files. Memory is O(k)
+    per stratum, and samplers from different shards merge exactly.
+    """
+
+    def __init__(self, per_stratum=DEFAULT_SAMPLES_PER_STRATUM, seed=DEFAULT_SAMPLE_SEED):
+        self.per_stratum = per_stratum
+        self.seed = seed
+        # stratum -> max-heap of (-priority, key)
+        self.reservoirs = {}
+
+    def add(self, stratum, key):
+        if self.per_stratum <= 0:
+            return
+        priority = sample_priority(key, self.seed)
+        reservoir = self.reservoirs.setdefault(stratum, [])
+        if len(reservoir) < self.per_stratum:
+            heapq.heappush(reservoir, (-priority, key))
+        elif priority < -reservoir[0][0]:
+            heapq.heapreplace(reservoir, (-priority, key))
+
+    def add_page(self, keys, root, dataset=None):
+        """Sample a page of keys under a dataset root, stratified by split and label"""
+        if not keys:
+            return
+        classified = classify_page(keys, root, fields=('split', 'label'))
+        for key, split, label in zip(keys, classified['split'].to_pylist(), classified['label'].to_pylist()):
+            stratum = stratum_name(split, label)
+            self.add(f"{dataset}/{stratum}" if dataset else stratum, key)
+
+    def merge(self, other):
+        for stratum, reservoir in other.reservoirs.items():
+            for _, key in reservoir:
+                self.add(stratum, key)
+
+    def samples(self):
+        """stratum -> sampled keys, lowest priority first"""
+        return {
+            stratum: [key for _, key in sorted(reservoir, reverse=True)]
+            for stratum, reservoir in sorted(self.reservoirs.items())
+        }
+
+    def state(self):
+        """JSON-serializable form, e.g. for listing checkpoints"""
+        return {"per_stratum": self.per_stratum, "seed": self.seed, "samples": self.samples()}
+
+    @classmethod
+    def from_state(cls, state):
+        sampler = cls(state["per_stratum"], state["seed"])
+        for stratum, keys in state["samples"].items():
+            for key in keys:
+                sampler.add(stratum, key)
+        return sampler
+
+def add_sampling_args(parser, default=DEFAULT_SAMPLES_PER_STRATUM):
+    """Command-line options for stratified samples"""
+    parser.add_argument('--samples-per-stratum', type=int, default=default,
+                        help=f"Files sampled per split/label stratum (default: {default or 'all files'})")
+    parser.add_argument('--sample-seed', type=int, default=DEFAULT_SAMPLE_SEED,
+                        help=f"Seed for reproducible samples (default: {DEFAULT_SAMPLE_SEED})")
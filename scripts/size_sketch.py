@@ -0,0 +1,169 @@
+"""
+Object Size Sketches
+Mergeable log-bucketed histograms of object sizes: quantiles within a fixed relative error,
+an exact zero-byte count and min/max, at a memory cost that doesn't grow with object count
+"""
+import math
+
+import numpy as np
+import pyarrow as pa
+
+DEFAULT_RELATIVE_ACCURACY = 0.02
+# Bucket index stored for 0-byte objects, which have no logarithm
+ZERO_BUCKET = -(1 << 30)
+QUANTILES = {"p1": 0.01, "p50": 0.50, "p99": 0.99}
+
+class SizeSketch:
+    """Log-histogram of sizes (DDSketch-style).
+
+    A size s > 0 lands in bucket ceil(log_gamma(s)) with gamma = (1 + a) / (1 - a),
+    so any quantile read back is within relative accuracy `a` of a true size.
+    Sketches with the same accuracy merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def bucket_indices(self, sizes):
+        """Bucket index per size (numpy array in, numpy array out)"""
+        sizes = np.asarray(sizes, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            indices = np.ceil(np.log(sizes) / self.log_gamma)
+        return np.where(sizes > 0, indices, ZERO_BUCKET).astype(np.int64)
+
+    def _update_range(self, low, high):
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def add_bucket_counts(self, bucket_counts, total, low, high):
+        """Fold in pre-bucketed counts ({bucket index: count}) with their size sum and range"""
+        for index, count in bucket_counts.items():
+            if index == ZERO_BUCKET:
+                self.zero += count
+            else:
+                self.buckets[index] = self.buckets.get(index, 0) + count
+            self.count += count
+        self.total += total
+        self._update_range(low, high)
+
+    def add(self, sizes):
+        sizes = np.asarray(sizes, dtype=np.int64)
+        if not len(sizes):
+            return
+        indices, counts = np.unique(self.bucket_indices(sizes), return_counts=True)
+        self.add_bucket_counts(dict(zip(indices.tolist(), counts.tolist())), int(sizes.sum()),
+                               int(sizes.min()), int(sizes.max()))
+
+    def merge(self, other):
+        if other.count:
+            self.add_bucket_counts({**other.buckets, ZERO_BUCKET: other.zero}, other.total, other.min, other.max)
+
+    def bucket_value(self, index):
+        """Representative size of a bucket (relative error <= accuracy for all sizes in it)"""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def bucket_bounds(self, index):
+        return self.gamma ** (index - 1), self.gamma ** index
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero:
+            return 0
+        seen = self.zero
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = self.bucket_value(index)
+                return int(round(min(max(value, self.min), self.max)))
+        return self.max
+
+    def summary(self):
+        """p1/p50/p99, exact max and zero-byte count"""
+        result = {"count": self.count, "zero_bytes": self.zero, "total_bytes": self.total,
+                  "min": self.min, "max": self.max}
+        result.update({name: self.quantile(q) for name, q in QUANTILES.items()})
+        return result
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "zero": self.zero,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(index): count for index, count in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["relative_accuracy"])
+        sketch.count = state["count"]
+        sketch.zero = state["zero"]
+        sketch.total = state["total"]
+        sketch.min = state["min"]
+        sketch.max = state["max"]
+        sketch.buckets = {int(index): count for index, count in state["buckets"].items()}
+        return sketch
+
+class StratifiedSizeSketches:
+    """One SizeSketch per stratum name (e.g. "train/real/.jpg")"""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.sketches = {}
+
+    def sketch(self, stratum):
+        if stratum not in self.sketches:
+            self.sketches[stratum] = SizeSketch(self.relative_accuracy)
+        return self.sketches[stratum]
+
+    def add_page(self, strata, sizes):
+        """Add a page of sizes with their stratum names, grouped in one vectorized pass"""
+        if not len(sizes):
+            return
+        sizes = sizes if isinstance(sizes, pa.Array) else pa.array(sizes, pa.int64())
+        strata = strata if isinstance(strata, pa.Array) else pa.array(strata, pa.string())
+        buckets = SizeSketch(self.relative_accuracy).bucket_indices(sizes.to_numpy(zero_copy_only=False))
+        table = pa.table({'stratum': strata, 'bucket': buckets, 'size': sizes})
+        grouped = table.group_by(['stratum', 'bucket']).aggregate(
+            [('size', 'count'), ('size', 'sum'), ('size', 'min'), ('size', 'max')])
+        for row in grouped.to_pylist():
+            self.sketch(row['stratum']).add_bucket_counts(
+                {row['bucket']: row['size_count']}, row['size_sum'], row['size_min'], row['size_max'])
+
+    def merge(self, other):
+        for stratum, sketch in other.sketches.items():
+            self.sketch(stratum).merge(sketch)
+
+    def combined(self):
+        """All strata merged into one sketch"""
+        total = SizeSketch(self.relative_accuracy)
+        for sketch in self.sketches.values():
+            total.merge(sketch)
+        return total
+
+    def summary(self):
+        return {stratum: sketch.summary() for stratum, sketch in sorted(self.sketches.items())}
+
+    def to_dict(self):
+        return {stratum: sketch.to_dict() for stratum, sketch in sorted(self.sketches.items())}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketches = cls()
+        for stratum, sketch_state in state.items():
+            sketch = SizeSketch.from_dict(sketch_state)
+            sketches.relative_accuracy = sketch.relative_accuracy
+            sketches.sketches[stratum] = sketch
+        return sketches
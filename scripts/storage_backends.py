@@ -0,0 +1,318 @@
+"""
+Storage Backends
+Where audits read object listings from: S3 (live listing, listing manifest or S3 Inventory)
+or a local copy of the bucket scanned with parallel os.scandir workers
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+from listing_manifest import add_manifest_args, list_objects_incremental, open_manifest
+from s3_client import get_s3_client
+from s3_inventory import InventoryReader
+from s3_listing import (DEFAULT_MAX_WORKERS, DEFAULT_TARGET_SHARDS, MAX_DISCOVERY_DEPTH, Shard, batched,
+                        discover_shards, iter_discovered_shards, iter_pages_parallel, list_shard)
+
+PAGE_SIZE = 1000
+# Errors reading one object that mean it is gone or archived (e.g. deleted since it was listed)
+MISSING_OBJECT_CODES = {'NoSuchKey', 'NotFound', '404', 'InvalidObjectState'}
+DEFAULT_FETCH_WORKERS = 32
+DEFAULT_PREFETCH = 256
+_PREFETCH_DONE = object()
+
+class S3Backend:
+    """Objects in an S3 bucket, read from a live listing, the listing manifest or an inventory"""
+
+    def __init__(self, bucket, s3_client=None, manifest=None, inventory=None):
+        self.bucket = bucket
+        self.s3_client = s3_client or get_s3_client()
+        self.manifest = manifest
+        self.inventory = inventory
+
+    @property
+    def checkpointable(self):
+        """Only live listings have shard positions worth checkpointing"""
+        return self.manifest is None and self.inventory is None
+
+    def url(self, prefix):
+        return f"s3://{self.bucket}/{prefix}"
+
+    def iter_pages(self, prefix, max_workers=DEFAULT_MAX_WORKERS):
+        """Yield (shard, page) pairs of listing records under `prefix`"""
+        if self.inventory is not None:
+            for page in self.inventory.iter_batches(prefix):
+                yield None, page
+        elif self.manifest is not None:
+            objects = list_objects_incremental(self.s3_client, self.bucket, prefix, self.manifest, max_workers)
+            for page in batched(objects, PAGE_SIZE):
+                yield None, page
+        else:
+            yield from iter_pages_parallel(self.s3_client, self.bucket, prefix, max_workers)
+
+    def discover_shards(self, prefix, target_shards=DEFAULT_TARGET_SHARDS):
+        """Independent key ranges of a live listing, e.g. to hand out to distributed workers"""
+        return discover_shards(self.s3_client, self.bucket, prefix, target_shards)
+
+    def iter_discovered_shards(self, prefix, target_shards=DEFAULT_TARGET_SHARDS):
+        """discover_shards() as a stream: each discovery level's shards as soon as it is done"""
+        return iter_discovered_shards(self.s3_client, self.bucket, prefix, target_shards)
+
+    def iter_shard_pages(self, shard):
+        """Yield the listing pages of one shard from discover_shards()"""
+        return list_shard(self.s3_client, self.bucket, shard)
+
+    def read_range(self, key, start, length):
+        """Bytes [start, start+length) of an object via an HTTP Range request (short at end of object)"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key,
+                                                 Range=f"bytes={start}-{start + length - 1}")
+        except ClientError as e:
+            # Ranges starting past the end (e.g. empty objects) are rejected rather than truncated
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return b''
+            raise
+        with closing(response['Body']) as body:
+            return body.read()
+
+    def open_object(self, key):
+        """A readable stream of the whole object"""
+        return self.s3_client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+class LocalBackend:
+    """A local copy of the bucket, where key `a/b/c.jpg` lives at `<root>/a/b/c.jpg`"""
+
+    checkpointable = False
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def url(self, prefix):
+        return str(self.root / prefix)
+
+    def _record(self, entry):
+        stat = entry.stat(follow_symlinks=False)
+        return {
+            'Key': Path(entry.path).relative_to(self.root).as_posix(),
+            'Size': stat.st_size,
+            'ETag': None,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def iter_pages(self, prefix, max_workers=DEFAULT_MAX_WORKERS):
+        """Yield (None, page) pairs for files under `prefix`, scanning directories on worker threads"""
+        base = self.root / prefix
+        if base.is_dir():
+            start_dirs, name_prefix = [base], None
+        else:
+            # S3 prefixes need not end at a folder boundary: scan the parent and match names
+            start_dirs, name_prefix = [base.parent], base.name
+        if not start_dirs[0].is_dir():
+            return
+
+        dirs = queue.Queue()
+        pages = queue.Queue(maxsize=max_workers * 4)
+        stop = threading.Event()
+        pending = [len(start_dirs)]
+        lock = threading.Lock()
+        for d in start_dirs:
+            dirs.put((d, name_prefix))
+
+        def put(item):
+            # Give up once the consumer has stopped reading
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def worker():
+            while not stop.is_set():
+                item = dirs.get()
+                if item is None:
+                    return
+                directory, match = item
+                page = []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if match is not None and not entry.name.startswith(match):
+                                continue
+                            if entry.is_dir(follow_symlinks=False):
+                                with lock:
+                                    pending[0] += 1
+                                dirs.put((entry.path, None))
+                            elif entry.is_file(follow_symlinks=False):
+                                page.append(self._record(entry))
+                                if len(page) >= PAGE_SIZE:
+                                    if not put(page):
+                                        return
+                                    page = []
+                except OSError as e:
+                    if not put(e):
+                        return
+                if page and not put(page):
+                    return
+                with lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    put(None)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield None, page
+        finally:
+            stop.set()
+            for _ in threads:
+                dirs.put(None)
+            for thread in threads:
+                thread.join()
+
+    def discover_shards(self, prefix, target_shards=DEFAULT_TARGET_SHARDS, max_depth=MAX_DISCOVERY_DEPTH):
+        """Sub-folders of `prefix` (expanded level by level until there are enough), plus a
+        delimited shard for each folder's own files"""
+        base = self.root / prefix
+        if not base.is_dir():
+            return [Shard(prefix)] if base.parent.is_dir() else []
+        shards = []
+        frontier = [prefix.rstrip('/') + '/']
+        for depth in range(max_depth + 1):
+            next_frontier = []
+            for folder in frontier:
+                children = []
+                has_files = False
+                with os.scandir(self.root / folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            children.append(f"{folder}{entry.name}/")
+                        elif entry.is_file(follow_symlinks=False):
+                            has_files = True
+                if not children:
+                    shards.append(Shard(folder))
+                    continue
+                if has_files:
+                    shards.append(Shard(folder, delimited=True))
+                next_frontier.extend(children)
+            frontier = next_frontier
+            if not frontier:
+                break
+            if len(shards) + len(frontier) >= target_shards or depth == max_depth:
+                shards.extend(Shard(folder) for folder in frontier)
+                break
+        return sorted(shards)
+
+    def iter_discovered_shards(self, prefix, target_shards=DEFAULT_TARGET_SHARDS):
+        """discover_shards() as a stream (scanning local folders is quick, so it's done up front)"""
+        return iter(self.discover_shards(prefix, target_shards))
+
+    def iter_shard_pages(self, shard):
+        """Yield the listing pages of one shard from discover_shards()"""
+        if not shard.delimited:
+            for _, page in self.iter_pages(shard.prefix, max_workers=1):
+                yield page
+            return
+        with os.scandir(self.root / shard.prefix) as entries:
+            files = (self._record(entry) for entry in entries if entry.is_file(follow_symlinks=False))
+            yield from batched(files, PAGE_SIZE)
+
+    def read_range(self, key, start, length):
+        """Bytes [start, start+length) of a file (short at end of file)"""
+        with open(self.root / key, 'rb') as f:
+            f.seek(start)
+            return f.read(length)
+
+    def open_object(self, key):
+        """A readable stream of the whole file"""
+        return open(self.root / key, 'rb')
+
+def object_unreadable(error):
+    """Whether a read error only concerns that one object, rather than every read (credentials, throttling...)"""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in MISSING_OBJECT_CODES
+    return isinstance(error, (FileNotFoundError, IsADirectoryError))
+
+def prefetch_objects(backend, items, key=lambda item: item, workers=DEFAULT_FETCH_WORKERS,
+                     max_queued=DEFAULT_PREFETCH):
+    """Yield (item, data) with whole objects downloaded ahead on worker threads.
+
+    At most `max_queued` objects are being fetched or waiting to be consumed, so
+    memory stays flat however many items there are. `data` is None when an
+    object is gone or archived (object_unreadable()); any other read error is
+    raised to the consumer. `items` is consumed on a background thread.
+    """
+    slots = threading.Semaphore(max_queued)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def fetch(item):
+        try:
+            with closing(backend.open_object(key(item))) as body:
+                data = body.read()
+        except Exception as e:
+            if not object_unreadable(e):
+                results.put(e)
+                return
+            data = None
+        results.put((item, data))
+
+    def feed():
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for item in items:
+                    while not slots.acquire(timeout=0.5):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    pool.submit(fetch, item)
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_PREFETCH_DONE)
+
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        while True:
+            result = results.get()
+            if result is _PREFETCH_DONE:
+                return
+            if isinstance(result, Exception):
+                raise result
+            slots.release()
+            yield result
+    finally:
+        stop.set()
+
+def add_backend_args(parser):
+    """Command-line options selecting where objects are read from"""
+    parser.add_argument('--local-root', metavar='DIR',
+                        help="Audit a local copy of the bucket rooted at DIR instead of S3")
+    parser.add_argument('--inventory', metavar='MANIFEST',
+                        help="Read objects from an S3 Inventory manifest.json (local path or s3:// URL) "
+                             "instead of listing the bucket")
+    add_manifest_args(parser)
+
+def open_backend(args, bucket, max_pool_connections=DEFAULT_MAX_WORKERS):
+    """Build the backend selected on the command line"""
+    if args.local_root:
+        return LocalBackend(args.local_root)
+    s3 = get_s3_client(max_pool_connections)
+    inventory = InventoryReader(args.inventory, s3) if args.inventory else None
+    manifest = None if inventory is not None else open_manifest(args)
+    return S3Backend(bucket, s3, manifest=manifest, inventory=inventory)
@@ -0,0 +1,242 @@
+"""
+Shard Work Queue
+A SQLite lease queue on shared disk through which a coordinator hands listing shards to
+worker processes on any number of hosts and collects their mergeable partial aggregates
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing, contextmanager
+
+from s3_listing import Shard
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+# Writers wait this long for another host's transaction instead of failing
+BUSY_TIMEOUT = 60
+
+# A shard handed to one worker until `expires` (time.time()), unless the lease is renewed
+Lease = namedtuple('Lease', ['task_id', 'dataset', 'shard', 'worker', 'expires'])
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Shards of each dataset with their state: pending, leased, done or failed.
+
+    A worker leases a shard for a limited time and keeps renewing the lease while
+    it lists; if it dies the lease runs out and the next worker to ask takes the
+    shard over. Only the current lease holder can complete a shard, so a shard
+    is counted once however many times it was handed out.
+
+    The coordinator publishes the run configuration first and enqueues shards
+    while it discovers them, so workers start listing right away; the queue is
+    only finished once it has been sealed after the last dataset's discovery.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS shards (
+                    id INTEGER PRIMARY KEY,
+                    dataset TEXT NOT NULL,
+                    shard TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    files INTEGER,
+                    partial BLOB
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS shards_state ON shards (state, id)")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS config (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    value TEXT,
+                    sealed INTEGER NOT NULL DEFAULT 0
+                )""")
+            # Datasets whose shards have all been enqueued
+            db.execute("CREATE TABLE IF NOT EXISTS discovered (dataset TEXT PRIMARY KEY)")
+            # Each worker's request metrics, in mergeable form
+            db.execute("CREATE TABLE IF NOT EXISTS metrics (worker TEXT PRIMARY KEY, state TEXT)")
+
+    @contextmanager
+    def _transaction(self):
+        """A short write transaction on a fresh connection (connections aren't shared across threads)"""
+        with closing(sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)) as db:
+            # Takes the write lock up front so two workers can't lease the same shard
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def publish(self, config):
+        """Store the run configuration; returns False if the queue was already published"""
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM config").fetchone():
+                return False
+            db.execute("INSERT INTO config (id, value) VALUES (1, ?)", (json.dumps(config),))
+            return True
+
+    def begin_discovery(self, dataset):
+        """Prepare to enqueue a dataset's shards; False if that was already completed.
+
+        Shards left by a coordinator that stopped halfway through the dataset's
+        discovery are dropped, as discovering it again enqueues them anew.
+        """
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM discovered WHERE dataset = ?", (dataset,)).fetchone():
+                return False
+            db.execute("DELETE FROM shards WHERE dataset = ?", (dataset,))
+            return True
+
+    def enqueue(self, dataset, shards):
+        """Add shards of a dataset; workers can lease them immediately"""
+        with self._transaction() as db:
+            db.executemany("INSERT INTO shards (dataset, shard) VALUES (?, ?)",
+                           [(dataset, json.dumps(list(shard))) for shard in shards])
+
+    def end_discovery(self, dataset):
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO discovered (dataset) VALUES (?)", (dataset,))
+
+    def seal(self):
+        """Mark that every shard has been enqueued, so idle workers can exit once the queue drains"""
+        with self._transaction() as db:
+            db.execute("UPDATE config SET sealed = 1")
+
+    def config(self):
+        """The run configuration stored by the coordinator, or None before it has published"""
+        with self._transaction() as db:
+            row = db.execute("SELECT value FROM config").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Take the next pending or abandoned shard; None if there is nothing to take right now"""
+        now = time.time()
+        with self._transaction() as db:
+            # Shards whose workers died too often are given up instead of being handed out forever
+            db.execute("""
+                UPDATE shards SET state = 'failed', error = 'lease expired ' || attempts || ' times'
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, self.max_attempts))
+            row = db.execute("""
+                SELECT id, dataset, shard FROM shards
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY id LIMIT 1""", (now,)).fetchone()
+            if row is None:
+                return None
+            task_id, dataset, shard = row
+            expires = now + lease_seconds
+            db.execute("""
+                UPDATE shards SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?""", (worker, expires, task_id))
+        return Lease(task_id, dataset, Shard(*json.loads(shard)), worker, expires)
+
+    def renew(self, lease, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease; False if it was lost (it expired and another worker took the shard)"""
+        with self._transaction() as db:
+            updated = db.execute("""
+                UPDATE shards SET lease_expires = ?
+                WHERE id = ? AND state = 'leased' AND worker = ?""",
+                                 (time.time() + lease_seconds, lease.task_id, lease.worker)).rowcount
+        return updated == 1
+
+    def complete(self, lease, partial, files):
+        """Store a shard's encoded partial aggregate; False if the lease was lost and the result dropped"""
+        with self._transaction() as db:
+            updated = db.execute("""
+                UPDATE shards SET state = 'done', partial = ?, files = ?, lease_expires = NULL, error = NULL
+                WHERE id = ? AND state = 'leased' AND worker = ?""",
+                                 (partial, files, lease.task_id, lease.worker)).rowcount
+        return updated == 1
+
+    def fail(self, lease, error):
+        """Give a shard back after an error; it is retried until it has been attempted max_attempts times"""
+        with self._transaction() as db:
+            db.execute("""
+                UPDATE shards
+                SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_expires = NULL, error = ?
+                WHERE id = ? AND state = 'leased' AND worker = ?""",
+                       (self.max_attempts, str(error), lease.task_id, lease.worker))
+
+    def release(self, lease):
+        """Hand a shard back untouched (e.g. on Ctrl-C), without counting an attempt"""
+        with self._transaction() as db:
+            db.execute("""
+                UPDATE shards SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1
+                WHERE id = ? AND state = 'leased' AND worker = ?""", (lease.task_id, lease.worker))
+
+    def progress(self):
+        """Shard counts per state, plus the files counted by finished shards"""
+        with self._transaction() as db:
+            counts = dict(db.execute("SELECT state, COUNT(*) FROM shards GROUP BY state").fetchall())
+            files = db.execute("SELECT COALESCE(SUM(files), 0) FROM shards WHERE state = 'done'").fetchone()[0]
+            sealed = db.execute("SELECT sealed FROM config").fetchone()
+        return {"pending": counts.get("pending", 0), "leased": counts.get("leased", 0),
+                "done": counts.get("done", 0), "failed": counts.get("failed", 0), "files": files,
+                "sealed": bool(sealed and sealed[0])}
+
+    def finished(self):
+        progress = self.progress()
+        return progress["sealed"] and progress["pending"] == 0 and progress["leased"] == 0
+
+    def partials(self, dataset):
+        """Encoded partial aggregates of a dataset's finished shards"""
+        with self._transaction() as db:
+            rows = db.execute("SELECT partial FROM shards WHERE dataset = ? AND state = 'done' ORDER BY id",
+                              (dataset,)).fetchall()
+        return [row[0] for row in rows]
+
+    def save_metrics(self, worker, state):
+        """Store a worker's RequestMetrics.state(), replacing what it stored before"""
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO metrics (worker, state) VALUES (?, ?)", (worker, json.dumps(state)))
+
+    def worker_metrics(self):
+        """The metrics states stored by workers"""
+        with self._transaction() as db:
+            rows = db.execute("SELECT state FROM metrics ORDER BY worker").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def failures(self, dataset):
+        """(shard, error) of a dataset's shards that were given up"""
+        with self._transaction() as db:
+            rows = db.execute("SELECT shard, error FROM shards WHERE dataset = ? AND state = 'failed' ORDER BY id",
+                              (dataset,)).fetchall()
+        return [(Shard(*json.loads(shard)), error) for shard, error in rows]
+
+    @contextmanager
+    def keep_alive(self, lease, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Renew a lease in the background while the block runs; yields an Event set if it is lost"""
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    if not self.renew(lease, lease_seconds):
+                        lost.set()
+                        return
+                except sqlite3.Error:
+                    # A busy or briefly unreachable queue; the lease is still valid until it expires
+                    continue
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,55 @@
+"""
+Partial audit aggregates must merge to the single-pass result in any grouping and order
+"""
+from audit_aggregate import AuditAggregate, save_partial
+from audit_s3_datasets import audit_from_partials
+from s3_listing import batched
+
+PREFIX = "image-datasets/mixed"
+
+def objects():
+    listing = [{'Key': f"{PREFIX}/README.md", 'Size': 900}]
+    for split in ("train", "test"):
+        for label in ("real", "fake"):
+            for i in range(700):
+                ext = ("jpg", "png", "webp")[i % 3]
+                listing.append({'Key': f"{PREFIX}/{split}/{label}/{i:05d}.{ext}",
+                                'Size': 0 if i % 97 == 0 else 1000 + (i * 7919) % 50000})
+    listing.append({'Key': f"{PREFIX}/extra/notes.txt", 'Size': 12})
+    return listing
+
+def aggregate(listing):
+    result = AuditAggregate(PREFIX, samples_per_stratum=25)
+    for page in batched(listing, 300):
+        result.add_page(page)
+    return result
+
+def parts():
+    listing = objects()
+    # Uneven and interleaved, as shards of a real listing would be
+    return [aggregate(listing[0::3]), aggregate(listing[1::3]), aggregate(listing[2::3])]
+
+def test_merge_is_associative_and_commutative():
+    a, b, c = parts()
+    left = a.merge(b).merge(c).to_dict()
+    a, b, c = parts()
+    right = a.merge(b.merge(c)).to_dict()
+    a, b, c = parts()
+    shuffled = c.merge(a).merge(b).to_dict()
+    assert left == right == shuffled == aggregate(objects()).to_dict()
+
+def test_serialization_round_trips():
+    original = aggregate(objects())
+    assert AuditAggregate.from_bytes(original.to_bytes()).to_dict() == original.to_dict()
+    assert AuditAggregate.from_dict(original.to_dict()).to_audit() == original.to_audit()
+
+def test_audit_from_partials_equals_single_pass(tmp_path):
+    for i, part in enumerate(parts()):
+        save_partial(part, tmp_path, f"shard{i}")
+    [audit] = audit_from_partials(tmp_path, [PREFIX])
+    assert audit == aggregate(objects()).to_audit()
+
+def test_audit_reports_quantiles_not_sketches():
+    audit = aggregate(objects()).to_audit()
+    assert "size_sketches" not in audit
+    assert audit["size_distribution"]["train/real/.jpg"]["p50"] > 0
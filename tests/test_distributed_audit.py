@@ -0,0 +1,64 @@
+"""
+A distributed audit through the work queue must equal a single-pass audit of the same tree
+"""
+import threading
+import time
+
+import pytest
+
+from audit_s3_datasets import audit_dataset, audit_distributed, audit_shards
+from storage_backends import LocalBackend
+from work_queue import WorkQueue
+
+DATASETS = ["image-datasets/alpha", "image-datasets/beta"]
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "bucket"
+    for d, dataset in enumerate(DATASETS):
+        (root / dataset).mkdir(parents=True)
+        (root / dataset / "README.md").write_bytes(b"#" * 40)
+        for split in ("train", "test"):
+            for label in ("real", "fake"):
+                folder = root / dataset / split / label
+                folder.mkdir(parents=True)
+                for i in range(30 + 7 * d):
+                    ext = "png" if i % 4 == 0 else "jpg"
+                    (folder / f"img_{i:04d}.{ext}").write_bytes(b"\0" * (100 + 13 * i + len(label)))
+    return root
+
+def single_pass(root):
+    backend = LocalBackend(root)
+    return [audit_dataset("bucket", prefix, backend=backend, verbose=False) for prefix in DATASETS]
+
+def test_local_workers_match_single_pass(tree, tmp_path):
+    results = audit_distributed(str(tmp_path / "queue.sqlite"), "bucket", DATASETS, LocalBackend(tree),
+                                local_workers=2, max_workers=2)
+    assert results == single_pass(tree)
+
+def test_expired_lease_is_requeued_and_counted_once(tree, tmp_path):
+    queue_path = str(tmp_path / "queue.sqlite")
+    results = []
+    coordinator = threading.Thread(target=lambda: results.extend(
+        audit_distributed(queue_path, "bucket", DATASETS, LocalBackend(tree))))
+    coordinator.start()
+
+    work = WorkQueue(queue_path)
+    while not (work.config() and work.progress()["sealed"]):
+        time.sleep(0.05)
+    # A worker that takes a shard and is killed before completing it
+    dead = work.lease("killed-worker", lease_seconds=1)
+    assert dead is not None
+
+    audit_shards(queue_path, threads=2, lease_seconds=5, name="survivor")
+    coordinator.join(timeout=60)
+    assert not coordinator.is_alive()
+
+    # Too late: the shard was taken over and its result is already in
+    assert not work.complete(dead, b"", 1)
+    progress = work.progress()
+    assert progress["done"] == len(work.partials(DATASETS[0])) + len(work.partials(DATASETS[1]))
+    assert progress["failed"] == 0
+    expected = single_pass(tree)
+    assert results == expected
+    assert progress["files"] == sum(audit["total_files"] for audit in expected)
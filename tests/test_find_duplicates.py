@@ -0,0 +1,22 @@
+"""
+Exact duplicates are found by content, and objects deleted after listing are skipped
+"""
+from find_duplicates import DuplicateIndex
+from storage_backends import LocalBackend
+
+def test_deleted_objects_are_skipped(tmp_path):
+    files = {"ds/train/real/a.jpg": b"abc", "ds/test/real/b.jpg": b"abc",
+             "ds/test/fake/c.jpg": b"xyz", "ds/train/fake/d.jpg": b"abd"}
+    for key, data in files.items():
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(data)
+    index = DuplicateIndex(str(tmp_path / "index.sqlite"))
+    index.add_page("ds", "ds/", [{'Key': key, 'Size': len(data)} for key, data in files.items()])
+    (tmp_path / "ds/train/fake/d.jpg").unlink()
+
+    assert index.count_unhashed() == 4
+    assert index.hash_ambiguous(LocalBackend(tmp_path), workers=2) == ["ds/train/fake/d.jpg"]
+    clusters = list(index.iter_clusters())
+    index.close()
+    assert [(size, sorted(key for _, _, key in members)) for size, _, members in clusters] == \
+        [(3, ["ds/test/real/b.jpg", "ds/train/real/a.jpg"])]
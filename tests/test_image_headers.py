@@ -0,0 +1,24 @@
+"""
+Header probes report objects that vanished as unreadable and raise every other read error
+"""
+import pytest
+
+from image_headers import probe_headers
+from storage_backends import LocalBackend
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0\0\0\rIHDR' + (64).to_bytes(4, 'big') + (32).to_bytes(4, 'big') + b'\x08\x02\0\0\0'
+
+class DeniedBackend(LocalBackend):
+    def read_range(self, key, start, length):
+        raise PermissionError(key)
+
+def test_missing_objects_are_unreadable(tmp_path):
+    (tmp_path / "a.png").write_bytes(PNG)
+    headers = dict(probe_headers(LocalBackend(tmp_path), ["a.png", "gone.png"], max_workers=2))
+    assert headers["a.png"]['width'] == 64
+    assert headers["gone.png"] is None
+
+def test_other_read_errors_are_raised(tmp_path):
+    (tmp_path / "a.png").write_bytes(PNG)
+    with pytest.raises(PermissionError):
+        list(probe_headers(DeniedBackend(tmp_path), ["a.png"], max_workers=2))
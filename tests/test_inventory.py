@@ -0,0 +1,72 @@
+"""
+Audits read from the inventory fixtures must match audits of a listing of the same objects
+"""
+from pathlib import Path
+
+import pytest
+
+from audit_s3_datasets import audit_dataset
+from s3_inventory import InventoryReader
+from storage_backends import LocalBackend, S3Backend
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "inventory"
+DATASETS = ["image-datasets/br-gen", "image-datasets/aigi-holmes"]
+
+def current_objects():
+    """{key: size} of the live objects the fixtures describe (older versions and delete markers excluded)"""
+    objects = {}
+    for dataset, per_folder in (("image-datasets/br-gen", 6), ("image-datasets/aigi-holmes", 4)):
+        objects[f"{dataset}/README.md"] = 512
+        for split in ("train", "test"):
+            for label in ("real", "fake"):
+                for i in range(per_folder):
+                    objects[f"{dataset}/{split}/{label}/{i:03d}.{'png' if i % 3 == 0 else 'jpg'}"] = \
+                        1000 + 37 * i + len(label)
+    objects["image-datasets/br-gen/test/fake/img 7.jpg"] = 2048
+    objects["image-datasets/br-gen/extra/notes.txt"] = 64
+    objects["image-datasets/other/ignored.jpg"] = 10
+    return objects
+
+@pytest.fixture
+def listed_bucket(tmp_path):
+    """A local copy of the bucket, listed like S3 by LocalBackend"""
+    for key, size in current_objects().items():
+        path = tmp_path / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\0" * size)
+    return LocalBackend(tmp_path)
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_records_match_current_objects(file_format):
+    inventory = InventoryReader(FIXTURES / file_format, batch_size=8)
+    records = {record['Key']: record['Size'] for record in inventory.iter_objects("image-datasets/")}
+    assert records == current_objects()
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_partitions_match_unpartitioned_reads(file_format):
+    inventory = InventoryReader(FIXTURES / file_format, batch_size=8)
+    expected = {prefix: sorted(record['Key'] for record in inventory.iter_objects(prefix)) for prefix in DATASETS}
+    inventory.partition(DATASETS)
+    try:
+        assert set(inventory.partitions) == set(DATASETS)
+        for prefix in DATASETS:
+            assert sorted(record['Key'] for record in inventory.iter_objects(prefix)) == expected[prefix]
+        # Narrower prefixes are served from the partition that covers them
+        assert sorted(record['Key'] for record in inventory.iter_objects("image-datasets/br-gen/test/fake/")) == \
+            [key for key in expected["image-datasets/br-gen"] if key.startswith("image-datasets/br-gen/test/fake/")]
+    finally:
+        inventory.close()
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_audit_matches_listing(file_format, listed_bucket):
+    inventory = InventoryReader(FIXTURES / file_format, batch_size=8)
+    inventory.partition(DATASETS)
+    backend = S3Backend("ad-datascience", s3_client=object(), inventory=inventory)
+    try:
+        for prefix in DATASETS:
+            from_inventory = audit_dataset("ad-datascience", prefix, verbose=False, backend=backend)
+            from_listing = audit_dataset("ad-datascience", prefix, verbose=False, backend=listed_bucket)
+            assert from_inventory is not None
+            assert from_inventory == from_listing
+    finally:
+        inventory.close()
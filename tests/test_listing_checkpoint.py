@@ -0,0 +1,49 @@
+"""
+An audit interrupted mid-listing and resumed from its checkpoint must count every object exactly once
+"""
+import json
+
+from audit_s3_datasets import audit_dataset
+from benchmark_listing import FakeS3Client, build_fake_keys
+from s3_listing import discover_shards
+from storage_backends import S3Backend
+
+PREFIX = "image-datasets/fake"
+
+class FailingS3Client(FakeS3Client):
+    """Raises on the request after the first `fail_after` (until disarmed with None)"""
+
+    def __init__(self, keys, fail_after=None):
+        super().__init__(keys, latency=0)
+        self.fail_after = fail_after
+
+    def count_request(self):
+        super().count_request()
+        if self.fail_after is not None and self.requests > self.fail_after:
+            raise ConnectionError("connection reset")
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    # Four leaf folders of three pages each, listed one shard at a time
+    keys = build_fake_keys(PREFIX, 1, 2500, "leaves")
+    expected = audit_dataset("bucket", PREFIX, 1, verbose=False, backend=S3Backend("bucket", FakeS3Client(keys, 0)))
+
+    discovery = FakeS3Client(keys, 0)
+    discover_shards(discovery, "bucket", PREFIX)
+    # Fails on the third page of the second shard: the first is done, the second half-way
+    client = FailingS3Client(keys, fail_after=discovery.requests + 3 + 2)
+    backend = S3Backend("bucket", client)
+    checkpoints = tmp_path / "checkpoints"
+    assert audit_dataset("bucket", PREFIX, 1, verbose=False, backend=backend, checkpoint_dir=checkpoints) is None
+
+    [saved] = checkpoints.glob("*.json")
+    shards = json.loads(saved.read_text())["shards"]
+    assert [entry["done"] for entry in shards].count(True) == 1
+    assert [entry["last_key"] is not None and not entry["done"] for entry in shards].count(True) == 1
+
+    client.fail_after, client.requests = None, 0
+    resumed = audit_dataset("bucket", PREFIX, 1, verbose=False, backend=backend, checkpoint_dir=checkpoints,
+                            resume=True)
+    assert resumed == expected
+    # Only the unlisted pages are requested again: one of the second shard, three each of the last two
+    assert client.requests == 7
+    assert not saved.exists()
@@ -0,0 +1,44 @@
+"""
+Re-audits through the listing manifest must see every change a fresh listing sees
+"""
+import pytest
+
+from benchmark_listing import FakeS3Client, build_fake_keys
+from listing_manifest import ManifestStore, list_objects_incremental
+
+BUCKET = "bucket"
+PREFIX = "image-datasets/fake"
+
+def listing(client, manifest):
+    return {obj['Key']: obj['Size'] for obj in list_objects_incremental(client, BUCKET, PREFIX + "/", manifest,
+                                                                       max_workers=4)}
+
+@pytest.fixture(params=["leaves", "flat"])
+def client(request):
+    # Three pages per leaf folder; the flat folder is split into key-stem shards
+    return FakeS3Client(build_fake_keys(PREFIX, 3, 1000, request.param), latency=0)
+
+def test_unchanged_run_reuses_every_shard(client, tmp_path):
+    first = listing(client, ManifestStore(tmp_path))
+    listed, client.requests = client.requests, 0
+    manifest = ManifestStore(tmp_path)
+    assert listing(client, manifest) == first
+    assert manifest.relisted_shards == 0
+    assert client.requests <= listed
+
+def test_mid_shard_delete_is_relisted(client, tmp_path):
+    listing(client, ManifestStore(tmp_path))
+    deleted = client.keys.pop(len(client.keys) // 2 - 700)
+    manifest = ManifestStore(tmp_path)
+    objects = listing(client, manifest)
+    assert deleted not in objects
+    assert sorted(objects) == client.keys
+    assert manifest.relisted_shards >= 1
+
+def test_overwrite_with_new_size_is_relisted(client, tmp_path):
+    listing(client, ManifestStore(tmp_path))
+    overwritten = client.keys[len(client.keys) // 2 - 700]
+    client.sizes[overwritten] = 4096
+    objects = listing(client, ManifestStore(tmp_path))
+    assert objects[overwritten] == 4096
+    assert len(objects) == len(client.keys)
@@ -0,0 +1,77 @@
+"""
+The multi-index pair search must find exactly the pairs an all-pairs scan finds
+"""
+import numpy as np
+
+from near_duplicates import ImageHashes, leakage_report, near_duplicate_pairs, popcount
+
+def planted_hashes(seed=7):
+    """~3,000 (pHash, dHash) values: random bases, near variants of some, and exact copies of others"""
+    rng = np.random.default_rng(seed)
+    phashes = list(rng.integers(0, 2**64, 2000, dtype=np.uint64, endpoint=False))
+    dhashes = list(rng.integers(0, 2**64, 2000, dtype=np.uint64, endpoint=False))
+    for _ in range(800):
+        base = rng.integers(len(phashes))
+        phash, dhash = phashes[base], dhashes[base]
+        for bit in rng.choice(64, rng.integers(0, 9), replace=False):
+            phash ^= np.uint64(1) << np.uint64(bit)
+        for bit in rng.choice(64, rng.integers(0, 12), replace=False):
+            dhash ^= np.uint64(1) << np.uint64(bit)
+        phashes.append(phash)
+        dhashes.append(dhash)
+    for _ in range(200):
+        base = rng.integers(len(phashes))
+        phashes.append(phashes[base])
+        dhashes.append(dhashes[base])
+    return np.array(phashes, dtype=np.uint64), np.array(dhashes, dtype=np.uint64)
+
+def brute_force_pairs(phashes, dhashes, phash_threshold, dhash_threshold):
+    close = ((popcount(phashes[:, None] ^ phashes[None, :]) <= phash_threshold)
+             & (popcount(dhashes[:, None] ^ dhashes[None, :]) <= dhash_threshold))
+    i, j = np.nonzero(np.triu(close, k=1))
+    return set(zip(i.tolist(), j.tolist()))
+
+def test_pairs_match_brute_force():
+    phashes, dhashes = planted_hashes()
+    assert len(phashes) == 3000
+    for phash_threshold, dhash_threshold in ((6, 10), (3, 64), (8, 8)):
+        pairs = near_duplicate_pairs(phashes, dhashes, phash_threshold, dhash_threshold)
+        expected = brute_force_pairs(phashes, dhashes, phash_threshold, dhash_threshold)
+        assert len(expected) > 100
+        assert set(map(tuple, pairs.tolist())) == expected
+
+def test_large_exact_groups_are_collapsed():
+    phashes, dhashes = planted_hashes()
+    phashes = np.concatenate([phashes, np.zeros(50, dtype=np.uint64)])
+    dhashes = np.concatenate([dhashes, np.zeros(50, dtype=np.uint64)])
+    pairs = near_duplicate_pairs(phashes, dhashes, max_group=20)
+    assert not (pairs >= 3000).any()
+    assert len(pairs) == len(near_duplicate_pairs(phashes[:3000], dhashes[:3000]))
+
+def test_leakage_report():
+    hashes = ImageHashes()
+    images = [
+        ("alpha", "train", 0x0F0F, 0x1), ("alpha", "test", 0x0F0E, 0x1),   # leaked test image
+        ("alpha", "test", 0x0F0F, 0x3),                                    # leaked too, same train image
+        ("alpha", "train", 0xFFFF0000, 0x0), ("alpha", "train", 0xFFFF0001, 0x0),  # within train
+        ("alpha", "test", 0x123456789, 0x5),                               # clean
+        ("beta", "test", 0xF0F0F0F0F0, 0x7), ("alpha", "train", 0xF0F0F0F0F1, 0x7),  # across datasets
+    ]
+    for n, (dataset, split, phash, dhash) in enumerate(images):
+        hashes.add(dataset, split, f"{dataset}/{split}/{n}.jpg", (phash, dhash))
+    hashes.add("beta", "train", "beta/train/broken.jpg", None)
+    for n in range(4):
+        hashes.add("beta", "train", f"beta/train/blank{n}.jpg", (0, 0))
+
+    pairs = near_duplicate_pairs(hashes.phashes, hashes.dhashes, max_group=3)
+    report = leakage_report(hashes, pairs, max_group=3)
+    alpha, beta = report["datasets"]["alpha"], report["datasets"]["beta"]
+    assert (alpha["test_images"], alpha["leaked_test_images"], alpha["train_test_pairs"]) == (3, 2, 2)
+    assert alpha["test_leak_rate"] == round(2 / 3, 4)
+    # The two leaked test images are also near each other
+    assert alpha["within_split_pairs"] == 2
+    assert (beta["leaked_test_images"], beta["undecodable"]) == (0, 1)
+    assert report["cross_dataset_pairs"] == {"alpha | beta": 1}
+    assert report["total_pairs"] == 5
+    assert report["large_exact_groups"] == [{"phash": "0" * 16, "dhash": "0" * 16, "images": 4,
+                                             "datasets": {"beta": 4}}]
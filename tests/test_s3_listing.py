@@ -0,0 +1,35 @@
+"""
+Shard discovery must cover every key exactly once without spending more requests than the listing saves
+"""
+from benchmark_listing import FakeS3Client, build_fake_keys
+from s3_listing import SPLIT_MIN_PAGES, discover_shards, list_objects_parallel
+
+def discover_and_list(client, prefix):
+    shards = discover_shards(client, "bucket", prefix)
+    keys = [obj['Key'] for obj in list_objects_parallel(client, "bucket", prefix, max_workers=4, shards=shards)]
+    return shards, keys
+
+def test_shallow_flat_folder_is_not_split():
+    client = FakeS3Client(build_fake_keys("data", 1, 1250, "flat"), latency=0)
+    shards, keys = discover_and_list(client, "data/")
+    assert sorted(keys) == client.keys
+    assert len(shards) == 1
+    # Discovery reads the folder once more than the listing itself
+    pages = len(client.keys) // 1000 + 1
+    assert client.requests <= 2 * pages + 1
+
+def test_every_deep_leaf_is_split():
+    client = FakeS3Client(build_fake_keys("data", 4, 3000, "leaves"), latency=0)
+    shards, keys = discover_and_list(client, "data/")
+    assert len(keys) == len(set(keys))
+    assert sorted(keys) == client.keys
+    leaves = {key.rsplit("/", 1)[0] + "/" for key in client.keys}
+    for leaf in leaves:
+        assert sum(shard.prefix.startswith(leaf) for shard in shards) > 1
+    assert client.requests < 4 * len(client.keys) / 1000
+
+def test_shallow_leaves_are_listed_whole():
+    client = FakeS3Client(build_fake_keys("data", 1, 1000 * SPLIT_MIN_PAGES, "leaves"), latency=0)
+    shards, keys = discover_and_list(client, "data/")
+    assert sorted(keys) == client.keys
+    assert len(shards) == 4
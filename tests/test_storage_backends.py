@@ -0,0 +1,74 @@
+"""
+LocalBackend listings and the object prefetcher
+"""
+import threading
+import time
+
+import pytest
+
+import storage_backends
+from storage_backends import LocalBackend, prefetch_objects
+
+class DeniedBackend(LocalBackend):
+    def open_object(self, key):
+        raise PermissionError(key)
+
+def test_prefetch_reports_missing_objects_as_none(tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"abc")
+    fetched = dict(prefetch_objects(LocalBackend(tmp_path), ["a.bin", "gone.bin"], workers=2))
+    assert fetched == {"a.bin": b"abc", "gone.bin": None}
+
+def test_prefetch_raises_other_read_errors(tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"abc")
+    with pytest.raises(PermissionError):
+        list(prefetch_objects(DeniedBackend(tmp_path), ["a.bin"], workers=2))
+
+def test_closing_a_listing_early_stops_its_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_backends, "PAGE_SIZE", 10)
+    for d in range(30):
+        (tmp_path / f"dir{d:02d}").mkdir()
+        for i in range(25):
+            (tmp_path / f"dir{d:02d}" / f"{i}.jpg").write_bytes(b"x")
+    before = threading.active_count()
+    pages = LocalBackend(tmp_path).iter_pages("", max_workers=2)
+    next(pages)
+    # Let the workers fill the page queue and block on it
+    time.sleep(0.3)
+    pages.close()
+    assert threading.active_count() == before
+
+def write_tree(root, keys):
+    for key in keys:
+        (root / key).parent.mkdir(parents=True, exist_ok=True)
+        (root / key).write_bytes(b"x" * len(key))
+
+def listed_keys(backend, prefix):
+    return sorted(obj['Key'] for _, page in backend.iter_pages(prefix, max_workers=2) for obj in page)
+
+def test_prefix_inside_a_folder_name_matches_like_s3(tmp_path):
+    keys = ["data/img_1.jpg", "data/img_10.jpg", "data/img_2.jpg", "data/img_1x/a.jpg", "data/other/img_1.jpg"]
+    write_tree(tmp_path, keys)
+    backend = LocalBackend(tmp_path)
+    assert listed_keys(backend, "data/img_1") == sorted(key for key in keys if key.startswith("data/img_1"))
+    assert listed_keys(backend, "data/nothing") == []
+
+def test_symlinks_are_skipped(tmp_path):
+    write_tree(tmp_path, ["data/real/a.jpg", "outside/b.jpg"])
+    (tmp_path / "data" / "link.jpg").symlink_to(tmp_path / "data" / "real" / "a.jpg")
+    (tmp_path / "data" / "linked_dir").symlink_to(tmp_path / "outside", target_is_directory=True)
+    backend = LocalBackend(tmp_path)
+    assert listed_keys(backend, "data/") == ["data/real/a.jpg"]
+    assert [shard.prefix for shard in backend.discover_shards("data/")] == ["data/real/"]
+
+def test_shards_cover_every_file_once(tmp_path):
+    keys = ["data/README.md", "data/notes.txt", "data/train/real/a.jpg", "data/train/fake/b.jpg",
+            "data/train/list.csv", "data/test/c.jpg"]
+    write_tree(tmp_path, keys)
+    backend = LocalBackend(tmp_path)
+    shards = backend.discover_shards("data/")
+    delimited = {shard.prefix: shard for shard in shards if shard.delimited}
+    assert sorted(delimited) == ["data/", "data/train/"]
+    direct = [obj['Key'] for page in backend.iter_shard_pages(delimited["data/"]) for obj in page]
+    assert sorted(direct) == ["data/README.md", "data/notes.txt"]
+    covered = [obj['Key'] for shard in shards for page in backend.iter_shard_pages(shard) for obj in page]
+    assert sorted(covered) == sorted(keys) == listed_keys(backend, "data/")